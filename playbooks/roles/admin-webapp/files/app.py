@@ -3,8 +3,8 @@ import shutil
 import uuid
 import subprocess
 from flask import (
-    Flask, request, redirect, url_for,
-    render_template, flash, send_from_directory, jsonify
+    Flask, Request, request, redirect, url_for,
+    render_template, flash, send_file, send_from_directory, jsonify, Response, abort
 )
 from werkzeug.utils import secure_filename
 import subprocess
@@ -16,10 +16,21 @@ import socket
 from pathlib import Path
 import threading
 import time
+import math
 import atexit
 
 # Import the cold autoscaler module
 import cold_autoscaler
+import autoscaler_metrics
+import job_queue
+from transcoder import make_hls, describe_hls, MASTER_PLAYLIST
+from transcode_cache import TranscodeCache
+import uploads
+import storage
+import propagation
+import replication
+import catalogue
+from media_cache import MediaCache, ObjectNotFound
 
 # -----------------------------------------------------------------------------
 # Configuration
@@ -28,7 +39,30 @@ MOUNT_PATH = os.environ.get('VIDEOS_MOUNT_PATH', '/mnt/videos')
 TMP_PATH   = os.environ.get('TMP_PATH', '/tmp')
 ALLOWED_EXTS = {'mp4', 'mov', 'avi', 'mkv'}
 
+# Transcoding job queue: journal on local disk (not the bucket mount), one worker per core
+JOBS_PATH = os.environ.get('JOBS_PATH', '/var/lib/content_manager')
+TRANSCODE_WORKERS = int(os.environ.get('TRANSCODE_WORKERS', os.cpu_count() or 1))
+TRANSCODE_MAX_ATTEMPTS = int(os.environ.get('TRANSCODE_MAX_ATTEMPTS', '3'))
+TRANSCODE_RETRY_BACKOFF = int(os.environ.get('TRANSCODE_RETRY_BACKOFF', '30'))
+# ffmpeg writes HLS output here (local disk) before it is uploaded to the bucket
+TRANSCODE_SCRATCH_PATH = os.environ.get('TRANSCODE_SCRATCH_PATH', os.path.join(JOBS_PATH, 'scratch'))
+# Manifests of the changes propagated to the regional buckets
+MANIFESTS_PATH = os.path.join(JOBS_PATH, 'manifests')
+# Browser cache lifetimes (s): segments never change once published, playlists may be re-published
+HLS_SEGMENT_MAX_AGE = int(os.environ.get('HLS_SEGMENT_MAX_AGE', str(365 * 24 * 3600)))
+HLS_PLAYLIST_MAX_AGE = int(os.environ.get('HLS_PLAYLIST_MAX_AGE', '5'))
+VIDEO_MAX_AGE = int(os.environ.get('VIDEO_MAX_AGE', '3600'))
+
+
+class StagingRequest(Request):
+    """Streams multipart file parts to local upload staging, hashing them as they arrive"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return uploads.hashing_stream_factory(total_content_length, content_type, filename, content_length)
+
+
 app = Flask(__name__, template_folder='templates/')
+app.request_class = StagingRequest
 app.secret_key = os.environ.get('FLASK_SECRET', 'change-me')
 
 # -----------------------------------------------------------------------------
@@ -39,20 +73,180 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTS
 
 
-def make_hls(input_filepath, output_dir):
-    os.makedirs(output_dir, exist_ok=True)
-    playlist = os.path.join(output_dir, 'playlist.m3u8')
-    cmd = [
-        'ffmpeg', '-i', input_filepath,
-        '-profile:v', 'baseline', '-level', '3.0',
-        '-start_number', '0',
-        '-hls_time', '10',
-        '-hls_list_size', '0',
-        '-f', 'hls',
-        playlist
-    ]
-    subprocess.check_call(cmd)
-    return playlist
+def process_transcode_job(payload, progress):
+    """Transcoding job handler: HLS conversion into local scratch, parallel upload, then queued replication
+
+    Failing to record the change for replication is reported in the result
+    rather than raised, so it doesn't re-run a transcode that already succeeded.
+    """
+    scratch_dir = os.path.join(TRANSCODE_SCRATCH_PATH, payload['stream_folder'])
+    hls_prefix = f"hls/{payload['stream_folder']}"
+    if os.path.isdir(scratch_dir):
+        shutil.rmtree(scratch_dir)
+
+    # Transcode from the local staging copy while it exists, then publish it once,
+    # whatever the outcome (a retry reads it back through the mount)
+    staged_path = payload.get('staged_path')
+    source = staged_path if staged_path and os.path.exists(staged_path) else payload['video_path']
+    content_catalogue.upsert(payload['stream_folder'], status=catalogue.TRANSCODING, error=None)
+    try:
+        make_hls(source, scratch_dir, lambda fraction: progress(fraction * 0.9))
+        hls_info = describe_hls(scratch_dir)
+        uploaded = content_storage.upload_tree(scratch_dir, hls_prefix)
+    except Exception as e:
+        content_storage.delete_prefix(f"{hls_prefix}/")
+        content_catalogue.upsert(payload['stream_folder'], status=catalogue.FAILED, error=f"{type(e).__name__}: {e}")
+        if source == staged_path:
+            # Logged, not raised: the transcode error is what the job reports
+            publish_staged_source(payload)
+        raise
+    finally:
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    app.logger.info(f"☁️  Uploaded {len(uploaded)} HLS objects to {hls_prefix}/")
+
+    if source == staged_path:
+        error = publish_staged_source(payload)
+        if error:
+            content_catalogue.upsert(payload['stream_folder'], status=catalogue.FAILED, error=error)
+            raise IOError(f"source video was not published: {error}")
+
+    if payload.get('sha256'):
+        transcode_cache.record(payload['sha256'], payload['stream_folder'], payload['filename'], payload.get('size'))
+    content_catalogue.upsert(payload['stream_folder'], status=catalogue.PUBLISHED, has_video=1, has_hls=1, **hls_info)
+
+    result = {'playlist': f"{hls_prefix}/{MASTER_PLAYLIST}", 'objects': len(uploaded)}
+    result.update(replicate_changes(payload['stream_folder'], put_keys=uploaded + [f"videos/{payload['filename']}"]))
+    return result
+
+
+def publish_staged_source(payload):
+    """Upload the staged source video to videos/ and drop the staged copy; returns an error or None
+
+    On failure the staged copy is kept, so the job's retry transcodes from it
+    and publishes it again.
+    """
+    try:
+        content_storage.upload_file(payload['staged_path'], f"videos/{payload['filename']}")
+    except Exception as e:
+        app.logger.error(f"❌ Failed to publish source video {payload['filename']}: {e}")
+        return f"{type(e).__name__}: {e}"
+    os.remove(payload['staged_path'])
+    content_catalogue.upsert(payload['stream_folder'], has_video=1)
+    return None
+
+
+def replicate_changes(stream_folder, **changes):
+    """Queue just the changed objects for the regional buckets; returns {replication, replication_error?}"""
+    try:
+        manifest_id = replication_queue.record(**changes)
+    except Exception as e:
+        app.logger.error(f"Failed to queue regional replication: {e}")
+        return {'replication': None, 'replication_error': str(e)}
+    content_catalogue.set_replication(stream_folder, list(regional_propagator.targets), replication.PENDING)
+    return {'replication': manifest_id}
+
+
+def stream_of(path):
+    """Catalogue row a bucket key belongs to: hls/<stream>/... or videos/<file>"""
+    kind, _, rest = path.partition('/')
+    if kind == 'hls':
+        return rest.split('/', 1)[0] or None
+    if kind == 'videos':
+        entry = content_catalogue.find_video(rest)
+        return entry['stream_folder'] if entry else None
+    return None
+
+
+def record_replication(region, changes, errors):
+    """Replication callback: roll per-object results for a region up to catalogue rows"""
+    failed = {}
+    for change in changes:
+        path = propagation.change_path(change)
+        stream_folder = stream_of(path)
+        if stream_folder:
+            failed[stream_folder] = failed.get(stream_folder, False) or path in errors
+    for stream_folder, has_failures in failed.items():
+        content_catalogue.set_replication(stream_folder, [region],
+                                          replication.FAILED if has_failures else replication.REPLICATED)
+
+
+def hls_output_exists(entry):
+    return content_storage.exists(f"hls/{entry['stream_folder']}/{MASTER_PLAYLIST}")
+
+
+def find_active_transcode(sha256):
+    """Queued or running job for the same content, if any"""
+    for job in transcode_queue.list(limit=None):
+        if job['status'] in job_queue.ACTIVE_STATES and job['payload'].get('sha256') == sha256:
+            return job
+    return None
+
+
+def publish_upload(staged_path, client_filename, sha256, size):
+    """Turn a fully staged upload into a transcoding job (or a cache hit)
+
+    Returns (response body, HTTP status). The staged file is consumed either way.
+    """
+    if not allowed_file(client_filename):
+        os.remove(staged_path)
+        return {'status': 'error', 'error': 'No valid video selected'}, 400
+
+    original_filename = secure_filename(client_filename)
+    name_only, extension = os.path.splitext(original_filename)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    original_filename = f"{name_only}_{timestamp}.{extension}"
+
+    # Same bytes as an earlier upload: drop the copy and point at the existing renditions
+    cached = transcode_cache.lookup(sha256, exists=hls_output_exists)
+    active = None if cached else find_active_transcode(sha256)
+    if cached or active:
+        os.remove(staged_path)
+        stream_folder = cached['stream_folder'] if cached else active['payload']['stream_folder']
+        app.logger.info(f"♻️  {original_filename} matches {stream_folder} ({sha256[:12]}), skipping transcode")
+        return {'status': 'duplicate', 'filename': original_filename, 'sha256': sha256,
+                'stream_folder': stream_folder, 'job': active}, 200
+
+    stream_folder = f"{name_only}_{timestamp}"
+    content_catalogue.upsert(stream_folder, video=original_filename, size=size, sha256=sha256,
+                             status=catalogue.TRANSCODING)
+    job = transcode_queue.submit({
+        'staged_path': staged_path,
+        'video_path': os.path.join(MOUNT_PATH, 'videos', original_filename),
+        'filename': original_filename,
+        'stream_folder': stream_folder,
+        'sha256': sha256,
+        'size': size
+    })
+    app.logger.info(f"📥 Queued transcoding job {job['id']} for {original_filename}")
+    return {'status': 'queued', 'filename': original_filename, 'sha256': sha256,
+            'stream_folder': stream_folder, 'job': job}, 202
+
+
+content_storage = storage.from_env(MOUNT_PATH)
+regional_propagator = propagation.Propagator(
+    content_storage,
+    propagation.regional_targets(client=getattr(content_storage, 'client', None)),
+    logger=app.logger
+)
+replication_queue = replication.ReplicationQueue(
+    regional_propagator, MANIFESTS_PATH,
+    os.path.join(JOBS_PATH, 'replication-jobs.jsonl'),
+    on_replicated=record_replication,
+    logger=app.logger
+)
+content_catalogue = catalogue.Catalogue(os.path.join(JOBS_PATH, 'catalogue.db'))
+media_cache = MediaCache(content_storage)
+transcode_cache = TranscodeCache(os.path.join(JOBS_PATH, 'transcode-cache.json'))
+upload_store = uploads.UploadStore()
+
+transcode_queue = job_queue.JobQueue(
+    'transcode', process_transcode_job,
+    os.path.join(JOBS_PATH, 'transcode-jobs.jsonl'),
+    workers=TRANSCODE_WORKERS,
+    max_attempts=TRANSCODE_MAX_ATTEMPTS,
+    retry_backoff=TRANSCODE_RETRY_BACKOFF,
+    logger=app.logger
+)
 
 
 # Add this global variable after the Flask app initialization
@@ -66,65 +260,17 @@ def background_autoscaler_check():
     global autoscaler_enabled
 
     while autoscaler_enabled:
+        cycle_start = time.perf_counter()
+        cycle_failed = False
         try:
             app.logger.info("🤖 Running automatic autoscaler check...")
-
-            # Get traffic and latency data
-            traffic_data = cold_autoscaler.get_mock_traffic_data()
-            latency_data = cold_autoscaler.get_mock_latency_data()
-            geographic_analysis = cold_autoscaler.analyze_geographic_traffic(traffic_data)
-            scale_decision = cold_autoscaler.should_scale_based_on_traffic(geographic_analysis, latency_data)
-
-            current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-            if scale_decision['should_scale']:
-                app.logger.info(f"📈 Autoscaler decision: {scale_decision['reason']}")
-
-                # Execute scaling
-                for region in scale_decision['target_regions']:
-                    app.logger.info(f"🔄 Auto-scaling {region} to {scale_decision['target_nodes']} nodes")
-                    result = cold_autoscaler.scale_cluster_nodes(region, scale_decision['target_nodes'])
-
-                    if result['status'] == 'error':
-                        app.logger.error(f"❌ Failed to scale {region}: {result.get('error', 'Unknown error')}")
-                    elif result['status'] == 'no_change':
-                        app.logger.info(f"ℹ️  {region}: {result.get('message', 'No change needed')}")
-                    else:
-                        app.logger.info(f"✅ {region}: {result.get('message', 'Scaling completed')}")
-
-            else:
-                app.logger.info(f"📊 No scaling needed: {scale_decision['reason']}")
-
-                # Check if cold regions need to be scaled to zero
-                for region in cold_autoscaler.COLD_REGIONS:
-                    cluster_info = cold_autoscaler.get_cluster_info(region)
-                    if cluster_info and cluster_info['status'] == 'RUNNING':
-                        # Check if cluster has nodes that could be scaled down
-                        for pool in cluster_info.get('node_pools', []):
-                            autoscaling = pool.get('autoscaling', {})
-                            current_max = autoscaling.get('maxNodeCount', 0)
-
-                            if current_max > 0:
-                                app.logger.info(f"🔄 Setting {region} to scale-to-zero (current max: {current_max})")
-                                result = cold_autoscaler.scale_cluster_nodes(region, 0)
-
-                                if result['status'] == 'no_change':
-                                    app.logger.info(f"ℹ️  {region}: Already at scale-to-zero")
-                                elif result['status'] != 'error':
-                                    app.logger.info(f"✅ {region}: Set to scale-to-zero")
-                                else:
-                                    app.logger.error(f"❌ Failed to scale down {region}")
-
-                                break  # Only need to check first pool
-
-            # Log summary
-            app.logger.info(f"📋 Autoscaler check completed at {current_time}")
-            app.logger.info(f"📊 Traffic: Asia {geographic_analysis['regional_percentages']['asia']:.1f}% ({geographic_analysis['regional_traffic']['asia']}), Total {geographic_analysis['total_requests']}")
-            app.logger.info(f"⏱️  Latency: {latency_data['hot_regions_avg_latency']}ms avg")
-
+            cold_autoscaler.run_autoscaler_cycle(app.logger)
         except Exception as e:
+            cycle_failed = True
             app.logger.error(f"💥 Background autoscaler error: {str(e)}")
 
+        autoscaler_metrics.observe_cycle(time.perf_counter() - cycle_start, cycle_failed)
+
         # Wait 5 minutes (300 seconds) before next check
         time.sleep(300)
 
@@ -155,6 +301,15 @@ def health():
     """Health check endpoint for load balancer (bypasses IAP)"""
     return 'OK', 200
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint for the autoscaler metrics"""
+    exposition = autoscaler_metrics.render()
+    if exposition is None:
+        return 'prometheus_client is not installed', 503
+    body, content_type = exposition
+    return Response(body, content_type=content_type)
+
 @app.route('/user-info')
 def user_info():
     """Get IAP user information from headers"""
@@ -182,13 +337,12 @@ def inject_user():
 
 @app.route('/')
 def index():
-    videos_dir = os.path.join(MOUNT_PATH, 'videos')
-    hls_dir = os.path.join(MOUNT_PATH, 'hls')
-    os.makedirs(videos_dir, exist_ok=True)
-    os.makedirs(hls_dir, exist_ok=True)
-    videos = sorted(os.listdir(videos_dir)) if os.path.exists(videos_dir) else []
-    hls_streams = sorted(os.listdir(hls_dir)) if os.path.exists(hls_dir) else []
-    return render_template('index.html', videos=videos, hls_streams=hls_streams)
+    # Served from the catalogue; nothing here lists the bucket
+    query = request.args.get('q', '').strip()
+    page = max(1, request.args.get('page', 1, type=int))
+    entries, total = content_catalogue.search(query, page)
+    pages = max(1, math.ceil(total / catalogue.CATALOGUE_PAGE_SIZE))
+    return render_template('index.html', entries=entries, query=query, page=page, pages=pages, total=total)
 
 @app.route('/upload', methods=['GET', 'POST'])
 def upload():
@@ -198,102 +352,188 @@ def upload():
             flash('No valid video selected', 'danger')
             return redirect(request.url)
 
-        videos_dir = os.path.join(MOUNT_PATH, 'videos')
-        hls_dir = os.path.join(MOUNT_PATH, 'hls')
-        os.makedirs(videos_dir, exist_ok=True)
-        os.makedirs(hls_dir, exist_ok=True)
-
-        original_filename = secure_filename(file.filename)
-        name_only, extension = os.path.splitext(original_filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        original_filename = f"{name_only}_{timestamp}.{extension}"
-        video_path = os.path.join(videos_dir, original_filename)
-        file.save(video_path)
-
-        stream_folder = f"{name_only}_{timestamp}"
-        hls_output_dir = os.path.join(hls_dir, stream_folder)
-
-        if os.path.isdir(hls_output_dir):
-            shutil.rmtree(hls_output_dir)
+        # The body was already streamed to staging and hashed by StagingRequest
+        staged = file.stream
+        body, status = publish_upload(staged.detach(), file.filename, staged.hexdigest(), staged.size)
 
-        try:
-            make_hls(video_path, hls_output_dir)
-
-            try:
-                result = subprocess.run(['/opt/content/scripts/sync-to-regions.sh'],
-                                        check=True,
-                                        capture_output=True,
-                                        text=True)
-                app.logger.info(f"Sync script output: {result.stdout}")
-                if result.stderr:
-                    app.logger.warning(f"Sync script stderr: {result.stderr}")
-                flash(f'Uploaded, converted & propagated to regions: {original_filename}', 'success')
-            except subprocess.SubprocessError as e:
-                flash(f'Content uploaded but region sync failed: {e}', 'warning')
-
-        except Exception as e:
-            flash(f'Error transcoding: {e}', 'danger')
-            if os.path.exists(hls_output_dir):
-                shutil.rmtree(hls_output_dir)
+        if request.accept_mimetypes.best == 'application/json':
+            return jsonify(body), status
+        if body['status'] == 'duplicate':
+            flash(f"Identical content already published as {body['stream_folder']}; reusing its HLS stream", 'success')
+        else:
+            flash(f"Uploaded {body['filename']}; transcoding job {body['job']['id'][:8]} queued", 'success')
         return redirect(url_for('index'))
     return render_template('upload.html')
 
-@app.route('/delete/video/<filename>', methods=['POST'])
-def delete_video(filename):
-    target_video = os.path.join(MOUNT_PATH, 'videos', filename)
-    filename_no_ext, _ = os.path.splitext(filename)
-    target_hls = os.path.join(MOUNT_PATH, 'hls', filename_no_ext, 'playlist.m3u8')
-    target_playlist0 = os.path.join(MOUNT_PATH, 'hls', filename_no_ext, 'playlist0.ts')
-    target_playlist1 = os.path.join(MOUNT_PATH, 'hls', filename_no_ext, 'playlist1.ts')
-    target_dir = os.path.join(MOUNT_PATH, 'hls', filename_no_ext)
-    if os.path.isdir(target_dir):
-        shutil.rmtree(target_dir)
-        app.logger.info(f"Deleted HLS directory: {target_dir}")
-    if os.path.isfile(target_playlist0):
-        os.remove(target_playlist0)
-        app.logger.info(f"Deleted HLS file: {target_playlist0}")
-    if os.path.isfile(target_playlist1):
-        os.remove(target_playlist1)
-        app.logger.info(f"Deleted HLS file: {target_playlist1}")
-    if os.path.isfile(target_hls):
-        os.remove(target_hls)
-        app.logger.info(f"Deleted HLS playlist: {target_hls}")
-    if os.path.isfile(target_video):
-        os.remove(target_video)
+# -----------------------------------------------------------------------------
+# Resumable uploads (tus 1.0 core + creation/termination)
+# -----------------------------------------------------------------------------
 
-    try:
-        result = subprocess.run(['/opt/content/scripts/sync-to-regions.sh'],
-                                check=True,
-                                capture_output=True,
-                                text=True)
-        app.logger.info(f"Sync script output: {result.stdout}")
-        if result.stderr:
-            app.logger.warning(f"Sync script stderr: {result.stderr}")
-        flash(f'Deleted video: {filename}', 'warning')
-    except subprocess.SubprocessError as e:
-        app.logger.error(f"Sync script failed: {e}")
+def tus_response(body='', status=204, **headers):
+    response = Response(body, status=status)
+    response.headers['Tus-Resumable'] = uploads.TUS_VERSION
+    response.headers['Cache-Control'] = 'no-store'
+    for name, value in headers.items():
+        response.headers[name.replace('_', '-')] = str(value)
+    return response
+
+@app.errorhandler(uploads.UploadError)
+def upload_error(e):
+    response = jsonify({'status': 'error', 'error': str(e)})
+    response.status_code = e.status
+    response.headers['Tus-Resumable'] = uploads.TUS_VERSION
+    return response
+
+@app.route('/api/uploads', methods=['OPTIONS'])
+def upload_options():
+    return tus_response(Tus_Version=uploads.TUS_VERSION, Tus_Extension='creation,termination')
+
+@app.route('/api/uploads', methods=['POST'])
+def create_upload():
+    """Start a resumable upload: Upload-Length plus Upload-Metadata with a base64 filename"""
+    length = request.headers.get('Upload-Length', type=int)
+    if length is None:
+        raise uploads.UploadError('Upload-Length header is required')
+    metadata = uploads.parse_metadata(request.headers.get('Upload-Metadata'))
+    if not allowed_file(metadata.get('filename', '')):
+        raise uploads.UploadError('filename metadata with a supported video extension is required')
+    upload = upload_store.create(length, metadata)
+    return tus_response(status=201, Location=url_for('upload_resource', upload_id=upload['id']),
+                        Upload_Offset=0)
+
+@app.route('/api/uploads/<upload_id>', methods=['HEAD'])
+def upload_offset(upload_id):
+    upload = upload_store.get(upload_id)
+    return tus_response(status=200, Upload_Offset=upload['offset'], Upload_Length=upload['length'])
+
+@app.route('/api/uploads/<upload_id>', methods=['PATCH'])
+def upload_chunk(upload_id):
+    """Append the request body at Upload-Offset; the last chunk hands the file to the transcoder"""
+    if request.mimetype != 'application/offset+octet-stream':
+        raise uploads.UploadError('Content-Type must be application/offset+octet-stream', 415)
+    offset = request.headers.get('Upload-Offset', type=int)
+    if offset is None:
+        raise uploads.UploadError('Upload-Offset header is required')
+
+    upload = upload_store.append(upload_id, offset, request.stream)
+    if upload['offset'] == upload['length'] and upload['result'] is None:
+        staged_path, sha256, size = upload_store.complete(upload_id)
+        body, _ = publish_upload(staged_path, upload['metadata']['filename'], sha256, size)
+        upload_store.finish(upload_id, body)
+    return tus_response(Upload_Offset=upload['offset'])
+
+@app.route('/api/uploads/<upload_id>', methods=['GET'])
+def upload_resource(upload_id):
+    """State of a resumable upload, including its transcoding job once complete"""
+    return jsonify(upload_store.get(upload_id))
+
+@app.route('/api/uploads/<upload_id>', methods=['DELETE'])
+def delete_upload(upload_id):
+    upload_store.get(upload_id)
+    upload_store.delete(upload_id)
+    return tus_response()
+
+@app.route('/api/jobs')
+def list_jobs():
+    """Recent transcoding jobs, newest first (?status=queued|running|succeeded|failed)"""
+    limit = request.args.get('limit', 50, type=int)
+    return jsonify({'jobs': transcode_queue.list(request.args.get('status'), limit)})
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Status, attempts and progress of one transcoding job"""
+    job = transcode_queue.get(job_id)
+    if job is None:
+        return jsonify({'status': 'error', 'error': 'job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/catalogue')
+def catalogue_search():
+    """A page of catalogue rows, newest first (?q=<name substring>&page=&per_page=)"""
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(200, max(1, request.args.get('per_page', catalogue.CATALOGUE_PAGE_SIZE, type=int)))
+    entries, total = content_catalogue.search(request.args.get('q', '').strip(), page, per_page)
+    return jsonify({'entries': entries, 'total': total, 'page': page, 'per_page': per_page})
+
+@app.route('/api/replication')
+def replication_status():
+    """Per-region replication backlog and lag, and the most recent region jobs"""
+    return jsonify(replication_queue.status(request.args.get('limit', 20, type=int)))
+
+@app.route('/api/replication/objects')
+def replication_objects():
+    """Per-region status of the most recently changed objects (?prefix=hls/<stream>/)"""
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify({'objects': replication_queue.object_status(request.args.get('prefix', ''), limit)})
 
-    else:
-        flash('Video not found', 'danger')
+@app.route('/delete/video/<filename>', methods=['POST'])
+def delete_video(filename):
+    # Uploads are named '<stream>..<ext>', so the stream folder comes from the catalogue
+    entry = content_catalogue.find_video(filename)
+    stream_folder = entry['stream_folder'] if entry else os.path.splitext(filename)[0]
+    removed = content_storage.delete_prefix(f"hls/{stream_folder}/")
+    if removed:
+        app.logger.info(f"Deleted {removed} HLS objects under hls/{stream_folder}/")
+    content_storage.delete(f"videos/{filename}")
+    transcode_cache.invalidate(stream_folder=stream_folder, video=filename)
+    content_catalogue.remove(stream_folder, video=True, hls=True)
+    media_cache.invalidate(f"hls/{stream_folder}/")
+
+    result = replicate_changes(stream_folder, delete_keys=[f"videos/{filename}"],
+                               delete_prefixes=[f"hls/{stream_folder}/"])
+    flash(f'Deleted video: {filename}', 'warning')
+    if result.get('replication_error'):
+        flash(f"Regional buckets not updated: {result['replication_error']}", 'danger')
     return redirect(url_for('index'))
 
 @app.route('/delete/hls/<folder>', methods=['POST'])
 def delete_hls(folder):
-    target = os.path.join(MOUNT_PATH, 'hls', folder)
-    if os.path.isdir(target):
-        shutil.rmtree(target)
+    transcode_cache.invalidate(stream_folder=folder)
+    content_catalogue.remove(folder, hls=True)
+    media_cache.invalidate(f"hls/{folder}/")
+    if content_storage.delete_prefix(f"hls/{folder}/"):
         flash(f'Deleted HLS stream: {folder}', 'warning')
+        result = replicate_changes(folder, delete_prefixes=[f"hls/{folder}/"])
+        if result.get('replication_error'):
+            flash(f"Regional buckets not updated: {result['replication_error']}", 'danger')
     else:
         flash('HLS stream not found', 'danger')
     return redirect(url_for('index'))
 
 @app.route('/videos/<path:filename>')
 def serve_video(filename):
-    return send_from_directory(os.path.join(MOUNT_PATH, 'videos'), filename)
+    # Byte ranges and If-None-Match/If-Modified-Since are answered by send_file,
+    # so seeking in the preview only reads the requested range through the mount
+    response = send_from_directory(os.path.join(MOUNT_PATH, 'videos'), filename, max_age=VIDEO_MAX_AGE)
+    response.cache_control.public = True
+    return response
 
 @app.route('/hls/<folder>/<path:filename>')
 def serve_hls(folder, filename):
-    return send_from_directory(os.path.join(MOUNT_PATH, 'hls', folder), filename)
+    """HLS objects from the local media cache, with strong ETags and ranges
+
+    Segments are cacheable forever; playlists only briefly.
+    """
+    key = f"hls/{folder}/{filename}"
+    playlist = filename.endswith('.m3u8')
+    # A second attempt covers a cached file being evicted between fetch and open;
+    # an object the bucket does not have is a 404 straight away
+    for _ in range(2):
+        try:
+            path, etag = media_cache.fetch(key)
+            response = send_file(path, conditional=True, etag=etag,
+                                 max_age=HLS_PLAYLIST_MAX_AGE if playlist else HLS_SEGMENT_MAX_AGE)
+            break
+        except FileNotFoundError:
+            continue
+        except (ObjectNotFound, ValueError):
+            abort(404)
+    else:
+        abort(404)
+    response.cache_control.public = True
+    if not playlist:
+        response.cache_control.immutable = True
+    return response
 
 # -----------------------------------------------------------------------------
 # Cold Autoscaler Routes
@@ -471,5 +711,16 @@ def autoscaler_scale():
 
 if __name__ == '__main__':
     start_background_autoscaler()
+    debug = True
+    # The debug reloader runs this file in a watcher parent and a serving child;
+    # only the child may own the job queues or every job would run twice
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        transcode_queue.start()
+        atexit.register(transcode_queue.stop)
+        replication_queue.start()
+        atexit.register(replication_queue.stop)
+        if content_catalogue.count() == 0:
+            seeded = content_catalogue.rebuild(content_storage)
+            app.logger.info(f"📚 Seeded the content catalogue with {seeded} entries from the bucket")
     port = int(os.environ.get('PORT', 80))
-    app.run(host='0.0.0.0', port=port, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=port, debug=debug)
\ No newline at end of file
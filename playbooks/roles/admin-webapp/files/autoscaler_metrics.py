@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Prometheus metrics for the admin webapp's cold autoscaler
+Recorded on the hot path by cold_autoscaler.py and app.py and exposed at
+/metrics. Without prometheus_client every recorder is a no-op.
+"""
+
+import threading
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:
+    prometheus_client = None
+
+METRIC_PREFIX = 'cdn_autoscaler'
+
+CYCLE_BUCKETS = (1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+LOG_FETCH_BUCKETS = (0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LOG_ENTRIES_BUCKETS = (0, 100, 500, 1000, 5000, 10000, 50000, 100000)
+GCLOUD_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 180, 300)
+
+_geoip_lock = threading.Lock()
+_geoip_counts = {'hits': 0, 'lookups': 0}
+
+if prometheus_client:
+    CYCLE_DURATION = Histogram(f'{METRIC_PREFIX}_cycle_duration_seconds',
+                               'Duration of one background autoscaler check', buckets=CYCLE_BUCKETS)
+    CYCLE_ERRORS = Counter(f'{METRIC_PREFIX}_cycle_errors_total',
+                           'Background autoscaler checks that raised')
+    LOG_FETCH_DURATION = Histogram(f'{METRIC_PREFIX}_log_fetch_duration_seconds',
+                                   'Duration of the load balancer log fetch', buckets=LOG_FETCH_BUCKETS)
+    LOG_ENTRIES = Histogram(f'{METRIC_PREFIX}_log_entries_processed',
+                            'Load balancer log entries processed per fetch', buckets=LOG_ENTRIES_BUCKETS)
+    GEOIP_LOOKUPS = Counter(f'{METRIC_PREFIX}_geoip_lookups_total',
+                            'Client IP to country resolutions', ['result'])
+    GEOIP_HIT_RATIO = Gauge(f'{METRIC_PREFIX}_geoip_cache_hit_ratio',
+                            'Share of GeoIP resolutions served from the cache since start')
+    DECISIONS = Counter(f'{METRIC_PREFIX}_decisions_total',
+                        'Scaling decision outcomes per region', ['region', 'outcome'])
+    GCLOUD_DURATION = Histogram(f'{METRIC_PREFIX}_gcloud_duration_seconds',
+                                'gcloud call latency', ['command'], buckets=GCLOUD_BUCKETS)
+    GCLOUD_FAILURES = Counter(f'{METRIC_PREFIX}_gcloud_failures_total',
+                              'gcloud calls that failed or timed out', ['command'])
+    NODE_LIMIT = Gauge(f'{METRIC_PREFIX}_node_limit',
+                       'Current node pool autoscaling limit of a cold region', ['region', 'bound'])
+
+
+def available():
+    return prometheus_client is not None
+
+
+def observe_cycle(seconds, failed=False):
+    if prometheus_client:
+        CYCLE_DURATION.observe(seconds)
+        if failed:
+            CYCLE_ERRORS.inc()
+
+
+def observe_log_fetch(seconds, entries):
+    if prometheus_client:
+        LOG_FETCH_DURATION.observe(seconds)
+        LOG_ENTRIES.observe(entries)
+
+
+def record_geoip_lookup(cache_hit):
+    if prometheus_client:
+        GEOIP_LOOKUPS.labels(result='cache_hit' if cache_hit else 'cache_miss').inc()
+        with _geoip_lock:
+            _geoip_counts['lookups'] += 1
+            _geoip_counts['hits'] += int(cache_hit)
+            GEOIP_HIT_RATIO.set(_geoip_counts['hits'] / _geoip_counts['lookups'])
+
+
+def record_decision(region, outcome):
+    """outcome: scale_up, scale_down, hold or error"""
+    if prometheus_client:
+        DECISIONS.labels(region=region, outcome=outcome).inc()
+
+
+def observe_gcloud(command, seconds, failed=False):
+    if prometheus_client:
+        GCLOUD_DURATION.labels(command=command).observe(seconds)
+        if failed:
+            GCLOUD_FAILURES.labels(command=command).inc()
+
+
+def set_node_limits(region, min_nodes, max_nodes):
+    if prometheus_client:
+        NODE_LIMIT.labels(region=region, bound='min').set(min_nodes)
+        NODE_LIMIT.labels(region=region, bound='max').set(max_nodes)
+
+
+def render():
+    """(body, content type) of the Prometheus text exposition, or None without prometheus_client"""
+    if not prometheus_client:
+        return None
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
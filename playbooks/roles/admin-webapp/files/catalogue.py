@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Content catalogue for the admin dashboard
+One SQLite row per uploaded video and its HLS stream, with the metadata the
+index page shows (size, duration, renditions, segment count, created time,
+per-region replication status). Rows are written by the upload, transcode,
+replication and delete events, so listing, searching and paging the library
+never touch the bucket. rebuild() seeds an empty catalogue from the bucket
+once, for content published before the catalogue existed.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+from transcoder import MASTER_PLAYLIST, VARIANT_PLAYLIST, rendition_height
+
+CATALOGUE_PAGE_SIZE = int(os.environ.get('CATALOGUE_PAGE_SIZE', '20'))
+
+TRANSCODING = 'transcoding'
+PUBLISHED = 'published'
+FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS content (
+    stream_folder TEXT PRIMARY KEY,
+    video TEXT,
+    has_video INTEGER NOT NULL DEFAULT 0,
+    has_hls INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL,
+    error TEXT,
+    size INTEGER,
+    duration REAL,
+    renditions TEXT NOT NULL DEFAULT '[]',
+    segments INTEGER,
+    sha256 TEXT,
+    replication TEXT NOT NULL DEFAULT '{}',
+    created_at TEXT NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS content_created ON content (created_at);
+CREATE INDEX IF NOT EXISTS content_video ON content (video);
+"""
+
+COLUMNS = ('video', 'has_video', 'has_hls', 'status', 'error', 'size', 'duration', 'renditions', 'segments', 'sha256')
+
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def replication_summary(regions):
+    """Overall replication state of a row from its {region: status}"""
+    states = set(regions.values())
+    if not states:
+        return None
+    if 'failed' in states:
+        return 'failed'
+    return 'replicated' if states == {'replicated'} else 'pending'
+
+
+class Catalogue:
+    """SQLite-backed content index; one connection shared by all threads behind a lock"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        with self._lock, self._db:
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.executescript(SCHEMA)
+
+    def _row(self, row):
+        if row is None:
+            return None
+        entry = dict(row)
+        entry['renditions'] = json.loads(entry['renditions'])
+        entry['replication'] = json.loads(entry['replication'])
+        entry['replication_status'] = replication_summary(entry['replication'])
+        entry['has_video'] = bool(entry['has_video'])
+        entry['has_hls'] = bool(entry['has_hls'])
+        return entry
+
+    def upsert(self, stream_folder, **fields):
+        """Create or update a row; renditions is a list, other fields are stored as given"""
+        unknown = set(fields) - set(COLUMNS)
+        if unknown:
+            raise ValueError(f"unknown catalogue fields: {', '.join(sorted(unknown))}")
+        if 'renditions' in fields:
+            fields['renditions'] = json.dumps(fields['renditions'])
+        now = utc_now()
+        names = list(fields)
+        with self._lock, self._db:
+            self._db.execute(
+                f"INSERT INTO content (stream_folder, status, created_at, updated_at"
+                f"{''.join(', ' + name for name in names)}) "
+                f"VALUES (?, ?, ?, ?{', ?' * len(names)}) "
+                f"ON CONFLICT (stream_folder) DO UPDATE SET updated_at = excluded.updated_at"
+                f"{''.join(f', {name} = excluded.{name}' for name in names)}",
+                [stream_folder, fields.get('status', PUBLISHED), now, now] + [fields[name] for name in names]
+            )
+
+    def get(self, stream_folder):
+        with self._lock:
+            row = self._db.execute('SELECT * FROM content WHERE stream_folder = ?', (stream_folder,)).fetchone()
+        return self._row(row)
+
+    def find_video(self, video):
+        with self._lock:
+            row = self._db.execute('SELECT * FROM content WHERE video = ?', (video,)).fetchone()
+        return self._row(row)
+
+    def remove(self, stream_folder, video=False, hls=False):
+        """Mark the video and/or HLS stream of a row as deleted; rows with neither left are dropped"""
+        with self._lock, self._db:
+            if video:
+                self._db.execute('UPDATE content SET has_video = 0, updated_at = ? WHERE stream_folder = ?',
+                                 (utc_now(), stream_folder))
+            if hls:
+                self._db.execute('UPDATE content SET has_hls = 0, renditions = ?, segments = NULL, updated_at = ? '
+                                 'WHERE stream_folder = ?', ('[]', utc_now(), stream_folder))
+            self._db.execute('DELETE FROM content WHERE stream_folder = ? AND has_video = 0 AND has_hls = 0 '
+                             'AND status != ?', (stream_folder, TRANSCODING))
+
+    def set_replication(self, stream_folder, regions, status):
+        """Record the replication status of a row in the given regions"""
+        with self._lock, self._db:
+            row = self._db.execute('SELECT replication FROM content WHERE stream_folder = ?',
+                                   (stream_folder,)).fetchone()
+            if row is None:
+                return
+            replication = json.loads(row['replication'])
+            replication.update({region: status for region in regions})
+            self._db.execute('UPDATE content SET replication = ? WHERE stream_folder = ?',
+                             (json.dumps(replication, sort_keys=True), stream_folder))
+
+    def search(self, query='', page=1, per_page=None):
+        """A page of rows, newest first, whose video or stream name contains query; returns (rows, total)"""
+        per_page = per_page or CATALOGUE_PAGE_SIZE
+        pattern = '%' + query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        where = "WHERE stream_folder LIKE ? ESCAPE '\\' OR video LIKE ? ESCAPE '\\'"
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM content {where}", (pattern, pattern)).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT * FROM content {where} ORDER BY created_at DESC, stream_folder LIMIT ? OFFSET ?",
+                (pattern, pattern, per_page, (max(1, page) - 1) * per_page)
+            ).fetchall()
+        return [self._row(row) for row in rows], total
+
+    def count(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM content').fetchone()[0]
+
+    def rebuild(self, storage):
+        """Seed rows from the objects under videos/ and hls/ (one listing each, no per-object calls); returns how many"""
+        streams = {}
+        for key in storage.list_keys('hls/'):
+            parts = key.split('/')
+            if len(parts) < 3:
+                continue
+            stream = streams.setdefault(parts[1], {'renditions': set(), 'segments': 0, 'playlist': False})
+            if parts[2:] == [MASTER_PLAYLIST]:
+                stream['playlist'] = True
+            elif len(parts) == 4 and parts[3] == VARIANT_PLAYLIST:
+                stream['renditions'].add(parts[2])
+            elif key.endswith('.ts'):
+                stream['segments'] += 1
+
+        videos = {}
+        sizes = {}
+        for key, size in storage.list_objects('videos/'):
+            video = key[len('videos/'):]
+            if video and '/' not in video:
+                # Upload names are '<stream>..<ext>'
+                videos[video.rsplit('.', 1)[0].rstrip('.')] = video
+                sizes[video] = size
+
+        for stream_folder in sorted(set(streams) | set(videos)):
+            stream = streams.get(stream_folder)
+            video = videos.get(stream_folder)
+            self.upsert(
+                stream_folder,
+                video=video,
+                has_video=int(video is not None),
+                has_hls=int(bool(stream and stream['playlist'])),
+                status=PUBLISHED,
+                size=sizes[video] if video else None,
+                renditions=sorted(stream['renditions'], key=rendition_height, reverse=True) if stream else [],
+                segments=stream['segments'] if stream else None
+            )
+        return len(set(streams) | set(videos))
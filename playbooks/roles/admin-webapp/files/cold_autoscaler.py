@@ -14,11 +14,15 @@ from datetime import datetime, timedelta
 import subprocess
 import json
 from datetime import datetime, timedelta, timezone
-import geoip2.database
 import struct
 import socket
+import threading
+import time
+from collections import OrderedDict
 from pathlib import Path
 
+import autoscaler_metrics
+
 
 # Configure logging
 logging.basicConfig(
@@ -41,6 +45,10 @@ ASIA_REQUESTS_THRESHOLD_LOWER = int(os.environ.get('ASIA_REQUESTS_THRESHOLD_LOWE
 ASIA_REQUESTS_PERCENTAGE_THRESHOLD_LOWER = float(os.environ.get('ASIA_REQUESTS_PERCENTAGE_THRESHOLD_LOWER', '2.0'))
 LATENCY_THRESHOLD_LOWER_MS = int(os.environ.get('LATENCY_THRESHOLD_LOWER_MS', '200'))
 
+# Client IPs repeat across requests and cycles, so resolved countries are kept in an LRU cache
+GEOIP_CACHE_SIZE = int(os.environ.get('GEOIP_CACHE_SIZE', '100000'))
+_country_cache = OrderedDict()
+_country_cache_lock = threading.Lock()
 
 
 def download_geoip_database():
@@ -60,7 +68,31 @@ def download_geoip_database():
     return db_path
 
 def get_country_from_ip(ip_address, geoip_reader):
-    """Get country from IP address using GeoIP database"""
+    """Get country from IP address, from the LRU cache or the GeoIP database
+
+    Only countries the database resolved are cached. Range fallbacks and
+    'unknown' are not, so a database loaded in a later cycle can still
+    resolve those addresses.
+    """
+    with _country_cache_lock:
+        country = _country_cache.get(ip_address)
+        if country is not None:
+            _country_cache.move_to_end(ip_address)
+    autoscaler_metrics.record_geoip_lookup(country is not None)
+    if country is not None:
+        return country
+
+    country = lookup_geoip_country(ip_address, geoip_reader)
+    if country is None:
+        return fallback_country(ip_address)
+    with _country_cache_lock:
+        _country_cache[ip_address] = country
+        if len(_country_cache) > GEOIP_CACHE_SIZE:
+            _country_cache.popitem(last=False)
+    return country
+
+def lookup_geoip_country(ip_address, geoip_reader):
+    """Country of an IP address in the GeoIP database, or None"""
     try:
         if geoip_reader:
             response = geoip_reader.city(ip_address)
@@ -69,8 +101,10 @@ def get_country_from_ip(ip_address, geoip_reader):
                 return country.lower()
     except Exception:
         pass
+    return None
 
-    # Fallback: Use IP ranges for major cloud providers/regions
+def fallback_country(ip_address):
+    """Country from known cloud IP ranges, or 'unknown'"""
     try:
         # Europe ranges
         if ip_address.startswith(('35.195.', '35.205.', '35.206.', '35.207.', '34.89.', '34.105.')):
@@ -86,10 +120,28 @@ def get_country_from_ip(ip_address, geoip_reader):
 
     return 'unknown'
 
+def gcloud_command_name(cmd):
+    """Metric label for a gcloud command line, e.g. 'logging read' or 'container clusters resize'"""
+    words = cmd.split() if isinstance(cmd, str) else cmd
+    return ' '.join(words[1:4] if words[1:2] == ['container'] else words[1:3])
+
+def run_timed_gcloud(cmd, **kwargs):
+    """subprocess.run for a gcloud command, recording its latency and failures"""
+    command = gcloud_command_name(cmd)
+    start = time.perf_counter()
+    failed = False
+    try:
+        return subprocess.run(cmd, **kwargs)
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
+        failed = True
+        raise
+    finally:
+        autoscaler_metrics.observe_gcloud(command, time.perf_counter() - start, failed)
+
 def run_gcloud_command(cmd):
     """Execute gcloud command and return output"""
     try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, check=True, timeout=30)
+        result = run_timed_gcloud(cmd, shell=True, capture_output=True, text=True, check=True, timeout=30)
         return result.stdout
     except subprocess.CalledProcessError as e:
         return None
@@ -209,12 +261,15 @@ def get_real_traffic_data():
         db_path = download_geoip_database()
         if db_path and db_path.exists():
             try:
+                import geoip2.database
                 geoip_reader = geoip2.database.Reader(str(db_path))
             except Exception as e:
                print(f"Failed to load GeoIP database: {e}")
 
         # Fetch recent logs (last 2 hours for more data)
+        fetch_start = time.perf_counter()
         logs = fetch_load_balancer_logs(hours=2)
+        autoscaler_metrics.observe_log_fetch(time.perf_counter() - fetch_start, len(logs))
 
         if not logs:
             # Fallback to mock data if no logs available
@@ -432,9 +487,18 @@ def get_cluster_info(region):
             '--format', 'json'
         ]
 
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        result = run_timed_gcloud(cmd, capture_output=True, text=True, check=True)
         cluster_info = json.loads(result.stdout)
 
+        if region in COLD_REGIONS:
+            for pool in cluster_info.get('nodePools', []):
+                autoscaling = pool.get('autoscaling', {})
+                autoscaler_metrics.set_node_limits(
+                    region,
+                    autoscaling.get('totalMinNodeCount', autoscaling.get('minNodeCount', 0)),
+                    autoscaling.get('totalMaxNodeCount', autoscaling.get('maxNodeCount', 0)))
+                break
+
         return {
             'name': cluster_name,
             'status': cluster_info.get('status', 'UNKNOWN'),
@@ -517,7 +581,7 @@ def scale_cluster_nodes(region, target_nodes):
                 '--quiet'
             ]
             logger.info(f"🔄 Updating autoscaling: {' '.join(cmd)}")
-            subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=180)
+            run_timed_gcloud(cmd, capture_output=True, text=True, check=True, timeout=180)
             cmd = [
                 'gcloud', 'container', 'node-pools', 'update', node_pool_name,
                 '--cluster', cluster_name,
@@ -529,7 +593,7 @@ def scale_cluster_nodes(region, target_nodes):
                 '--quiet'
             ]
             logger.info(f"🔄 Updating autoscaling: {' '.join(cmd)}")
-            subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=180)
+            run_timed_gcloud(cmd, capture_output=True, text=True, check=True, timeout=180)
 
             # Kill all nodes - direct resize to 0
             cmd = [
@@ -555,7 +619,7 @@ def scale_cluster_nodes(region, target_nodes):
 
 
             logger.info(f"🔄 Updating autoscaling: {' '.join(update_cmd)}")
-            subprocess.run(update_cmd, capture_output=True, text=True, check=True, timeout=180)
+            run_timed_gcloud(update_cmd, capture_output=True, text=True, check=True, timeout=180)
 
             # Scale up - first update autoscaling then resize
             update_cmd = [
@@ -570,7 +634,7 @@ def scale_cluster_nodes(region, target_nodes):
             ]
 
             logger.info(f"🔄 Updating autoscaling: {' '.join(update_cmd)}")
-            subprocess.run(update_cmd, capture_output=True, text=True, check=True, timeout=180)
+            run_timed_gcloud(update_cmd, capture_output=True, text=True, check=True, timeout=180)
 
             # Then resize to 1 node to trigger scaling
             cmd = [
@@ -583,7 +647,8 @@ def scale_cluster_nodes(region, target_nodes):
             ]
 
         logger.info(f"🔄 Executing: {' '.join(cmd)}")
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=300)
+        result = run_timed_gcloud(cmd, capture_output=True, text=True, check=True, timeout=300)
+        autoscaler_metrics.set_node_limits(region, min_nodes, max_nodes)
 
         return {
             'region': region,
@@ -602,4 +667,75 @@ def scale_cluster_nodes(region, target_nodes):
             'target_nodes': target_nodes,
             'status': 'error',
             'error': error_msg
-        }
\ No newline at end of file
+        }
+
+def run_autoscaler_cycle(log=None):
+    """One automatic autoscaler check: decide from traffic and latency, then scale the cold regions
+
+    Scales up the decision's target regions, or sets running cold regions back
+    to scale-to-zero when no scaling is needed. Outcomes are recorded in
+    autoscaler_metrics. Returns the scaling decision.
+    """
+    log = log or logger
+
+    # Get traffic and latency data
+    traffic_data = get_mock_traffic_data()
+    latency_data = get_mock_latency_data()
+    geographic_analysis = analyze_geographic_traffic(traffic_data)
+    scale_decision = should_scale_based_on_traffic(geographic_analysis, latency_data)
+
+    current_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    if scale_decision['should_scale']:
+        log.info(f"📈 Autoscaler decision: {scale_decision['reason']}")
+
+        # Execute scaling
+        for region in scale_decision['target_regions']:
+            log.info(f"🔄 Auto-scaling {region} to {scale_decision['target_nodes']} nodes")
+            result = scale_cluster_nodes(region, scale_decision['target_nodes'])
+
+            if result['status'] == 'error':
+                autoscaler_metrics.record_decision(region, 'error')
+                log.error(f"❌ Failed to scale {region}: {result.get('error', 'Unknown error')}")
+            elif result['status'] == 'no_change':
+                autoscaler_metrics.record_decision(region, 'hold')
+                log.info(f"ℹ️  {region}: {result.get('message', 'No change needed')}")
+            else:
+                autoscaler_metrics.record_decision(
+                    region, 'scale_up' if scale_decision['target_nodes'] > 0 else 'scale_down')
+                log.info(f"✅ {region}: {result.get('message', 'Scaling completed')}")
+
+    else:
+        log.info(f"📊 No scaling needed: {scale_decision['reason']}")
+
+        # Check if cold regions need to be scaled to zero
+        for region in COLD_REGIONS:
+            outcome = 'hold'
+            cluster_info = get_cluster_info(region)
+            if cluster_info and cluster_info['status'] == 'RUNNING':
+                # Check if cluster has nodes that could be scaled down
+                for pool in cluster_info.get('node_pools', []):
+                    autoscaling = pool.get('autoscaling', {})
+                    current_max = autoscaling.get('maxNodeCount', 0)
+
+                    if current_max > 0:
+                        log.info(f"🔄 Setting {region} to scale-to-zero (current max: {current_max})")
+                        result = scale_cluster_nodes(region, 0)
+
+                        if result['status'] == 'no_change':
+                            log.info(f"ℹ️  {region}: Already at scale-to-zero")
+                        elif result['status'] != 'error':
+                            outcome = 'scale_down'
+                            log.info(f"✅ {region}: Set to scale-to-zero")
+                        else:
+                            outcome = 'error'
+                            log.error(f"❌ Failed to scale down {region}")
+
+                        break  # Only need to check first pool
+            autoscaler_metrics.record_decision(region, outcome)
+
+    # Log summary
+    log.info(f"📋 Autoscaler check completed at {current_time}")
+    log.info(f"📊 Traffic: Asia {geographic_analysis['regional_percentages']['asia']:.1f}% ({geographic_analysis['regional_traffic']['asia']}), Total {geographic_analysis['total_requests']}")
+    log.info(f"⏱️  Latency: {latency_data['hot_regions_avg_latency']}ms avg")
+    return scale_decision
@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""
+Persistent background job queue for the admin webapp
+Jobs are journaled to a local JSONL file, run by a pool of worker threads,
+retried with exponential backoff and recovered after a crash or restart by
+replaying the journal
+"""
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+QUEUED = 'queued'
+RUNNING = 'running'
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+# Finished jobs kept in memory (and in the compacted journal) for the status endpoints
+JOB_HISTORY = int(os.environ.get('JOB_HISTORY', '500'))
+# Snapshots appended to the journal before it is rewritten with one line per kept job
+JOB_JOURNAL_COMPACT_LINES = int(os.environ.get('JOB_JOURNAL_COMPACT_LINES', '5000'))
+
+
+def utc_now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class JobJournal:
+    """Append-only JSONL file of job snapshots; the last line per job id wins
+
+    Each append is flushed and fsynced, so a job accepted by submit() survives
+    a crash. A torn last line (crash mid-write) is skipped on load.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Lines appended since the last compaction
+        self.appended = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def append(self, job):
+        line = json.dumps(job, sort_keys=True) + '\n'
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self.appended += 1
+
+    def load(self):
+        """Latest snapshot of every journaled job, in first-seen order"""
+        jobs = {}
+        if not os.path.exists(self.path):
+            return jobs
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    job = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if isinstance(job, dict) and 'id' in job:
+                    jobs[job['id']] = job
+        return jobs
+
+    def compact(self, jobs):
+        """Rewrite the journal with one line per job"""
+        tmp_path = f"{self.path}.tmp"
+        with self._lock:
+            with open(tmp_path, 'w') as f:
+                for job in jobs:
+                    f.write(json.dumps(job, sort_keys=True) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            self.appended = 0
+
+
+class JobQueue:
+    """Worker pool over journaled jobs
+
+    handler(payload, progress) does the work: progress(fraction) reports
+    0..1 completion, the return value (JSON-serializable) is stored as the
+    job's result and an exception schedules a retry until max_attempts.
+    State changes are journaled; progress is kept in memory only.
+    """
+
+    def __init__(self, name, handler, journal_path, workers=1, max_attempts=3, retry_backoff=30, logger=None):
+        self.name = name
+        self.logger = logger or logging.getLogger(__name__)
+        self.handler = handler
+        self.journal = JobJournal(journal_path)
+        self.workers = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        self.jobs = {}
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._threads = []
+        self._timers = []
+        self._running = False
+
+    def start(self):
+        """Recover unfinished jobs from the journal and start the workers"""
+        if self._running:
+            return
+        self._running = True
+        self.recover()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"{self.name}-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        self.logger.info(f"🚀 {self.name} queue started with {self.workers} workers")
+
+    def stop(self, timeout=5):
+        self._running = False
+        for timer in self._timers:
+            timer.cancel()
+        for _ in self._threads:
+            self._pending.put(None)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def recover(self):
+        """Requeue jobs that were queued or running when the process stopped
+
+        A running job already counted its attempt, so a job that keeps
+        crashing the process still fails after max_attempts.
+        """
+        journaled = self.journal.load()
+        finished = [job for job in journaled.values() if job['status'] not in ACTIVE_STATES]
+        recovered = [job for job in journaled.values() if job['status'] in ACTIVE_STATES]
+
+        with self._lock:
+            for job in finished[-JOB_HISTORY:]:
+                self.jobs[job['id']] = job
+            for job in recovered:
+                job['progress'] = 0.0
+                job['updated_at'] = utc_now()
+                if job['status'] == RUNNING and job['attempts'] >= self.max_attempts:
+                    job['status'] = FAILED
+                    job['error'] = 'interrupted by a restart after the last attempt'
+                    job['finished_at'] = job['updated_at']
+                else:
+                    job['status'] = QUEUED
+                    job.pop('retry_at', None)
+                self.jobs[job['id']] = job
+            snapshot = list(self.jobs.values())
+
+        self.journal.compact(snapshot)
+        for job in recovered:
+            if job['status'] == QUEUED:
+                self._pending.put(job['id'])
+        if recovered:
+            self.logger.info(f"♻️  Recovered {len(recovered)} unfinished {self.name} jobs from {self.journal.path}")
+
+    def submit(self, payload):
+        """Journal and enqueue a job; returns its snapshot"""
+        now = utc_now()
+        job = {
+            'id': uuid.uuid4().hex,
+            'queue': self.name,
+            'payload': payload,
+            'status': QUEUED,
+            'attempts': 0,
+            'progress': 0.0,
+            'error': None,
+            'result': None,
+            'created_at': now,
+            'updated_at': now,
+            'started_at': None,
+            'finished_at': None,
+        }
+        with self._lock:
+            self.jobs[job['id']] = job
+            self._trim_history()
+        self.journal.append(job)
+        self._compact_journal()
+        self._pending.put(job['id'])
+        return dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list(self, status=None, limit=100):
+        """Most recent jobs first"""
+        with self._lock:
+            jobs = [dict(job) for job in self.jobs.values() if status is None or job['status'] == status]
+        jobs.sort(key=lambda job: job['created_at'], reverse=True)
+        return jobs[:limit]
+
+    def _trim_history(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job['status'] not in ACTIVE_STATES]
+        for job_id in finished[:max(0, len(finished) - JOB_HISTORY)]:
+            del self.jobs[job_id]
+
+    def _compact_journal(self):
+        """Rewrite the journal with the kept jobs once JOB_JOURNAL_COMPACT_LINES snapshots were appended
+
+        The queue lock is held throughout, so no state change can be written
+        to the old file after the snapshot was taken and then lost.
+        """
+        if self.journal.appended < JOB_JOURNAL_COMPACT_LINES:
+            return
+        with self._lock:
+            if self.journal.appended < JOB_JOURNAL_COMPACT_LINES:
+                return
+            self._trim_history()
+            self.journal.compact(list(self.jobs.values()))
+
+    def _update(self, job_id, journal=True, **changes):
+        with self._lock:
+            job = self.jobs[job_id]
+            job.update(changes, updated_at=utc_now())
+            snapshot = dict(job)
+        if journal:
+            self.journal.append(snapshot)
+            self._compact_journal()
+        return snapshot
+
+    def _progress_reporter(self, job_id):
+        def report(fraction):
+            self._update(job_id, journal=False, progress=round(max(0.0, min(1.0, fraction)), 4))
+        return report
+
+    def _retry_later(self, job_id, delay):
+        def requeue():
+            if self._running:
+                self._update(job_id, status=QUEUED, retry_at=None)
+                self._pending.put(job_id)
+
+        timer = threading.Timer(delay, requeue)
+        timer.daemon = True
+        self._timers = [t for t in self._timers if t.is_alive()] + [timer]
+        timer.start()
+
+    def _work(self):
+        while self._running:
+            job_id = self._pending.get()
+            if job_id is None:
+                break
+            job = self.get(job_id)
+            if not job or job['status'] != QUEUED:
+                continue
+
+            job = self._update(job_id, status=RUNNING, attempts=job['attempts'] + 1,
+                               started_at=utc_now(), progress=0.0, error=None)
+            self.logger.info(f"🔄 {self.name} job {job_id} started (attempt {job['attempts']}/{self.max_attempts})")
+            start = time.perf_counter()
+            try:
+                result = self.handler(job['payload'], self._progress_reporter(job_id))
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                if job['attempts'] < self.max_attempts:
+                    delay = self.retry_backoff * 2 ** (job['attempts'] - 1)
+                    retry_at = datetime.fromtimestamp(time.time() + delay, timezone.utc).isoformat()
+                    self._update(job_id, status=QUEUED, error=error, retry_at=retry_at)
+                    self.logger.warning(f"🔁 {self.name} job {job_id} failed ({error}), retrying in {delay}s")
+                    self._retry_later(job_id, delay)
+                else:
+                    self._update(job_id, status=FAILED, error=error, finished_at=utc_now())
+                    self.logger.error(f"❌ {self.name} job {job_id} failed after {job['attempts']} attempts: {error}")
+                continue
+
+            self._update(job_id, status=SUCCEEDED, progress=1.0, result=result, finished_at=utc_now(),
+                         duration_s=round(time.perf_counter() - start, 3))
+            self.logger.info(f"✅ {self.name} job {job_id} finished in {time.perf_counter() - start:.1f}s")
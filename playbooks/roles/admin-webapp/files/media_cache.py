@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Local read-through cache of served HLS objects
+Segments and playlists requested from the admin UI are downloaded from the
+content storage once into a directory on local disk and served from there
+(send_file, so the WSGI server can use sendfile), instead of being re-read
+through gcsfuse on every request. The cache is bounded by size and evicts the
+least recently served objects. Segments are immutable; playlists are
+re-fetched after MEDIA_CACHE_PLAYLIST_TTL seconds.
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import storage
+
+MEDIA_CACHE_PATH = os.environ.get('MEDIA_CACHE_PATH', '/var/lib/content_manager/media-cache')
+MEDIA_CACHE_MAX_BYTES = int(os.environ.get('MEDIA_CACHE_MAX_MB', '2048')) * 1024 * 1024
+MEDIA_CACHE_PLAYLIST_TTL = float(os.environ.get('MEDIA_CACHE_PLAYLIST_TTL', '10'))
+
+TMP_DIR = '.tmp'
+
+
+class ObjectNotFound(LookupError):
+    """The source storage has no object under the requested key"""
+
+
+def is_playlist(key):
+    return key.endswith('.m3u8')
+
+
+class MediaCache:
+    """Objects of source (a storage backend) cached under root, least recently served evicted first
+
+    fetch() returns the local path and a strong ETag (md5 of the content).
+    Concurrent misses for the same key share one download.
+    """
+
+    def __init__(self, source, root=None, max_bytes=None, playlist_ttl=None):
+        self.source = source
+        self.store = storage.LocalStorage(root or MEDIA_CACHE_PATH)
+        self.max_bytes = max_bytes or MEDIA_CACHE_MAX_BYTES
+        self.playlist_ttl = MEDIA_CACHE_PLAYLIST_TTL if playlist_ttl is None else playlist_ttl
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._fetching = {}
+        self._load()
+
+    def _load(self):
+        """Index what a previous run left on disk, oldest first; ETags are computed on first use"""
+        tmp_dir = os.path.join(self.store.root, TMP_DIR)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir, exist_ok=True)
+        found = []
+        for key in self.store.list_keys():
+            if key.startswith(f"{TMP_DIR}/"):
+                continue
+            info = os.stat(self.store.path(key))
+            found.append((info.st_mtime, key, info.st_size))
+        for mtime, key, size in sorted(found):
+            self.entries[key] = {'size': size, 'etag': None, 'fetched_at': mtime}
+            self.total_bytes += size
+        self._evict()
+
+    def _fresh(self, key, entry):
+        return not is_playlist(key) or time.time() - entry['fetched_at'] < self.playlist_ttl
+
+    def fetch(self, key):
+        """(local path, etag) of an object, downloading it on a miss; ObjectNotFound if the source has none"""
+        path = self.store.path(key)
+        while True:
+            with self._lock:
+                entry = self.entries.get(key)
+                if entry and self._fresh(key, entry):
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    etag = entry['etag']
+                    break
+                pending = self._fetching.get(key)
+                if pending is None:
+                    self._fetching[key] = threading.Event()
+                    self.misses += 1
+            if pending is None:
+                try:
+                    return path, self._download(key)
+                finally:
+                    with self._lock:
+                        self._fetching.pop(key).set()
+            # Another request is downloading it; use its result (or retry if it failed)
+            pending.wait()
+
+        if etag is None:
+            etag = storage.file_md5(path)
+            with self._lock:
+                if key in self.entries:
+                    self.entries[key]['etag'] = etag
+        return path, etag
+
+    def _download(self, key):
+        tmp_path = os.path.join(self.store.root, TMP_DIR, uuid.uuid4().hex)
+        try:
+            try:
+                self.source.download_file(key, tmp_path)
+            except FileNotFoundError:
+                raise ObjectNotFound(key)
+            etag = storage.file_md5(tmp_path)
+            size = os.path.getsize(tmp_path)
+            path = self.store.path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous:
+                self.total_bytes -= previous['size']
+            self.entries[key] = {'size': size, 'etag': etag, 'fetched_at': time.time()}
+            self.total_bytes += size
+            self._evict()
+        return etag
+
+    def _evict(self):
+        """Drop least recently served objects until under max_bytes; the newest entry always stays"""
+        while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+            key, entry = self.entries.popitem(last=False)
+            self.total_bytes -= entry['size']
+            try:
+                # A response already streaming this file keeps its open handle
+                os.remove(self.store.path(key))
+            except OSError:
+                pass
+
+    def invalidate(self, prefix):
+        """Forget cached objects under prefix (e.g. a deleted stream); returns how many"""
+        with self._lock:
+            keys = [key for key in self.entries if key.startswith(prefix)]
+            for key in keys:
+                self.total_bytes -= self.entries.pop(key)['size']
+        self.store.delete_prefix(prefix)
+        return len(keys)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'objects': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses
+            }
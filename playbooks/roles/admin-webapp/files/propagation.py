@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Targeted propagation of content changes to the regional buckets
+Instead of rsyncing the whole master bucket to every region after each
+upload or delete (sync-to-regions.sh), a change is described by a manifest
+of the objects it created or removed and only those are copied (server-side
+for GCS) or deleted, in parallel across objects and regions. Every copy is
+verified against the source size and checksum.
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import storage
+
+# region=bucket pairs, comma separated; with STORAGE_BACKEND=local the values are directories
+REGIONAL_BUCKETS = os.environ.get('REGIONAL_BUCKETS', '')
+PROPAGATION_WORKERS = int(os.environ.get('PROPAGATION_WORKERS', '32'))
+# Manifests kept on disk for auditing
+MANIFEST_HISTORY = int(os.environ.get('MANIFEST_HISTORY', '500'))
+
+PUT = 'put'
+DELETE = 'delete'
+DELETE_PREFIX = 'delete_prefix'
+
+
+def parse_regional_buckets(value):
+    """'europe-west1=bucket-eu,us-central1=bucket-us' -> {region: bucket}"""
+    buckets = {}
+    for pair in filter(None, (item.strip() for item in (value or '').split(','))):
+        region, _, bucket = pair.partition('=')
+        if not region or not bucket:
+            raise ValueError(f"invalid REGIONAL_BUCKETS entry: {pair}")
+        buckets[region.strip()] = bucket.strip()
+    return buckets
+
+
+def regional_targets(buckets=None, backend=None, client=None):
+    """Storage backend per region, of the same kind as the content storage"""
+    buckets = parse_regional_buckets(REGIONAL_BUCKETS) if buckets is None else buckets
+    backend = backend or storage.STORAGE_BACKEND
+    targets = {}
+    for region, bucket in buckets.items():
+        if backend == 'gcs':
+            targets[region] = storage.GCSStorage(bucket, client=client)
+        elif backend == 'fake':
+            targets[region] = storage.FakeStorage()
+        else:
+            targets[region] = storage.LocalStorage(bucket)
+    return targets
+
+
+def build_manifest(source, put_keys=(), put_prefixes=(), delete_keys=(), delete_prefixes=(), workers=None):
+    """Manifest of one change: the objects to copy (with their source size and checksum) and to delete
+
+    Keys to put that are missing from the source are left out.
+    """
+    keys = list(dict.fromkeys(list(put_keys) + [key for prefix in put_prefixes for key in source.list_keys(prefix)]))
+    with ThreadPoolExecutor(max_workers=workers or PROPAGATION_WORKERS) as pool:
+        stats = list(pool.map(source.stat, keys))
+
+    changes = [{'action': PUT, 'key': key, 'size': stat['size'], 'checksum': stat['checksum']}
+               for key, stat in zip(keys, stats) if stat]
+    changes += [{'action': DELETE, 'key': key} for key in delete_keys]
+    changes += [{'action': DELETE_PREFIX, 'prefix': prefix} for prefix in delete_prefixes]
+    return {
+        'id': uuid.uuid4().hex,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'changes': changes
+    }
+
+
+def save_manifest(manifest, directory, keep=MANIFEST_HISTORY):
+    """Write a manifest as <directory>/<created>-<id>.json, pruning the oldest past keep (None keeps all)"""
+    os.makedirs(directory, exist_ok=True)
+    # Microseconds keep names in recording order, which replication batching relies on
+    stamp = manifest['created_at'][:26].replace(':', '').replace('-', '')
+    path = os.path.join(directory, f"{stamp}-{manifest['id']}.json")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, path)
+
+    if keep is not None:
+        prune_manifests(directory, keep)
+    return path
+
+
+def prune_manifests(directory, keep=MANIFEST_HISTORY, referenced=()):
+    """Delete the oldest manifests in directory past keep, except the referenced paths; returns how many"""
+    referenced = {os.path.abspath(path) for path in referenced}
+    names = sorted(name for name in os.listdir(directory) if name.endswith('.json'))
+    pruned = 0
+    for name in names[:max(0, len(names) - keep)]:
+        path = os.path.join(directory, name)
+        if os.path.abspath(path) not in referenced:
+            os.remove(path)
+            pruned += 1
+    return pruned
+
+
+def load_manifest(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def change_path(change):
+    """The key or prefix a manifest change applies to"""
+    return change.get('key', change.get('prefix'))
+
+
+def matches(stat, change):
+    return bool(stat) and stat['size'] == change['size'] and stat['checksum'] == change['checksum']
+
+
+class Propagator:
+    """Applies manifests from the content storage to every regional target"""
+
+    def __init__(self, source, targets, workers=None, logger=None):
+        self.source = source
+        self.targets = targets
+        self.workers = workers or PROPAGATION_WORKERS
+        self.logger = logger or logging.getLogger(__name__)
+
+    def apply(self, region, change):
+        """Apply one change to one region and verify it; returns 'copied', 'skipped' or 'deleted'"""
+        target = self.targets[region]
+        if change['action'] == PUT:
+            # Already identical (e.g. a retried manifest): nothing to copy
+            if matches(target.stat(change['key']), change):
+                return 'skipped'
+            target.copy_from(self.source, change['key'])
+            if not matches(target.stat(change['key']), change):
+                raise IOError(f"copy of {change['key']} does not match the source size/checksum")
+            return 'copied'
+        if change['action'] == DELETE:
+            target.delete(change['key'])
+            if target.exists(change['key']):
+                raise IOError(f"{change['key']} still exists after delete")
+            return 'deleted'
+        if change['action'] == DELETE_PREFIX:
+            target.delete_prefix(change['prefix'])
+            if target.list_keys(change['prefix']):
+                raise IOError(f"objects remain under {change['prefix']} after delete")
+            return 'deleted'
+        raise ValueError(f"unknown manifest action: {change['action']}")
+
+    def propagate(self, manifest, regions=None, progress=None):
+        """Apply a manifest to the given regions (default: all) in parallel
+
+        Deletes run before copies, so a stream deleted and re-published in the
+        same manifest ends up present. Returns per-region counts and failures;
+        failures don't raise, so the caller decides whether to retry.
+        """
+        regions = list(self.targets) if regions is None else regions
+        start = time.perf_counter()
+        report = {region: {'copied': 0, 'skipped': 0, 'deleted': 0, 'failed': []} for region in regions}
+        deletes = [change for change in manifest['changes'] if change['action'] != PUT]
+        puts = [change for change in manifest['changes'] if change['action'] == PUT]
+        phases = [[(region, change) for region in regions for change in changes] for changes in (deletes, puts)]
+        total = sum(len(tasks) for tasks in phases)
+        done = 0
+
+        def run(task):
+            region, change = task
+            try:
+                return region, change, self.apply(region, change), None
+            except Exception as e:
+                return region, change, None, f"{type(e).__name__}: {e}"
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for tasks in phases:
+                for region, change, outcome, error in pool.map(run, tasks):
+                    if error:
+                        report[region]['failed'].append({'path': change_path(change), 'error': error})
+                    else:
+                        report[region][outcome] += 1
+                    done += 1
+                    if progress:
+                        progress(done / total)
+
+        failed = sum(len(counts['failed']) for counts in report.values())
+        seconds = round(time.perf_counter() - start, 3)
+        if failed:
+            self.logger.error(f"❌ Manifest {manifest['id']}: {failed} of {total} regional changes failed")
+        else:
+            self.logger.info(f"🌍 Manifest {manifest['id']}: {len(manifest['changes'])} changes "
+                             f"propagated to {len(regions)} regions in {seconds:.1f}s")
+        return {'manifest': manifest['id'], 'ok': not failed, 'seconds': seconds, 'regions': report}
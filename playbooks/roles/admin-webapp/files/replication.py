@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Background replication of content changes to the regional buckets
+Every upload or delete is recorded as a manifest (see propagation.py) in a
+pending directory on local disk and acknowledged immediately. Changes
+recorded within REPLICATION_BATCH_SECONDS of each other are coalesced into
+one batch manifest, which is fanned out as one job per region on a
+job_queue.JobQueue, so each region replicates concurrently and retries with
+backoff on its own. Per-object, per-region status and replication lag are
+kept in memory for /api/replication.
+"""
+
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import job_queue
+import propagation
+
+# Changes recorded within this window are replicated as one batch
+REPLICATION_BATCH_SECONDS = float(os.environ.get('REPLICATION_BATCH_SECONDS', '5'))
+REPLICATION_MAX_ATTEMPTS = int(os.environ.get('REPLICATION_MAX_ATTEMPTS', '8'))
+REPLICATION_RETRY_BACKOFF = int(os.environ.get('REPLICATION_RETRY_BACKOFF', '15'))
+# Object statuses kept for /api/replication, oldest dropped first
+REPLICATION_STATUS_HISTORY = int(os.environ.get('REPLICATION_STATUS_HISTORY', '100000'))
+
+PENDING = 'pending'
+REPLICATED = 'replicated'
+FAILED = 'failed'
+
+
+class ReplicationError(Exception):
+    """Some objects of a batch could not be replicated to a region; the job is retried"""
+
+
+def iso(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat() if timestamp else None
+
+
+def merge_manifests(manifests):
+    """Coalesce manifests in recording order into one; the last change to a path wins
+
+    A prefix delete drops earlier changes under that prefix. Deletes are
+    applied before copies, so a copy recorded after a prefix delete survives.
+    """
+    merged = OrderedDict()
+    for manifest in manifests:
+        for change in manifest['changes']:
+            path = propagation.change_path(change)
+            if change['action'] == propagation.DELETE_PREFIX:
+                for other in [other for other in merged if other.startswith(path)]:
+                    del merged[other]
+            merged.pop(path, None)
+            merged[path] = change
+    return {
+        'id': manifests[0]['id'] if len(manifests) == 1 else uuid.uuid4().hex,
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'merged': [manifest['id'] for manifest in manifests],
+        'changes': list(merged.values())
+    }
+
+
+class ReplicationQueue:
+    """Durable, coalescing replication of manifests to every region of a Propagator"""
+
+    def __init__(self, propagator, manifests_dir, journal_path, batch_seconds=None,
+                 max_attempts=None, retry_backoff=None, on_replicated=None, logger=None):
+        self.propagator = propagator
+        # on_replicated(region, changes, errors) after every region job attempt
+        self.on_replicated = on_replicated
+        self.manifests_dir = manifests_dir
+        self.pending_dir = os.path.join(manifests_dir, 'pending')
+        self.batch_seconds = REPLICATION_BATCH_SECONDS if batch_seconds is None else batch_seconds
+        self.logger = logger or logging.getLogger(__name__)
+        self.jobs = job_queue.JobQueue(
+            'replication', self._replicate, journal_path,
+            workers=len(propagator.targets),
+            max_attempts=max_attempts or REPLICATION_MAX_ATTEMPTS,
+            retry_backoff=REPLICATION_RETRY_BACKOFF if retry_backoff is None else retry_backoff,
+            logger=self.logger
+        )
+        # path -> {region: status}, most recently changed last
+        self.objects = OrderedDict()
+        self.regions = {region: {'last_replicated_at': None, 'last_lag_s': None} for region in propagator.targets}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._timer = None
+
+    def start(self):
+        """Resume unfinished region jobs and batch any changes recorded before a restart"""
+        self.jobs.start()
+        for job in self.jobs.list(limit=None):
+            if job['status'] in job_queue.ACTIVE_STATES:
+                try:
+                    manifest = propagation.load_manifest(job['payload']['path'])
+                except (OSError, ValueError):
+                    continue
+                self._mark(manifest['changes'], [job['payload']['region']], PENDING)
+        self.flush()
+
+    def stop(self):
+        # Pending manifests are on disk; the next start() batches them
+        with self._lock:
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+        self.jobs.stop()
+
+    def record(self, **changes):
+        """Record a content change (propagation.build_manifest arguments); returns its manifest id"""
+        manifest = propagation.build_manifest(self.propagator.source, **changes)
+        if not self.propagator.targets or not manifest['changes']:
+            return manifest['id']
+        recorded_at = time.time()
+        for change in manifest['changes']:
+            change['recorded_at'] = recorded_at
+        propagation.save_manifest(manifest, self.pending_dir, keep=None)
+        self._mark(manifest['changes'], list(self.propagator.targets), PENDING)
+
+        with self._lock:
+            if self._timer is None:
+                self._timer = threading.Timer(self.batch_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return manifest['id']
+
+    def flush(self):
+        """Merge the pending manifests into one batch and queue a job per region"""
+        with self._flush_lock:
+            with self._lock:
+                self._timer = None
+            if not os.path.isdir(self.pending_dir):
+                return None
+            names = sorted(name for name in os.listdir(self.pending_dir) if name.endswith('.json'))
+            if not names:
+                return None
+            paths = [os.path.join(self.pending_dir, name) for name in names]
+            batch = merge_manifests([propagation.load_manifest(path) for path in paths])
+            batch_path = propagation.save_manifest(batch, self.manifests_dir, keep=None)
+            for region in self.propagator.targets:
+                self.jobs.submit({
+                    'manifest': batch['id'],
+                    'path': batch_path,
+                    'region': region,
+                    'changes': len(batch['changes']),
+                    'merged': len(batch['merged'])
+                })
+            # Batches that a region job still has to apply are kept past MANIFEST_HISTORY
+            active = [job['payload']['path'] for job in self.jobs.list(limit=None)
+                      if job['status'] in job_queue.ACTIVE_STATES]
+            propagation.prune_manifests(self.manifests_dir, referenced=active)
+            # A crash before this point replays the batch; copies of identical objects are skipped
+            for path in paths:
+                os.remove(path)
+        self.logger.info(f"📦 Coalesced {len(paths)} changes into replication batch {batch['id']} "
+                         f"({len(batch['changes'])} objects, {len(self.propagator.targets)} regions)")
+        return batch['id']
+
+    def _mark(self, changes, regions, status, errors=None):
+        """Update object statuses, ignoring updates older than the change already recorded for a path"""
+        now = time.time()
+        errors = errors or {}
+        with self._lock:
+            for change in changes:
+                path = propagation.change_path(change)
+                covered = [path]
+                if change['action'] == propagation.DELETE_PREFIX:
+                    # Earlier changes under the prefix were coalesced into this delete
+                    covered += [other for other in self.objects if other.startswith(path) and other != path]
+                for other in covered:
+                    self._mark_path(other, change, regions, status, errors.get(path), now)
+            while len(self.objects) > REPLICATION_STATUS_HISTORY:
+                self.objects.popitem(last=False)
+
+    def _mark_path(self, path, change, regions, status, error, now):
+        entry = self.objects.setdefault(path, {})
+        self.objects.move_to_end(path)
+        for region in regions:
+            current = entry.get(region)
+            if current and current['recorded_at'] > change['recorded_at']:
+                continue
+            entry[region] = {
+                'status': FAILED if error else status,
+                'action': change['action'],
+                'recorded_at': change['recorded_at'],
+                'updated_at': now,
+                'lag_s': round(now - change['recorded_at'], 3) if status == REPLICATED and not error else None,
+                'error': error
+            }
+
+    def _replicate(self, payload, progress):
+        """Replication job handler: apply a batch manifest to one region"""
+        region = payload['region']
+        manifest = propagation.load_manifest(payload['path'])
+        report = self.propagator.propagate(manifest, regions=[region], progress=progress)
+        counts = report['regions'][region]
+        errors = {failure['path']: failure['error'] for failure in counts['failed']}
+        self._mark(manifest['changes'], [region], REPLICATED, errors)
+        if self.on_replicated:
+            self.on_replicated(region, manifest['changes'], errors)
+
+        if len(errors) < len(manifest['changes']):
+            now = time.time()
+            lag = max(now - change['recorded_at'] for change in manifest['changes'])
+            with self._lock:
+                self.regions[region] = {'last_replicated_at': now, 'last_lag_s': round(lag, 3)}
+        if errors:
+            path, error = next(iter(errors.items()))
+            raise ReplicationError(f"{len(errors)} of {len(manifest['changes'])} changes failed in {region} "
+                                   f"(first: {path}: {error})")
+        return {key: counts[key] for key in ('copied', 'skipped', 'deleted')}
+
+    def status(self, limit=20):
+        """Per-region backlog and lag, plus the most recent region jobs"""
+        now = time.time()
+        jobs = self.jobs.list(limit=None)
+        with self._lock:
+            regions = {}
+            for region, last in self.regions.items():
+                states = [entry[region] for entry in self.objects.values() if region in entry]
+                pending = [state['recorded_at'] for state in states if state['status'] == PENDING]
+                regions[region] = {
+                    'pending_objects': len(pending),
+                    'failed_objects': sum(1 for state in states if state['status'] == FAILED),
+                    'lag_s': round(now - min(pending), 3) if pending else 0.0,
+                    'last_replicated_at': iso(last['last_replicated_at']),
+                    'last_lag_s': last['last_lag_s'],
+                    'jobs': {state: sum(1 for job in jobs if job['payload']['region'] == region
+                                        and job['status'] == state)
+                             for state in (job_queue.QUEUED, job_queue.RUNNING, job_queue.FAILED)}
+                }
+        pending_changes = len(os.listdir(self.pending_dir)) if os.path.isdir(self.pending_dir) else 0
+        return {'regions': regions, 'pending_changes': pending_changes, 'jobs': jobs[:limit]}
+
+    def object_status(self, prefix='', limit=100):
+        """Replication status per region of the most recently changed paths under prefix"""
+        with self._lock:
+            paths = [path for path in reversed(self.objects) if path.startswith(prefix)][:limit]
+            return {path: {region: dict(state, recorded_at=iso(state['recorded_at']), updated_at=iso(state['updated_at']))
+                           for region, state in self.objects[path].items()}
+                    for path in paths}
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Object storage backends for published content
+Transcoded HLS trees and source videos are written to local scratch and then
+uploaded here in parallel, instead of file by file through the gcsfuse mount.
+
+- GCSStorage: a bucket through the Cloud Storage API (transfer_manager for
+  parallel and chunked uploads)
+- LocalStorage: a directory tree, e.g. the gcsfuse mount or a test dir
+- FakeStorage: in-memory objects, for tests and benchmarks
+
+Keys are bucket-relative paths like 'hls/<stream>/720p/segment0.ts'.
+list_objects() returns (key, size) pairs from the listing itself. stat()
+returns the size and a backend-specific checksum (crc32c for GCS, md5
+otherwise), so copies can be verified against their source. download_file()
+raises FileNotFoundError for a missing object on every backend.
+"""
+
+import hashlib
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Set STORAGE_BACKEND=local to write through VIDEOS_MOUNT_PATH instead of the API
+GCS_BUCKET = os.environ.get('GCS_BUCKET', '')
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'gcs' if GCS_BUCKET else 'local')
+UPLOAD_WORKERS = int(os.environ.get('STORAGE_UPLOAD_WORKERS', '16'))
+# Files at least this large are uploaded as concurrent chunks (XML multipart upload)
+PARALLEL_UPLOAD_THRESHOLD = int(os.environ.get('STORAGE_PARALLEL_UPLOAD_THRESHOLD_MB', '64')) * 1024 * 1024
+PARALLEL_UPLOAD_CHUNK_SIZE = int(os.environ.get('STORAGE_PARALLEL_UPLOAD_CHUNK_MB', '32')) * 1024 * 1024
+
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('video/mp2t', '.ts')
+
+
+def content_type(path):
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+
+def tree_files(local_dir):
+    """Paths of every file under local_dir, relative to it, with '/' separators"""
+    files = []
+    for root, _, names in os.walk(local_dir):
+        for name in names:
+            files.append(os.path.relpath(os.path.join(root, name), local_dir).replace(os.sep, '/'))
+    return sorted(files)
+
+
+def join_key(prefix, name):
+    return f"{prefix.rstrip('/')}/{name}" if prefix else name
+
+
+def file_md5(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_via_download(source, target, key):
+    """Copy an object between backends of different kinds through a local temp file"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        local_path = os.path.join(tmp_dir, os.path.basename(key) or 'object')
+        source.download_file(key, local_path)
+        target.upload_file(local_path, key)
+    return key
+
+
+class LocalStorage:
+    """Objects as files under root"""
+
+    def __init__(self, root, workers=None):
+        self.root = root
+        self.workers = workers or UPLOAD_WORKERS
+
+    def path(self, key):
+        parts = [part for part in key.split('/') if part]
+        if any(part in ('.', '..') for part in parts):
+            raise ValueError(f"invalid object key: {key}")
+        return os.path.join(self.root, *parts)
+
+    def upload_file(self, local_path, key):
+        target = self.path(key)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        shutil.copyfile(local_path, target)
+        return key
+
+    def upload_tree(self, local_dir, prefix):
+        names = tree_files(local_dir)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return list(pool.map(lambda name: self.upload_file(os.path.join(local_dir, name), join_key(prefix, name)),
+                                 names))
+
+    def exists(self, key):
+        return os.path.isfile(self.path(key))
+
+    def size(self, key):
+        return os.path.getsize(self.path(key)) if self.exists(key) else None
+
+    def stat(self, key):
+        if not self.exists(key):
+            return None
+        return {'size': os.path.getsize(self.path(key)), 'checksum': file_md5(self.path(key))}
+
+    def download_file(self, key, local_path):
+        shutil.copyfile(self.path(key), local_path)
+
+    def copy_from(self, source, key):
+        return copy_via_download(source, self, key)
+
+    def list_keys(self, prefix=''):
+        base = self.path(prefix.rstrip('/')) if prefix else self.root
+        if os.path.isfile(base):
+            return [prefix]
+        if not os.path.isdir(base):
+            return []
+        return [join_key(prefix, name) for name in tree_files(base)]
+
+    def list_objects(self, prefix=''):
+        return [(key, os.path.getsize(self.path(key))) for key in self.list_keys(prefix)]
+
+    def delete(self, key):
+        if self.exists(key):
+            os.remove(self.path(key))
+
+    def delete_prefix(self, prefix):
+        keys = self.list_keys(prefix)
+        base = self.path(prefix.rstrip('/'))
+        if os.path.isdir(base):
+            shutil.rmtree(base)
+        else:
+            for key in keys:
+                self.delete(key)
+        return len(keys)
+
+
+class FakeStorage:
+    """Objects in a dict, with call counts"""
+
+    def __init__(self):
+        self.objects = {}
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def upload_file(self, local_path, key):
+        self._count('upload_file')
+        with open(local_path, 'rb') as f:
+            data = f.read()
+        with self._lock:
+            self.objects[key] = data
+        return key
+
+    def upload_tree(self, local_dir, prefix):
+        self._count('upload_tree')
+        return [self.upload_file(os.path.join(local_dir, name), join_key(prefix, name))
+                for name in tree_files(local_dir)]
+
+    def exists(self, key):
+        return key in self.objects
+
+    def size(self, key):
+        return len(self.objects[key]) if key in self.objects else None
+
+    def stat(self, key):
+        data = self.objects.get(key)
+        if data is None:
+            return None
+        return {'size': len(data), 'checksum': hashlib.md5(data).hexdigest()}
+
+    def download_file(self, key, local_path):
+        if key not in self.objects:
+            raise FileNotFoundError(key)
+        with open(local_path, 'wb') as f:
+            f.write(self.objects[key])
+
+    def copy_from(self, source, key):
+        self._count('copy_from')
+        if isinstance(source, FakeStorage):
+            with self._lock:
+                self.objects[key] = source.objects[key]
+            return key
+        return copy_via_download(source, self, key)
+
+    def list_keys(self, prefix=''):
+        return sorted(key for key in self.objects if key.startswith(prefix))
+
+    def list_objects(self, prefix=''):
+        self._count('list_objects')
+        return [(key, len(self.objects[key])) for key in self.list_keys(prefix)]
+
+    def delete(self, key):
+        self._count('delete')
+        with self._lock:
+            self.objects.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        keys = self.list_keys(prefix)
+        for key in keys:
+            self.delete(key)
+        return len(keys)
+
+
+class GCSStorage:
+    """A Cloud Storage bucket; needs google-cloud-storage >= 2.14"""
+
+    def __init__(self, bucket_name, workers=None, client=None):
+        from google.cloud import storage as gcs
+
+        self.bucket_name = bucket_name
+        self.workers = workers or UPLOAD_WORKERS
+        self.client = client or gcs.Client()
+        self.bucket = self.client.bucket(bucket_name)
+
+    def upload_file(self, local_path, key):
+        from google.cloud.storage import transfer_manager
+
+        blob = self.bucket.blob(key)
+        blob.content_type = content_type(local_path)
+        if os.path.getsize(local_path) >= PARALLEL_UPLOAD_THRESHOLD:
+            transfer_manager.upload_chunks_concurrently(
+                local_path, blob,
+                content_type=blob.content_type,
+                chunk_size=PARALLEL_UPLOAD_CHUNK_SIZE,
+                max_workers=self.workers,
+                worker_type=transfer_manager.THREAD
+            )
+        else:
+            blob.upload_from_filename(local_path, content_type=blob.content_type)
+        return key
+
+    def upload_tree(self, local_dir, prefix):
+        """Upload every file under local_dir concurrently; raises on the first failed object"""
+        from google.cloud.storage import transfer_manager
+
+        names = tree_files(local_dir)
+        large = [name for name in names if os.path.getsize(os.path.join(local_dir, name)) >= PARALLEL_UPLOAD_THRESHOLD]
+        small = [name for name in names if name not in large]
+        if small:
+            transfer_manager.upload_many_from_filenames(
+                self.bucket, small,
+                source_directory=local_dir,
+                blob_name_prefix=join_key(prefix, ''),
+                max_workers=self.workers,
+                worker_type=transfer_manager.THREAD,
+                raise_exception=True
+            )
+        for name in large:
+            self.upload_file(os.path.join(local_dir, name), join_key(prefix, name))
+        return [join_key(prefix, name) for name in names]
+
+    def exists(self, key):
+        return self.bucket.blob(key).exists()
+
+    def size(self, key):
+        blob = self.bucket.get_blob(key)
+        return blob.size if blob else None
+
+    def stat(self, key):
+        blob = self.bucket.get_blob(key)
+        return {'size': blob.size, 'checksum': blob.crc32c} if blob else None
+
+    def download_file(self, key, local_path):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.bucket.blob(key).download_to_filename(local_path)
+        except NotFound:
+            # download_to_filename leaves an empty file behind
+            if os.path.exists(local_path):
+                os.remove(local_path)
+            raise FileNotFoundError(key)
+
+    def copy_from(self, source, key):
+        """Server-side copy between buckets; rewrite() resumes until large cross-region copies finish"""
+        if not isinstance(source, GCSStorage):
+            return copy_via_download(source, self, key)
+        source_blob = source.bucket.blob(key)
+        target_blob = self.bucket.blob(key)
+        token, _, _ = target_blob.rewrite(source_blob)
+        while token is not None:
+            token, _, _ = target_blob.rewrite(source_blob, token=token)
+        return key
+
+    def list_keys(self, prefix=''):
+        return [blob.name for blob in self.client.list_blobs(self.bucket_name, prefix=prefix)]
+
+    def list_objects(self, prefix=''):
+        return [(blob.name, blob.size) for blob in self.client.list_blobs(self.bucket_name, prefix=prefix)]
+
+    def delete(self, key):
+        from google.api_core.exceptions import NotFound
+
+        try:
+            self.bucket.blob(key).delete()
+        except NotFound:
+            pass
+
+    def delete_prefix(self, prefix):
+        blobs = list(self.client.list_blobs(self.bucket_name, prefix=prefix))
+        # Batches are capped at 100 calls
+        for i in range(0, len(blobs), 100):
+            with self.client.batch(raise_exception=False):
+                for blob in blobs[i:i + 100]:
+                    blob.delete()
+        return len(blobs)
+
+
+def from_env(mount_path):
+    """Backend selected by STORAGE_BACKEND: the GCS_BUCKET bucket, or the files under mount_path"""
+    if STORAGE_BACKEND == 'gcs':
+        return GCSStorage(GCS_BUCKET)
+    if STORAGE_BACKEND == 'fake':
+        return FakeStorage()
+    return LocalStorage(mount_path)
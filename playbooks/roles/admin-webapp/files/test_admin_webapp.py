@@ -0,0 +1,577 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the admin webapp's job queue, uploads, caches, catalogue,
+propagation and HLS stitching. They need neither ffmpeg, GCS nor Flask.
+"""
+
+import hashlib
+import io
+import os
+import tempfile
+import time
+
+import catalogue
+import cold_autoscaler
+import job_queue
+import propagation
+import replication
+import storage
+import transcoder
+import uploads
+from media_cache import MediaCache, ObjectNotFound
+from transcode_cache import TranscodeCache
+
+
+def wait_for(condition, timeout=5.0):
+    """Poll condition() until it is true; returns its last value"""
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_job_journal_recovery():
+    """Unfinished jobs are requeued on restart, crashed last attempts fail and the journal is compacted"""
+    with tempfile.TemporaryDirectory() as tmp:
+        journal_path = os.path.join(tmp, 'jobs.jsonl')
+        journal = job_queue.JobJournal(journal_path)
+        base = {'queue': 'test', 'error': None, 'result': None, 'progress': 0.5,
+                'created_at': job_queue.utc_now(), 'updated_at': job_queue.utc_now(),
+                'started_at': None, 'finished_at': None}
+        journal.append(dict(base, id='queued', payload='q', status=job_queue.QUEUED, attempts=0))
+        journal.append(dict(base, id='running', payload='r', status=job_queue.QUEUED, attempts=0))
+        journal.append(dict(base, id='running', payload='r', status=job_queue.RUNNING, attempts=1))
+        journal.append(dict(base, id='crashing', payload='c', status=job_queue.RUNNING, attempts=3))
+        journal.append(dict(base, id='done', payload='d', status=job_queue.SUCCEEDED, attempts=1))
+        with open(journal_path, 'a') as f:
+            f.write('{"id": "torn", "sta')
+
+        handled = []
+        queue = job_queue.JobQueue('test', lambda payload, progress: handled.append(payload), journal_path,
+                                   max_attempts=3)
+        queue.recover()
+        assert queue.get('queued')['status'] == job_queue.QUEUED
+        assert queue.get('running')['status'] == job_queue.QUEUED
+        assert queue.get('running')['progress'] == 0.0
+        assert queue.get('crashing')['status'] == job_queue.FAILED
+        assert queue.get('done')['status'] == job_queue.SUCCEEDED
+        with open(journal_path) as f:
+            assert len(f.readlines()) == 4
+
+        queue.start()
+        try:
+            assert wait_for(lambda: queue.get('running')['status'] == job_queue.SUCCEEDED)
+            assert wait_for(lambda: queue.get('queued')['status'] == job_queue.SUCCEEDED)
+        finally:
+            queue.stop()
+        assert sorted(handled) == ['q', 'r']
+        assert queue.get('running')['attempts'] == 2
+        assert job_queue.JobJournal(journal_path).load()['running']['status'] == job_queue.SUCCEEDED
+
+
+def test_job_retry_backoff():
+    """Failed jobs are retried after an exponentially growing delay until max_attempts"""
+    attempts = {}
+
+    def handler(payload, progress):
+        attempts.setdefault(payload, []).append(time.monotonic())
+        if payload == 'always' or len(attempts[payload]) < 3:
+            raise RuntimeError(f"attempt {len(attempts[payload])}")
+        return 'ok'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = job_queue.JobQueue('test', handler, os.path.join(tmp, 'jobs.jsonl'), max_attempts=3,
+                                   retry_backoff=0.1)
+        queue.start()
+        try:
+            flaky = queue.submit('flaky')['id']
+            failing = queue.submit('always')['id']
+            assert wait_for(lambda: queue.get(flaky)['status'] == job_queue.SUCCEEDED)
+            assert wait_for(lambda: queue.get(failing)['status'] == job_queue.FAILED)
+        finally:
+            queue.stop()
+
+    job = queue.get(flaky)
+    assert job['attempts'] == 3 and job['result'] == 'ok' and job['error'] is None
+    times = attempts['flaky']
+    assert times[1] - times[0] >= 0.1 and times[2] - times[1] >= 0.2
+    job = queue.get(failing)
+    assert job['attempts'] == 3 and job['error'] == 'RuntimeError: attempt 3'
+
+
+def test_job_journal_compaction():
+    """The journal is rewritten with the kept jobs once enough snapshots were appended"""
+    compact_lines, history = job_queue.JOB_JOURNAL_COMPACT_LINES, job_queue.JOB_HISTORY
+    job_queue.JOB_JOURNAL_COMPACT_LINES, job_queue.JOB_HISTORY = 20, 5
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            journal_path = os.path.join(tmp, 'jobs.jsonl')
+            queue = job_queue.JobQueue('test', lambda payload, progress: payload, journal_path)
+            queue.start()
+            try:
+                for i in range(30):
+                    job_id = queue.submit(i)['id']
+                    assert wait_for(lambda: queue.get(job_id)['status'] == job_queue.SUCCEEDED)
+            finally:
+                queue.stop()
+            with open(journal_path) as f:
+                lines = len(f.readlines())
+            journaled = job_queue.JobJournal(journal_path).load()
+    finally:
+        job_queue.JOB_JOURNAL_COMPACT_LINES, job_queue.JOB_HISTORY = compact_lines, history
+
+    assert lines < 20 + 6
+    assert set(journaled) >= set(queue.jobs)
+    assert all(job['status'] == job_queue.SUCCEEDED for job in journaled.values())
+
+
+def test_upload_store_resume():
+    """PATCHes must match the offset, a dropped PATCH keeps its bytes and the hash survives a restart"""
+    data = b'0123456789' * 10
+    with tempfile.TemporaryDirectory() as tmp:
+        store = uploads.UploadStore(tmp)
+        upload = store.create(len(data), {'filename': 'video.mp4'})
+
+        try:
+            store.append(upload['id'], 10, io.BytesIO(data))
+            assert False, 'offset mismatch accepted'
+        except uploads.UploadError as e:
+            assert e.status == 409
+
+        # The connection drops after 40 bytes; HEAD reports them as received
+        assert store.append(upload['id'], 0, io.BytesIO(data[:40]))['offset'] == 40
+        try:
+            store.complete(upload['id'])
+            assert False, 'incomplete upload completed'
+        except uploads.UploadError as e:
+            assert e.status == 409
+
+        # After a restart the running hash is rebuilt from the staged prefix
+        store = uploads.UploadStore(tmp)
+        assert store.get(upload['id'])['offset'] == 40
+        assert store.append(upload['id'], 40, io.BytesIO(data[40:]))['offset'] == len(data)
+        staged_path, sha256, size = store.complete(upload['id'])
+        assert sha256 == hashlib.sha256(data).hexdigest() and size == len(data)
+        with open(staged_path, 'rb') as f:
+            assert f.read() == data
+
+        try:
+            store.get('../etc')
+            assert False, 'path traversal accepted'
+        except uploads.UploadError as e:
+            assert e.status == 404
+
+
+def test_upload_store_expire():
+    """Idle uploads and orphaned multipart staging files are dropped, recent ones kept"""
+    with tempfile.TemporaryDirectory() as tmp:
+        store = uploads.UploadStore(tmp)
+        idle = store.create(10, {})
+        recent = store.create(10, {})
+        idle_meta = store.get(idle['id'])
+        idle_meta['updated_at'] = time.time() - (uploads.UPLOAD_EXPIRY_HOURS + 1) * 3600
+        store._save(idle_meta)
+
+        orphan = os.path.join(tmp, 'orphan.part')
+        open(orphan, 'wb').close()
+        old = time.time() - (uploads.UPLOAD_EXPIRY_HOURS + 1) * 3600
+        os.utime(orphan, (old, old))
+        fresh_orphan = os.path.join(tmp, 'fresh.part')
+        open(fresh_orphan, 'wb').close()
+
+        store.expire()
+        names = set(os.listdir(tmp))
+        assert f"{idle['id']}.json" not in names and f"{idle['id']}.part" not in names
+        assert {f"{recent['id']}.json", f"{recent['id']}.part", 'fresh.part'} <= names
+        assert 'orphan.part' not in names
+
+
+def test_transcode_cache_veto():
+    """A lookup whose output is gone drops the entry, also from the persisted index"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'index.json')
+        cache = TranscodeCache(path)
+        cache.record('aaa', 'stream_a', 'stream_a..mp4', size=10)
+        cache.record('bbb', 'stream_b', 'stream_b..mp4', size=20)
+
+        assert cache.lookup('aaa', exists=lambda entry: True)['stream_folder'] == 'stream_a'
+        assert cache.lookup('bbb', exists=lambda entry: entry['stream_folder'] != 'stream_b') is None
+        assert cache.lookup('bbb') is None
+        assert set(TranscodeCache(path).entries) == {'aaa'}
+        assert cache.invalidate(video='stream_a..mp4') == 1
+        assert TranscodeCache(path).entries == {}
+
+
+class CorruptingStorage(storage.FakeStorage):
+    """Target whose copies arrive truncated"""
+
+    def copy_from(self, source, key):
+        self.objects[key] = source.objects[key][:-1]
+        return key
+
+
+def test_propagation():
+    """Manifests copy and delete only the listed objects, verify copies and skip identical ones"""
+    source = storage.FakeStorage()
+    for name, data in (('playlist.m3u8', b'#EXTM3U'), ('720p/segment0.ts', b'x' * 100)):
+        source.objects[f"hls/new/{name}"] = data
+    source.objects['videos/other.mp4'] = b'untouched'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        targets = {'europe': storage.FakeStorage(), 'us': storage.LocalStorage(os.path.join(tmp, 'us'))}
+        stale = os.path.join(tmp, 'stale.ts')
+        with open(stale, 'wb') as f:
+            f.write(b'stale')
+        for target in targets.values():
+            target.upload_file(stale, 'hls/old/720p/segment0.ts')
+        propagator = propagation.Propagator(source, targets, workers=4)
+
+        manifest = propagation.build_manifest(source, put_prefixes=['hls/new/'], put_keys=['videos/missing.mp4'],
+                                              delete_prefixes=['hls/old/'])
+        assert [propagation.change_path(change) for change in manifest['changes']] == \
+            ['hls/new/720p/segment0.ts', 'hls/new/playlist.m3u8', 'hls/old/']
+
+        progress = []
+        report = propagator.propagate(manifest, progress=progress.append)
+        assert report['ok'] and progress[-1] == 1.0
+        for region, target in targets.items():
+            assert report['regions'][region] == {'copied': 2, 'skipped': 0, 'deleted': 1, 'failed': []}
+            assert target.list_keys('hls/') == ['hls/new/720p/segment0.ts', 'hls/new/playlist.m3u8']
+            assert not target.exists('videos/other.mp4')
+
+        # A retried manifest finds identical copies
+        report = propagator.propagate(manifest, regions=['us'])
+        assert list(report['regions']) == ['us'] and report['regions']['us']['skipped'] == 2
+
+        propagator.targets['asia'] = CorruptingStorage()
+        report = propagator.propagate(manifest, regions=['asia'])
+        assert not report['ok']
+        failures = report['regions']['asia']['failed']
+        assert len(failures) == 2 and 'does not match' in failures[0]['error']
+
+
+def test_merge_manifests():
+    """Coalescing keeps the last change per path and lets a prefix delete drop earlier changes under it"""
+    def manifest(*changes):
+        return {'id': os.urandom(4).hex(), 'created_at': job_queue.utc_now(), 'changes': list(changes)}
+
+    def put(key):
+        return {'action': propagation.PUT, 'key': key, 'size': 1, 'checksum': key}
+
+    first = manifest(put('hls/a/1.ts'), put('hls/b/1.ts'), put('hls/ab/1.ts'))
+    second = manifest({'action': propagation.DELETE_PREFIX, 'prefix': 'hls/a/'},
+                      {'action': propagation.DELETE, 'key': 'hls/b/1.ts'})
+    third = manifest(put('hls/a/2.ts'), put('hls/b/1.ts'))
+
+    merged = replication.merge_manifests([first, second, third])
+    assert [(change['action'], propagation.change_path(change)) for change in merged['changes']] == [
+        ('put', 'hls/ab/1.ts'), ('delete_prefix', 'hls/a/'), ('put', 'hls/a/2.ts'), ('put', 'hls/b/1.ts')]
+    assert merged['merged'] == [first['id'], second['id'], third['id']]
+    assert merged['id'] not in merged['merged']
+    assert replication.merge_manifests([first])['id'] == first['id']
+
+
+def test_prune_manifests():
+    """Pruning keeps the newest manifests plus any still referenced by a region job"""
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(5):
+            manifest = {'id': f"m{i}", 'created_at': f"2025-01-30T14:00:0{i}.000000+00:00", 'changes': []}
+            paths.append(propagation.save_manifest(manifest, tmp, keep=None))
+
+        assert propagation.prune_manifests(tmp, keep=2, referenced=[paths[1]]) == 2
+        assert sorted(os.listdir(tmp)) == sorted(os.path.basename(path) for path in (paths[1], paths[3], paths[4]))
+        propagation.save_manifest({'id': 'm5', 'created_at': '2025-01-30T14:00:05.000000+00:00', 'changes': []},
+                                  tmp, keep=2)
+        assert len(os.listdir(tmp)) == 2
+
+
+def test_catalogue_search():
+    """Search treats LIKE wildcards literally and pages newest first"""
+    with tempfile.TemporaryDirectory() as tmp:
+        content = catalogue.Catalogue(os.path.join(tmp, 'catalogue.db'))
+        names = ['plain', 'cat_video', 'catXvideo', '100%_real', 'back\\slash']
+        for name in names:
+            content.upsert(name, video=f"{name}..mp4", has_video=1)
+            time.sleep(0.002)
+
+        def search(query, **kwargs):
+            rows, total = content.search(query, **kwargs)
+            return [row['stream_folder'] for row in rows], total
+
+        assert search('_') == (['100%_real', 'cat_video'], 2)
+        assert search('%') == (['100%_real'], 1)
+        assert search('\\') == (['back\\slash'], 1)
+        assert search('cat') == (['catXvideo', 'cat_video'], 2)
+        assert search('', per_page=2) == (['back\\slash', '100%_real'], 5)
+        assert search('', page=3, per_page=2) == (['plain'], 5)
+        assert search('', page=4, per_page=2) == ([], 5)
+        assert search('', page=0, per_page=2)[0] == ['back\\slash', '100%_real']
+
+        content.remove('plain', video=True)
+        assert content.get('plain') is None and content.count() == 4
+
+
+def test_catalogue_rebuild():
+    """The catalogue is seeded from the listings alone, sizes included"""
+    source = storage.FakeStorage()
+    source.objects = {
+        'videos/talk..mp4': b'x' * 42,
+        'videos/orphan..mov': b'y' * 7,
+        'hls/talk/playlist.m3u8': b'',
+        'hls/talk/720p/index.m3u8': b'',
+        'hls/talk/720p/segment0.ts': b'',
+        'hls/talk/360p/index.m3u8': b'',
+        'hls/talk/360p/segment0.ts': b'',
+    }
+    source.size = source.stat = None
+    with tempfile.TemporaryDirectory() as tmp:
+        content = catalogue.Catalogue(os.path.join(tmp, 'catalogue.db'))
+        assert content.rebuild(source) == 2
+        talk, orphan = content.get('talk'), content.get('orphan')
+
+    assert source.calls == {'list_objects': 1}
+    assert talk['size'] == 42 and talk['has_hls'] and talk['segments'] == 2
+    assert talk['renditions'] == ['720p', '360p']
+    assert orphan['size'] == 7 and not orphan['has_hls']
+
+
+def test_media_cache():
+    """Objects are served with md5 ETags, the least recently served is evicted and playlists expire"""
+    source = storage.FakeStorage()
+    for key in ('hls/s/0.ts', 'hls/s/1.ts', 'hls/s/2.ts'):
+        source.objects[key] = key.encode() * 10
+    source.objects['hls/s/playlist.m3u8'] = b'#EXTM3U'
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = MediaCache(source, root=tmp, max_bytes=250, playlist_ttl=0)
+        path, etag = cache.fetch('hls/s/0.ts')
+        assert etag == hashlib.md5(source.objects['hls/s/0.ts']).hexdigest()
+        with open(path, 'rb') as f:
+            assert f.read() == source.objects['hls/s/0.ts']
+
+        cache.fetch('hls/s/1.ts')
+        assert cache.fetch('hls/s/0.ts') == (path, etag)
+        # 0.ts was served more recently than 1.ts, so 1.ts makes room for 2.ts
+        cache.fetch('hls/s/2.ts')
+        assert list(cache.entries) == ['hls/s/0.ts', 'hls/s/2.ts']
+        assert not os.path.exists(cache.store.path('hls/s/1.ts'))
+        assert cache.stats()['bytes'] <= 250 and (cache.hits, cache.misses) == (1, 3)
+
+        cache.fetch('hls/s/playlist.m3u8')
+        source.objects['hls/s/playlist.m3u8'] = b'#EXTM3U\n#EXT-X-ENDLIST'
+        _, etag = cache.fetch('hls/s/playlist.m3u8')
+        assert etag == hashlib.md5(b'#EXTM3U\n#EXT-X-ENDLIST').hexdigest()
+
+        # A source miss is distinct from a cached file evicted under the caller
+        try:
+            cache.fetch('hls/s/missing.ts')
+            assert False, 'missing object served'
+        except ObjectNotFound:
+            pass
+        assert 'hls/s/missing.ts' not in cache.entries and not cache._fetching
+        assert not os.listdir(os.path.join(tmp, '.tmp'))
+
+        # A restarted cache serves what is on disk and computes its ETag on first use
+        restarted = MediaCache(source, root=tmp, max_bytes=250, playlist_ttl=0)
+        assert restarted.fetch('hls/s/2.ts')[1] == hashlib.md5(source.objects['hls/s/2.ts']).hexdigest()
+        assert restarted.misses == 0
+        assert restarted.invalidate('hls/s/') == 3
+        assert restarted.stats()['bytes'] == 0 and not os.path.exists(restarted.store.path('hls/s'))
+
+
+class FakeGeoIP:
+    """geoip2 Reader stand-in over {ip: country name}; unknown addresses raise like AddressNotFoundError"""
+
+    def __init__(self, countries):
+        self.countries = countries
+
+    def city(self, ip_address):
+        if ip_address not in self.countries:
+            raise ValueError(ip_address)
+        country = type('Country', (), {'name': self.countries[ip_address]})
+        return type('City', (), {'country': country})
+
+
+def test_country_cache():
+    """Only database-resolved countries are cached, so a later reader can resolve earlier misses"""
+    cold_autoscaler._country_cache.clear()
+    try:
+        assert cold_autoscaler.get_country_from_ip('203.0.113.7', None) == 'unknown'
+        assert cold_autoscaler.get_country_from_ip('35.195.0.1', None) == 'germany'
+        reader = FakeGeoIP({'203.0.113.7': 'Japan', '35.195.0.1': 'Belgium'})
+        assert cold_autoscaler.get_country_from_ip('203.0.113.7', reader) == 'japan'
+        assert cold_autoscaler.get_country_from_ip('35.195.0.1', reader) == 'belgium'
+        # Cached: served without a reader
+        assert cold_autoscaler.get_country_from_ip('203.0.113.7', None) == 'japan'
+        assert cold_autoscaler.get_country_from_ip('198.51.100.1', reader) == 'unknown'
+        assert set(cold_autoscaler._country_cache) == {'203.0.113.7', '35.195.0.1'}
+    finally:
+        cold_autoscaler._country_cache.clear()
+
+
+def test_autoscaler_cycle():
+    """A cycle scales the decision's regions up, or returns running cold regions to scale-to-zero"""
+    scaled, recorded = [], []
+    decisions = [{'should_scale': True, 'target_regions': ['asia-southeast1'], 'target_nodes': 2, 'reason': 'busy'},
+                 {'should_scale': False, 'target_regions': [], 'target_nodes': 0, 'reason': 'quiet'}]
+    cluster = {'status': 'RUNNING', 'node_pools': [{'name': 'cold', 'autoscaling': {'maxNodeCount': 2}}]}
+    names = ('get_mock_traffic_data', 'should_scale_based_on_traffic', 'get_cluster_info', 'scale_cluster_nodes')
+    saved = [getattr(cold_autoscaler, name) for name in names] + [cold_autoscaler.autoscaler_metrics.record_decision]
+    cold_autoscaler.get_mock_traffic_data = lambda: {'singapore': {'requests': 60, 'region': 'asia'}}
+    cold_autoscaler.should_scale_based_on_traffic = lambda analysis, latency: decisions.pop(0)
+    cold_autoscaler.get_cluster_info = lambda region: cluster
+    cold_autoscaler.scale_cluster_nodes = lambda region, nodes: scaled.append((region, nodes)) or {'status': 'resized'}
+    cold_autoscaler.autoscaler_metrics.record_decision = lambda region, outcome: recorded.append((region, outcome))
+    try:
+        assert cold_autoscaler.run_autoscaler_cycle()['reason'] == 'busy'
+        assert cold_autoscaler.run_autoscaler_cycle()['reason'] == 'quiet'
+    finally:
+        for name, value in zip(names, saved):
+            setattr(cold_autoscaler, name, value)
+        cold_autoscaler.autoscaler_metrics.record_decision = saved[-1]
+
+    cold_regions = [(region, 0) for region in cold_autoscaler.COLD_REGIONS]
+    assert scaled == [('asia-southeast1', 2)] + cold_regions
+    assert recorded == [('asia-southeast1', 'scale_up')] + [(region, 'scale_down') for region, _ in cold_regions]
+
+
+def test_plan_chunks():
+    """Chunks start on the first keyframe past each multiple and never leave a sliver at the end"""
+    keyframes = [float(second) for second in range(0, 600, 2)]
+    assert transcoder.plan_chunks(keyframes, 600.0, 120) == [
+        (0.0, 120.0), (120.0, 240.0), (240.0, 360.0), (360.0, 480.0), (480.0, 600.0)]
+    assert transcoder.plan_chunks(keyframes, 610.0, 120)[-1] == (480.0, 610.0)
+    assert transcoder.plan_chunks([0.0, 5.0, 125.0, 130.0, 250.0], 300.0, 120) == [
+        (0.0, 125.0), (125.0, 250.0), (250.0, 300.0)]
+    assert transcoder.plan_chunks([0.0], 90.0, 120) == [(0.0, 90.0)]
+
+
+def write_chunk(chunk_dir, renditions, segments, bandwidths):
+    """A chunk tree as make_hls writes it: a variant playlist per rendition plus the master"""
+    for name in renditions:
+        os.makedirs(os.path.join(chunk_dir, name), exist_ok=True)
+        for i, duration in enumerate(segments):
+            with open(os.path.join(chunk_dir, name, f"segment{i}.ts"), 'w') as f:
+                f.write(f"{chunk_dir}/{name}/{i}")
+        transcoder.write_variant_playlist(os.path.join(chunk_dir, name, transcoder.VARIANT_PLAYLIST),
+                                          [[(duration, f"segment{i}.ts") for i, duration in enumerate(segments)]])
+    lines = ['#EXTM3U', '#EXT-X-VERSION:6']
+    for name, bandwidth in zip(renditions, bandwidths):
+        lines += [f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth},RESOLUTION=1x{name[:-1]}", f"{name}/index.m3u8"]
+    with open(os.path.join(chunk_dir, transcoder.MASTER_PLAYLIST), 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def test_stitch_chunks():
+    """Chunk segments are renumbered into one playlist per rendition with discontinuities between chunks"""
+    renditions = ['720p', '360p']
+    with tempfile.TemporaryDirectory() as tmp:
+        chunk_dirs = [os.path.join(tmp, 'chunks', f"chunk{i}") for i in range(2)]
+        write_chunk(chunk_dirs[0], renditions, [4.0, 3.5], [3000000, 900000])
+        write_chunk(chunk_dirs[1], renditions, [4.0, 4.0, 1.25], [3500000, 800000])
+        output_dir = os.path.join(tmp, 'out')
+        transcoder.stitch_chunks(chunk_dirs, output_dir, [{'name': name} for name in renditions])
+
+        playlist = os.path.join(output_dir, '720p', transcoder.VARIANT_PLAYLIST)
+        assert transcoder.read_variant_playlist(playlist) == [
+            (4.0, 'segment0.ts'), (3.5, 'segment1.ts'), (4.0, 'segment2.ts'), (4.0, 'segment3.ts'),
+            (1.25, 'segment4.ts')]
+        with open(playlist) as f:
+            lines = f.read().splitlines()
+        assert lines.count('#EXT-X-DISCONTINUITY') == 1
+        assert lines.index('#EXT-X-DISCONTINUITY') == lines.index('segment1.ts') + 1
+        assert '#EXT-X-TARGETDURATION:4' in lines and lines[-1] == '#EXT-X-ENDLIST'
+        with open(os.path.join(output_dir, '720p', 'segment2.ts')) as f:
+            assert f.read() == f"{chunk_dirs[1]}/720p/0"
+
+        assert transcoder.read_master_bandwidths(os.path.join(output_dir, transcoder.MASTER_PLAYLIST)) == \
+            [3500000, 900000]
+        assert transcoder.describe_hls(output_dir) == {'renditions': renditions, 'segments': 10, 'duration': 16.75}
+
+
+def test_encoder_slots():
+    """Concurrent jobs, chunked or not, never run more encodes than the process-wide slots"""
+    import threading
+
+    running = []
+    peak = [0]
+    commands = []
+    lock = threading.Lock()
+
+    def fake_ffmpeg(cmd, duration=None, progress=None):
+        with lock:
+            running.append(cmd)
+            commands.append(cmd)
+            peak[0] = max(peak[0], len(running))
+        output_dir = os.path.dirname(os.path.dirname(cmd[-1]))
+        names = sorted(name for name in os.listdir(output_dir) if not name.startswith('.'))
+        write_chunk(output_dir, names, [4.0], [1000000] * len(names))
+        time.sleep(0.02)
+        with lock:
+            running.remove(cmd)
+
+    def fake_probe(path):
+        return {'duration': 1200.0 if 'long' in path else 60.0, 'height': 720, 'fps': 25}
+
+    saved = (transcoder.run_ffmpeg, transcoder.probe_media, transcoder.probe_keyframes, transcoder._encode_slots)
+    transcoder.run_ffmpeg = fake_ffmpeg
+    transcoder.probe_media = fake_probe
+    transcoder.probe_keyframes = lambda path: [float(second) for second in range(0, 1200, 2)]
+    transcoder._encode_slots = threading.BoundedSemaphore(3)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            jobs = [threading.Thread(target=transcoder.make_hls,
+                                     args=(name, os.path.join(tmp, name)),
+                                     kwargs={'ladder': transcoder.parse_ladder('720:2800k:128k'),
+                                             'chunk_workers': 8})
+                    for name in ('long-a', 'long-b', 'short')]
+            for job in jobs:
+                job.start()
+            for job in jobs:
+                job.join()
+            playlists = [os.path.join(tmp, name, transcoder.MASTER_PLAYLIST) for name in ('long-a', 'long-b', 'short')]
+            assert all(os.path.isfile(path) for path in playlists)
+    finally:
+        transcoder.run_ffmpeg, transcoder.probe_media, transcoder.probe_keyframes, transcoder._encode_slots = saved
+
+    # Two 10-chunk jobs plus one whole-file encode, at most three at a time
+    assert len(commands) == 21 and peak[0] == 3
+    assert all(cmd[cmd.index('-threads') + 1] == str(transcoder.ENCODE_THREADS) for cmd in commands)
+
+
+TESTS = (
+    test_job_journal_recovery,
+    test_job_retry_backoff,
+    test_job_journal_compaction,
+    test_upload_store_resume,
+    test_upload_store_expire,
+    test_transcode_cache_veto,
+    test_propagation,
+    test_merge_manifests,
+    test_prune_manifests,
+    test_catalogue_search,
+    test_catalogue_rebuild,
+    test_media_cache,
+    test_country_cache,
+    test_autoscaler_cycle,
+    test_plan_chunks,
+    test_stitch_chunks,
+    test_encoder_slots,
+)
+
+
+def main():
+    failed = 0
+    for test in TESTS:
+        try:
+            test()
+            print(f"✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"❌ {test.__name__}: {type(e).__name__}: {e}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    exit(main())
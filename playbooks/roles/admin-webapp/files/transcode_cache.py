@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Content-hash index of transcoded uploads
+Maps the SHA-256 of an uploaded video (computed while it is received, see
+uploads.py) to the HLS stream produced from it, so a re-upload of the same
+bytes reuses the existing renditions instead of running ffmpeg again. Kept as
+a small JSON file on local disk.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+
+class TranscodeCache:
+    """sha256 -> {stream_folder, video, size, created_at}, persisted on every change"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError):
+                # A lost index only costs re-transcodes
+                self.entries = {}
+
+    def _save(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def lookup(self, sha256, exists=None):
+        """Entry for a content hash; exists(entry) can veto (and drop) entries whose output is gone"""
+        with self._lock:
+            entry = self.entries.get(sha256)
+            if entry and exists and not exists(entry):
+                del self.entries[sha256]
+                self._save()
+                return None
+            return dict(entry) if entry else None
+
+    def record(self, sha256, stream_folder, video, size=None):
+        with self._lock:
+            self.entries[sha256] = {
+                'stream_folder': stream_folder,
+                'video': video,
+                'size': size,
+                'created_at': datetime.now(timezone.utc).isoformat()
+            }
+            self._save()
+
+    def invalidate(self, stream_folder=None, video=None):
+        """Forget entries pointing at a deleted stream or source video; returns how many"""
+        with self._lock:
+            stale = [sha256 for sha256, entry in self.entries.items()
+                     if (stream_folder and entry['stream_folder'] == stream_folder)
+                     or (video and entry['video'] == video)]
+            for sha256 in stale:
+                del self.entries[sha256]
+            if stale:
+                self._save()
+            return len(stale)
@@ -0,0 +1,432 @@
+#!/usr/bin/env python3
+"""
+ffmpeg helpers for turning uploaded videos into HLS streams
+make_hls encodes an adaptive bitrate ladder in a single decode pass: one
+variant playlist per rendition under <output_dir>/<name>/ and a master
+playlist.m3u8 next to them. ffmpeg runs with `-progress pipe:1`, so callers
+get a 0..1 completion fraction while the transcode is running.
+
+Long videos are transcoded in chunks: the source is cut at keyframes into
+time ranges, each range is encoded by its own ffmpeg process in parallel and
+the per-chunk segments are stitched into one playlist per rendition, with
+#EXT-X-DISCONTINUITY between chunks.
+"""
+
+import bisect
+import json
+import math
+import os
+import shutil
+import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from fractions import Fraction
+
+STDERR_TAIL_LINES = 40
+
+MASTER_PLAYLIST = 'playlist.m3u8'
+VARIANT_PLAYLIST = 'index.m3u8'
+
+# Segment length in seconds; keyframes are forced on every boundary so
+# segments line up across renditions and players can switch at any of them
+HLS_SEGMENT_SECONDS = int(os.environ.get('HLS_SEGMENT_SECONDS', '4'))
+
+# height:video bitrate:audio bitrate per rendition, highest first
+HLS_LADDER = os.environ.get('HLS_LADDER', '1080:5000k:192k,720:2800k:128k,480:1400k:96k,360:800k:64k')
+X264_PRESET = os.environ.get('X264_PRESET', 'veryfast')
+
+# Chunked mode: videos at least this long are split into ~CHUNK_SECONDS ranges
+# encoded by CHUNK_WORKERS parallel ffmpeg processes (0 disables chunking)
+CHUNKED_MIN_DURATION = int(os.environ.get('CHUNKED_MIN_DURATION', '600'))
+CHUNK_SECONDS = int(os.environ.get('CHUNK_SECONDS', '120'))
+CHUNK_WORKERS = int(os.environ.get('CHUNK_WORKERS', os.cpu_count() or 1))
+CHUNKS_DIR = '.chunks'
+
+# At most ENCODE_WORKERS ffmpeg encodes run at once in this process - whole
+# files and chunks of every job together - each with an equal share of the cores
+ENCODE_WORKERS = max(1, int(os.environ.get('ENCODE_WORKERS', CHUNK_WORKERS or 1)))
+ENCODE_THREADS = max(1, (os.cpu_count() or 1) // ENCODE_WORKERS)
+_encode_slots = threading.BoundedSemaphore(ENCODE_WORKERS)
+
+
+def parse_ladder(spec):
+    """'1080:5000k:192k,720:2800k:128k' -> renditions sorted by height, highest first"""
+    renditions = []
+    for item in spec.split(','):
+        if not item.strip():
+            continue
+        height, video_bitrate, audio_bitrate = item.strip().split(':')
+        renditions.append({
+            'name': f"{int(height)}p",
+            'height': int(height),
+            'video_bitrate': video_bitrate,
+            'audio_bitrate': audio_bitrate
+        })
+    return sorted(renditions, key=lambda rendition: rendition['height'], reverse=True)
+
+
+def scale_bitrate(bitrate, factor):
+    """'2800k' * 1.5 -> '4200k'"""
+    unit = bitrate[-1] if bitrate[-1].isalpha() else ''
+    return f"{int(float(bitrate.rstrip('kKmM')) * factor)}{unit}"
+
+
+def probe_media(input_filepath):
+    """Duration, first video stream geometry/frame rate and audio presence; {} if ffprobe fails"""
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'format=duration:stream=codec_type,width,height,avg_frame_rate',
+        '-of', 'json',
+        input_filepath
+    ]
+    try:
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=60).stdout
+        probe = json.loads(output)
+    except (subprocess.SubprocessError, OSError, ValueError):
+        return {}
+
+    streams = probe.get('streams', [])
+    video = next((stream for stream in streams if stream.get('codec_type') == 'video'), {})
+    try:
+        fps = float(Fraction(video.get('avg_frame_rate', '0/1')))
+    except (ValueError, ZeroDivisionError):
+        fps = 0.0
+    try:
+        duration = float(probe.get('format', {}).get('duration'))
+    except (TypeError, ValueError):
+        duration = None
+    return {
+        'duration': duration,
+        'width': video.get('width'),
+        'height': video.get('height'),
+        'fps': fps or None,
+        'has_audio': any(stream.get('codec_type') == 'audio' for stream in streams)
+    }
+
+
+def probe_keyframes(input_filepath):
+    """Sorted presentation times (s) of the first video stream's keyframes, from packet flags
+
+    Reads packet headers only, no decoding, so it takes seconds even for long files.
+    """
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags',
+        '-of', 'csv=p=0',
+        input_filepath
+    ]
+    try:
+        output = subprocess.run(cmd, check=True, capture_output=True, text=True, timeout=600).stdout
+    except (subprocess.SubprocessError, OSError):
+        return []
+
+    keyframes = set()
+    for line in output.splitlines():
+        pts_time, _, flags = line.partition(',')
+        if 'K' in flags:
+            try:
+                keyframes.add(float(pts_time))
+            except ValueError:
+                continue
+    return sorted(keyframes)
+
+
+def plan_chunks(keyframes, duration, chunk_seconds):
+    """(start, end) time ranges of about chunk_seconds, each starting on a keyframe
+
+    Every cut is the first keyframe at or after a multiple of chunk_seconds, so
+    chunks decode independently. The last range ends at the duration.
+    """
+    starts = [0.0]
+    target = chunk_seconds
+    while target < duration:
+        i = bisect.bisect_left(keyframes, target)
+        if i == len(keyframes):
+            break
+        # Don't leave a sliver of a chunk at the end
+        if duration - keyframes[i] < chunk_seconds / 4:
+            break
+        starts.append(keyframes[i])
+        target = keyframes[i] + chunk_seconds
+    return [(start, end) for start, end in zip(starts, starts[1:] + [duration])]
+
+
+def select_renditions(ladder, source_height):
+    """Drop renditions taller than the source (no upscaling), keeping at least the smallest"""
+    if not source_height:
+        return ladder
+    fitting = [rendition for rendition in ladder if rendition['height'] <= source_height]
+    return fitting or ladder[-1:]
+
+
+def run_ffmpeg(cmd, duration=None, progress=None):
+    """Run an ffmpeg command, reporting progress(fraction) from its -progress output
+
+    Raises CalledProcessError with the tail of ffmpeg's stderr on failure.
+    """
+    cmd = [cmd[0], '-hide_banner', '-nostats', '-progress', 'pipe:1'] + list(cmd[1:])
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                               stdin=subprocess.DEVNULL, text=True)
+
+    # Drain stderr concurrently so a chatty ffmpeg can't block on a full pipe
+    stderr_tail = deque(maxlen=STDERR_TAIL_LINES)
+    stderr_reader = threading.Thread(target=lambda: stderr_tail.extend(process.stderr), daemon=True)
+    stderr_reader.start()
+
+    for line in process.stdout:
+        key, _, value = line.strip().partition('=')
+        if not progress:
+            continue
+        if key in ('out_time_us', 'out_time_ms') and duration and value.isdigit():
+            # out_time_ms is in microseconds too (a long-standing ffmpeg quirk)
+            progress(min(int(value) / 1_000_000 / duration, 0.99))
+        elif key == 'progress' and value == 'end':
+            progress(1.0)
+
+    returncode = process.wait()
+    stderr_reader.join(timeout=5)
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stderr=''.join(stderr_tail))
+
+
+def run_encode(cmd, duration, progress=None):
+    """run_ffmpeg once one of the process-wide encoder slots is free"""
+    with _encode_slots:
+        run_ffmpeg(cmd, duration, progress)
+
+
+def hls_ladder_command(input_filepath, output_dir, renditions, media, segment_seconds,
+                       start=None, length=None, threads=None):
+    """ffmpeg arguments encoding every rendition from one decode of the input
+
+    start/length restrict the encode to a time range of the input (chunked
+    mode); output timestamps keep the source timeline.
+    """
+    count = len(renditions)
+    split = f"[0:v]split={count}" + ''.join(f"[v{i}]" for i in range(count))
+    scales = [f"[v{i}]scale=-2:{rendition['height']}[v{i}out]" for i, rendition in enumerate(renditions)]
+
+    cmd = ['ffmpeg', '-y']
+    if start:
+        cmd += ['-ss', f"{start:.6f}"]
+    if length:
+        cmd += ['-t', f"{length:.6f}"]
+    cmd += ['-i', input_filepath, '-filter_complex', ';'.join([split] + scales)]
+    if start:
+        cmd += ['-output_ts_offset', f"{start:.6f}"]
+    if threads:
+        cmd += ['-threads', str(threads)]
+    for i, rendition in enumerate(renditions):
+        cmd += [
+            '-map', f"[v{i}out]",
+            f"-c:v:{i}", 'libx264',
+            f"-b:v:{i}", rendition['video_bitrate'],
+            f"-maxrate:v:{i}", scale_bitrate(rendition['video_bitrate'], 1.07),
+            f"-bufsize:v:{i}", scale_bitrate(rendition['video_bitrate'], 1.5)
+        ]
+    if media.get('has_audio'):
+        for i, rendition in enumerate(renditions):
+            cmd += ['-map', '0:a:0', f"-c:a:{i}", 'aac', f"-b:a:{i}", rendition['audio_bitrate'], f"-ac:a:{i}", '2']
+
+    # Fixed GOP with scene-cut keyframes off, plus a forced keyframe on every segment boundary
+    cmd += [
+        '-preset', X264_PRESET,
+        '-pix_fmt', 'yuv420p',
+        '-sc_threshold', '0',
+        '-force_key_frames', f"expr:gte(t,n_forced*{segment_seconds})"
+    ]
+    if media.get('fps'):
+        gop = max(1, round(media['fps'] * segment_seconds))
+        cmd += ['-g', str(gop), '-keyint_min', str(gop)]
+
+    if media.get('has_audio'):
+        stream_map = ' '.join(f"v:{i},a:{i},name:{rendition['name']}" for i, rendition in enumerate(renditions))
+    else:
+        stream_map = ' '.join(f"v:{i},name:{rendition['name']}" for i, rendition in enumerate(renditions))
+
+    cmd += [
+        '-f', 'hls',
+        '-hls_time', str(segment_seconds),
+        '-hls_playlist_type', 'vod',
+        '-hls_list_size', '0',
+        '-hls_flags', 'independent_segments',
+        '-hls_segment_filename', os.path.join(output_dir, '%v', 'segment%d.ts'),
+        '-master_pl_name', MASTER_PLAYLIST,
+        '-var_stream_map', stream_map,
+        os.path.join(output_dir, '%v', VARIANT_PLAYLIST)
+    ]
+    return cmd
+
+
+def read_variant_playlist(path):
+    """[(duration, segment uri)] of a VOD media playlist"""
+    segments = []
+    duration = None
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith('#EXTINF:'):
+                duration = float(line[len('#EXTINF:'):].split(',')[0])
+            elif line and not line.startswith('#') and duration is not None:
+                segments.append((duration, line))
+                duration = None
+    return segments
+
+
+def rendition_height(name):
+    """720 for a '720p' rendition directory, 0 for anything else"""
+    return int(name[:-1]) if name.endswith('p') and name[:-1].isdigit() else 0
+
+
+def describe_hls(output_dir):
+    """Renditions (highest first), total segment count and duration of an HLS tree written by make_hls"""
+    renditions, segments, duration = [], 0, 0.0
+    names = [name for name in os.listdir(output_dir) if os.path.isfile(os.path.join(output_dir, name, VARIANT_PLAYLIST))]
+    for name in sorted(names, key=rendition_height, reverse=True):
+        entries = read_variant_playlist(os.path.join(output_dir, name, VARIANT_PLAYLIST))
+        renditions.append(name)
+        segments += len(entries)
+        duration = max(duration, sum(seconds for seconds, _ in entries))
+    return {'renditions': renditions, 'segments': segments, 'duration': round(duration, 3)}
+
+
+def write_variant_playlist(path, chunks):
+    """VOD media playlist over the segment lists of consecutive chunks"""
+    durations = [duration for chunk in chunks for duration, _ in chunk]
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:6',
+        f"#EXT-X-TARGETDURATION:{math.ceil(max(durations, default=0))}",
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+        '#EXT-X-INDEPENDENT-SEGMENTS'
+    ]
+    for i, chunk in enumerate(chunks):
+        if i and chunk:
+            lines.append('#EXT-X-DISCONTINUITY')
+        for duration, uri in chunk:
+            lines += [f"#EXTINF:{duration:.6f},", uri]
+    lines.append('#EXT-X-ENDLIST')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+
+def stitch_chunks(chunk_dirs, output_dir, renditions):
+    """Move chunk segments into one numbered sequence per rendition and write its playlist"""
+    for rendition in renditions:
+        variant_dir = os.path.join(output_dir, rendition['name'])
+        os.makedirs(variant_dir, exist_ok=True)
+        stitched = []
+        number = 0
+        for chunk_dir in chunk_dirs:
+            chunk_variant_dir = os.path.join(chunk_dir, rendition['name'])
+            chunk = []
+            for duration, uri in read_variant_playlist(os.path.join(chunk_variant_dir, VARIANT_PLAYLIST)):
+                segment = f"segment{number}.ts"
+                os.replace(os.path.join(chunk_variant_dir, uri), os.path.join(variant_dir, segment))
+                chunk.append((duration, segment))
+                number += 1
+            stitched.append(chunk)
+        write_variant_playlist(os.path.join(variant_dir, VARIANT_PLAYLIST), stitched)
+
+    # Every chunk encodes the same ladder, so any chunk's master playlist lists the variants;
+    # take the first and keep the highest per-chunk peak bandwidth for each variant
+    masters = [read_master_bandwidths(os.path.join(chunk_dir, MASTER_PLAYLIST)) for chunk_dir in chunk_dirs]
+    with open(os.path.join(chunk_dirs[0], MASTER_PLAYLIST)) as f:
+        master = f.read().splitlines()
+    variant = 0
+    for i, line in enumerate(master):
+        if line.startswith('#EXT-X-STREAM-INF:'):
+            peak = max(bandwidths[variant] for bandwidths in masters if variant < len(bandwidths))
+            master[i] = replace_attribute(line, 'BANDWIDTH', str(peak))
+            variant += 1
+    with open(os.path.join(output_dir, MASTER_PLAYLIST), 'w') as f:
+        f.write('\n'.join(master) + '\n')
+
+
+def read_master_bandwidths(path):
+    with open(path) as f:
+        return [int(attribute_value(line, 'BANDWIDTH')) for line in f if line.startswith('#EXT-X-STREAM-INF:')]
+
+
+def attribute_value(line, name):
+    for attribute in line.split(':', 1)[1].split(','):
+        key, _, value = attribute.partition('=')
+        if key == name:
+            return value
+    return '0'
+
+
+def replace_attribute(line, name, value):
+    tag, attributes = line.split(':', 1)
+    parts = [f"{name}={value}" if part.startswith(f"{name}=") else part for part in attributes.split(',')]
+    return f"{tag}:{','.join(parts)}"
+
+
+def make_hls_chunked(input_filepath, output_dir, renditions, media, segment_seconds, chunks,
+                     workers, progress=None):
+    """Encode time ranges of the input in parallel ffmpeg processes and stitch the results
+
+    Chunks of concurrent jobs share the process-wide encoder slots, so the
+    total number of ffmpeg processes stays at ENCODE_WORKERS.
+    """
+    chunks_root = os.path.join(output_dir, CHUNKS_DIR)
+    chunk_dirs = [os.path.join(chunks_root, f"chunk{i:04d}") for i in range(len(chunks))]
+    total = sum(end - start for start, end in chunks)
+    done = [0.0] * len(chunks)
+    lock = threading.Lock()
+
+    def encode(i):
+        start, end = chunks[i]
+
+        def chunk_progress(fraction):
+            if progress:
+                with lock:
+                    done[i] = fraction * (end - start)
+                    progress(min(sum(done) / total, 0.99))
+
+        for rendition in renditions:
+            os.makedirs(os.path.join(chunk_dirs[i], rendition['name']), exist_ok=True)
+        cmd = hls_ladder_command(input_filepath, chunk_dirs[i], renditions, media, segment_seconds,
+                                 start=start, length=end - start, threads=ENCODE_THREADS)
+        run_encode(cmd, end - start, chunk_progress)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='hls-chunk') as pool:
+            # list() re-raises the first chunk failure
+            list(pool.map(encode, range(len(chunks))))
+        stitch_chunks(chunk_dirs, output_dir, renditions)
+    finally:
+        shutil.rmtree(chunks_root, ignore_errors=True)
+    if progress:
+        progress(1.0)
+
+
+def make_hls(input_filepath, output_dir, progress=None, ladder=None, segment_seconds=None, chunk_workers=None):
+    """Transcode to an HLS ABR ladder; returns the master playlist path
+
+    Videos of at least CHUNKED_MIN_DURATION seconds are encoded in parallel
+    keyframe-aligned chunks when more than one chunk worker is available.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    segment_seconds = segment_seconds or HLS_SEGMENT_SECONDS
+    chunk_workers = chunk_workers or CHUNK_WORKERS
+    media = probe_media(input_filepath)
+    renditions = select_renditions(ladder or parse_ladder(HLS_LADDER), media.get('height'))
+
+    duration = media.get('duration')
+    if CHUNKED_MIN_DURATION and chunk_workers > 1 and duration and duration >= CHUNKED_MIN_DURATION:
+        chunks = plan_chunks(probe_keyframes(input_filepath), duration, CHUNK_SECONDS)
+        if len(chunks) > 1:
+            make_hls_chunked(input_filepath, output_dir, renditions, media, segment_seconds, chunks,
+                             min(chunk_workers, len(chunks)), progress)
+            return os.path.join(output_dir, MASTER_PLAYLIST)
+
+    for rendition in renditions:
+        os.makedirs(os.path.join(output_dir, rendition['name']), exist_ok=True)
+    cmd = hls_ladder_command(input_filepath, output_dir, renditions, media, segment_seconds,
+                             threads=ENCODE_THREADS)
+    run_encode(cmd, duration, progress)
+    return os.path.join(output_dir, MASTER_PLAYLIST)
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Streaming upload staging for the admin webapp
+Upload bodies are written in bounded chunks to a staging directory on local
+disk and SHA-256 hashed on the way, so the finished file is moved to the
+bucket mount exactly once. Two entry points share the staging area:
+
+- HashingFile, a werkzeug stream factory target for multipart /upload posts
+- UploadStore, resumable chunked uploads (tus 1.0 core: POST creates,
+  HEAD reports Upload-Offset, PATCH appends at that offset)
+"""
+
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+
+UPLOAD_STAGING_PATH = os.environ.get('UPLOAD_STAGING_PATH', '/var/lib/content_manager/uploads')
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', str(1024 * 1024)))
+# Unfinished resumable uploads are discarded after this many hours without a PATCH
+UPLOAD_EXPIRY_HOURS = int(os.environ.get('UPLOAD_EXPIRY_HOURS', '24'))
+
+TUS_VERSION = '1.0.0'
+
+
+class UploadError(Exception):
+    """Rejected resumable upload request; status is the HTTP status to answer with"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class HashingFile:
+    """Staging file that hashes everything written to it
+
+    Closing it deletes the file unless detach() claimed it first, so werkzeug's
+    end-of-request cleanup removes uploads the route didn't keep.
+    """
+
+    def __init__(self, staging_dir=None):
+        staging_dir = staging_dir or UPLOAD_STAGING_PATH
+        os.makedirs(staging_dir, exist_ok=True)
+        self.name = os.path.join(staging_dir, f"{uuid.uuid4().hex}.part")
+        self._file = open(self.name, 'w+b')
+        self._digest = hashlib.sha256()
+        self.size = 0
+        self._detached = False
+
+    def write(self, data):
+        self._digest.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def detach(self):
+        """Close the file and hand it to the caller, who now owns it; returns its path"""
+        self._detached = True
+        self._file.close()
+        return claim(self.name)
+
+    def close(self):
+        self._file.close()
+        if not self._detached and os.path.exists(self.name):
+            os.remove(self.name)
+
+    def __getattr__(self, name):
+        # read/seek/tell/flush for werkzeug's parser and FileStorage
+        return getattr(self._file, name)
+
+
+def claim(part_path):
+    """Rename a received .part file to .staged: it now belongs to a transcoding job, not to expiry"""
+    staged_path = f"{os.path.splitext(part_path)[0]}.staged"
+    os.replace(part_path, staged_path)
+    return staged_path
+
+
+def hashing_stream_factory(total_content_length, content_type, filename=None, content_length=None):
+    """werkzeug stream_factory: stream multipart file parts to local staging instead of a spooled temp file"""
+    return HashingFile()
+
+
+def parse_metadata(header):
+    """tus Upload-Metadata 'key base64,key base64' -> dict of decoded values"""
+    metadata = {}
+    for pair in filter(None, (item.strip() for item in (header or '').split(','))):
+        key, _, value = pair.partition(' ')
+        try:
+            metadata[key] = base64.b64decode(value).decode('utf-8') if value else ''
+        except (ValueError, UnicodeDecodeError):
+            raise UploadError(f"invalid Upload-Metadata value for {key}")
+    return metadata
+
+
+class UploadStore:
+    """Resumable uploads staged as <id>.part with an <id>.json sidecar
+
+    The running SHA-256 of each upload is kept in memory; after a restart it is
+    rebuilt from the staged prefix on the next PATCH.
+    """
+
+    def __init__(self, staging_dir=None):
+        self.staging_dir = staging_dir or UPLOAD_STAGING_PATH
+        self._lock = threading.Lock()
+        self._digests = {}
+        self._busy = set()
+
+    def _paths(self, upload_id):
+        if not upload_id.isalnum():
+            raise UploadError('upload not found', 404)
+        base = os.path.join(self.staging_dir, upload_id)
+        return f"{base}.part", f"{base}.json"
+
+    def _save(self, upload):
+        _, meta_path = self._paths(upload['id'])
+        tmp_path = f"{meta_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(upload, f)
+        os.replace(tmp_path, meta_path)
+
+    def create(self, length, metadata):
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self.expire()
+        if length < 0:
+            raise UploadError('Upload-Length must not be negative')
+        upload = {
+            'id': uuid.uuid4().hex,
+            'length': length,
+            'offset': 0,
+            'metadata': metadata,
+            'created_at': time.time(),
+            'updated_at': time.time(),
+            'result': None
+        }
+        part_path, _ = self._paths(upload['id'])
+        open(part_path, 'wb').close()
+        self._save(upload)
+        with self._lock:
+            self._digests[upload['id']] = hashlib.sha256()
+        return upload
+
+    def get(self, upload_id):
+        _, meta_path = self._paths(upload_id)
+        try:
+            with open(meta_path) as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            raise UploadError('upload not found', 404)
+
+    def _digest(self, upload):
+        """Running hash of the staged bytes, rehashing the prefix if it was lost"""
+        with self._lock:
+            digest = self._digests.get(upload['id'])
+        if digest is None:
+            digest = hashlib.sha256()
+            part_path, _ = self._paths(upload['id'])
+            with open(part_path, 'rb') as f:
+                remaining = upload['offset']
+                while remaining:
+                    chunk = f.read(min(UPLOAD_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    remaining -= len(chunk)
+            with self._lock:
+                self._digests[upload['id']] = digest
+        return digest
+
+    def append(self, upload_id, offset, stream):
+        """Write a PATCH body at offset; returns the updated upload
+
+        Bytes received before a dropped connection are kept, so the client can
+        resume from the offset HEAD reports.
+        """
+        with self._lock:
+            if upload_id in self._busy:
+                raise UploadError('another request is writing to this upload', 409)
+            self._busy.add(upload_id)
+        try:
+            upload = self.get(upload_id)
+            if offset != upload['offset']:
+                raise UploadError(f"Upload-Offset {offset} does not match {upload['offset']}", 409)
+            digest = self._digest(upload)
+            part_path, _ = self._paths(upload_id)
+            try:
+                with open(part_path, 'r+b') as f:
+                    f.seek(upload['offset'])
+                    f.truncate()
+                    while upload['offset'] < upload['length']:
+                        chunk = stream.read(min(UPLOAD_CHUNK_SIZE, upload['length'] - upload['offset']))
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        digest.update(chunk)
+                        upload['offset'] += len(chunk)
+            finally:
+                upload['updated_at'] = time.time()
+                self._save(upload)
+            return upload
+        finally:
+            with self._lock:
+                self._busy.discard(upload_id)
+
+    def complete(self, upload_id):
+        """Hand a fully received upload over: (staged path, sha256 hex, size)"""
+        upload = self.get(upload_id)
+        if upload['offset'] != upload['length']:
+            raise UploadError('upload is not complete', 409)
+        part_path, _ = self._paths(upload_id)
+        sha256 = self._digest(upload).hexdigest()
+        return claim(part_path), sha256, upload['length']
+
+    def finish(self, upload_id, result):
+        """Record what became of a completed upload; its staged data is gone by now"""
+        upload = self.get(upload_id)
+        upload['result'] = result
+        upload['updated_at'] = time.time()
+        self._save(upload)
+        with self._lock:
+            self._digests.pop(upload_id, None)
+        return upload
+
+    def delete(self, upload_id):
+        for path in self._paths(upload_id):
+            if os.path.exists(path):
+                os.remove(path)
+        with self._lock:
+            self._digests.pop(upload_id, None)
+
+    def expire(self):
+        """Drop uploads (finished or not) idle for longer than UPLOAD_EXPIRY_HOURS"""
+        if not os.path.isdir(self.staging_dir):
+            return
+        cutoff = time.time() - UPLOAD_EXPIRY_HOURS * 3600
+        for name in os.listdir(self.staging_dir):
+            upload_id, extension = os.path.splitext(name)
+            path = os.path.join(self.staging_dir, name)
+            try:
+                if extension == '.json' and self.get(upload_id)['updated_at'] < cutoff:
+                    self.delete(upload_id)
+                elif (extension == '.part' and os.path.getmtime(path) < cutoff
+                      and not os.path.exists(os.path.join(self.staging_dir, f"{upload_id}.json"))):
+                    # Multipart staging file left behind by a crash
+                    os.remove(path)
+            except (UploadError, OSError):
+                continue
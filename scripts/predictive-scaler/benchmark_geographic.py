@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Benchmark for extract_geographic_metrics
+Compares the vectorized batch parser in fetch_metrics.py with the previous
+per-record loop on a synthetic load balancer log, and checks both agree
+"""
+
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import fetch_metrics
+from fetch_metrics import extract_client_ip, get_country_from_ip
+
+# Client IPs hitting the prefix fallback in get_country_from_ip, plus unmatched ones
+SYNTHETIC_IP_PREFIXES = ['35.195.', '34.89.', '35.188.', '34.66.', '35.185.', '34.84.', '81.2.', '203.0.']
+
+
+def synthetic_lb_logs(count, unique_ips=50000, seed=42):
+    """Generate load balancer entries shaped like gcloud logging read output"""
+    rng = random.Random(seed)
+    ips = [f"{rng.choice(SYNTHETIC_IP_PREFIXES)}{rng.randint(0, 255)}.{rng.randint(1, 254)}"
+           for _ in range(unique_ips)]
+    start = datetime(2025, 1, 30, tzinfo=timezone.utc)
+
+    logs = []
+    for i in range(count):
+        request = {
+            'requestMethod': 'GET',
+            'requestUrl': f"https://cdn.example.com/hls/video{i % 40}/segment{i % 600}.ts",
+            'status': rng.choice((200, 200, 200, 206, 304, 404, 503)),
+            'latency': f"{rng.expovariate(5):.6f}s",
+        }
+        shape = i % 20
+        if shape == 0:
+            # Forwarded requests without remoteIp
+            request['requestHeaders'] = {'X-Forwarded-For': f"{rng.choice(ips)}, 10.0.0.1"}
+        elif shape == 1:
+            # No IP at all, only a remoteLocation
+            request['remoteLocation'] = {'country': 'Japan'}
+            del request['latency']
+        else:
+            request['remoteIp'] = rng.choice(ips)
+
+        logs.append({
+            'insertId': f"{i:012x}",
+            'timestamp': (start + timedelta(milliseconds=i * 37)).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            'httpRequest': request,
+            'resource': {'type': 'http_load_balancer', 'labels': {'backend_service_name': 'video-backend'}},
+        })
+    return logs
+
+
+def legacy_latency_ms(latency):
+    latency_ms = 0
+    if isinstance(latency, str):
+        if latency.endswith('ms'):
+            try:
+                latency_ms = float(latency[:-2])
+            except ValueError:
+                latency_ms = 0
+        elif latency.endswith('s'):
+            try:
+                latency_ms = float(latency[:-1]) * 1000
+            except ValueError:
+                latency_ms = 0
+    elif isinstance(latency, (int, float)):
+        latency_ms = float(latency)
+    return latency_ms
+
+
+def legacy_extract_geographic_metrics(logs, geoip_reader=None):
+    """The per-record loop extract_geographic_metrics used before vectorization"""
+    geographic_data = {}
+    latency_by_country = {}
+
+    for log in logs:
+        ip_address = extract_client_ip(log)
+        country = get_country_from_ip(ip_address, geoip_reader) if ip_address else None
+        if not country and 'httpRequest' in log:
+            remote_country = log['httpRequest'].get('remoteLocation', {}).get('country')
+            country = remote_country.lower() if remote_country else None
+        country = country or 'unknown'
+
+        geographic_data[country] = geographic_data.get(country, 0) + 1
+
+        if 'httpRequest' in log:
+            latency_ms = legacy_latency_ms(log['httpRequest'].get('latency', '0s'))
+            latency_by_country.setdefault(country, [])
+            if latency_ms > 0:
+                latency_by_country[country].append(latency_ms)
+
+    avg_latencies = {country: sum(latencies) / len(latencies)
+                     for country, latencies in latency_by_country.items() if latencies}
+    return geographic_data, avg_latencies
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark geographic metric extraction')
+    parser.add_argument('--rows', type=int, default=1000000,
+                        help='Synthetic log entries to generate (default: 1,000,000)')
+    parser.add_argument('--unique-ips', type=int, default=50000,
+                        help='Distinct client IPs in the synthetic log')
+    parser.add_argument('--geoip-db', type=str, default=None,
+                        help='GeoLite2-City.mmdb to resolve countries with (default: prefix fallback)')
+    args = parser.parse_args()
+
+    print(f"🧪 Generating {args.rows:,} synthetic load balancer entries...")
+    logs, generate_s = timed(synthetic_lb_logs, args.rows, args.unique_ips)
+    print(f"  Generated in {generate_s:.1f}s")
+
+    geoip_reader = fetch_metrics.open_geoip_reader(args.geoip_db) if args.geoip_db else None
+
+    # Warm up so pandas/pyarrow import time stays out of the measurement
+    fetch_metrics.extract_geographic_metrics(logs[:100], geoip_reader)
+
+    (legacy_counts, legacy_latency), legacy_s = timed(legacy_extract_geographic_metrics, logs, geoip_reader)
+    (counts, latency), vectorized_s = timed(fetch_metrics.extract_geographic_metrics, logs, geoip_reader)
+
+    if geoip_reader:
+        geoip_reader.close()
+
+    with_ip = [extract_client_ip(log) for log in logs]
+    lookups = sum(1 for ip in with_ip if ip)
+    unique_lookups = len({ip for ip in with_ip if ip})
+
+    matches = (counts == legacy_counts and latency.keys() == legacy_latency.keys()
+               and all(abs(latency[c] - legacy_latency[c]) < 1e-6 for c in latency))
+
+    print(f"\n⏱️  Results for {args.rows:,} entries:")
+    print(f"  - Per-record loop: {legacy_s:8.2f}s ({args.rows / legacy_s:12,.0f} entries/s)")
+    print(f"  - Vectorized:      {vectorized_s:8.2f}s ({args.rows / vectorized_s:12,.0f} entries/s)")
+    print(f"  - Speedup:         {legacy_s / vectorized_s:8.1f}x")
+    print(f"  - GeoIP lookups:   {lookups:,} per-record vs {unique_lookups:,} (one per distinct IP)")
+    print(f"  - Results match:   {'✅' if matches else '❌'}")
+
+    return 0 if matches else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
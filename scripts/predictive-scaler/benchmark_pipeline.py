@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark suite for the autoscaling data pipeline
+Serves synthetic traffic (synthetic_traffic.py) through a fake gcloud
+(fake_gcloud.py) and times log ingestion, GeoIP resolution, aggregation, the
+cold autoscaler decision, the vector index and whole collection/scaling
+cycles. Results are stored as JSON; --baseline/--compare flag regressions.
+"""
+
+import argparse
+import contextlib
+import itertools
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+import fetch_metrics
+from fake_gcloud import FakeCloud
+from scaler_daemon import percentile
+from synthetic_traffic import INITIAL_NODES, SERVING_REGIONS, SyntheticGeoIP, TrafficSimulator
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+ADMIN_WEBAPP_DIR = SCRIPT_DIR.parent.parent / 'playbooks' / 'roles' / 'admin-webapp' / 'files'
+RESULTS_DIR = Path('benchmark_results')
+
+# Metric name -> (unit, higher is better)
+BENCHMARK_METRICS = {
+    'log_ingestion_entries_per_s': ('entries/s', True),
+    'geoip_lookups_per_s': ('lookups/s', True),
+    'geographic_extraction_s': ('s', False),
+    'feature_aggregation_s': ('s', False),
+    'decision_latency_p50_us': ('us', False),
+    'decision_latency_p99_us': ('us', False),
+    'vector_index_build_s': ('s', False),
+    'vector_query_p50_ms': ('ms', False),
+    'collection_cycle_s': ('s', False),
+    'autoscaler_cycle_s': ('s', False),
+}
+REGRESSION_THRESHOLD_PCT = 10.0
+
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the progress output of the code under test"""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def best_of(repeat, func, *args):
+    """Run func `repeat` times; returns the last result and the fastest wall time"""
+    best, result = None, None
+    for _ in range(max(1, repeat)):
+        start = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+def generate_traffic(hours, requests_per_minute, seed):
+    """Synthetic entries ending now (the cold autoscaler always reads the last 2 hours)"""
+    start = datetime.now(timezone.utc).replace(second=0, microsecond=0) - timedelta(hours=hours)
+    simulator = TrafficSimulator(start, hours, requests_per_minute, seed)
+    lb_entries, events = [], []
+    for _, minute_entries, scaling, pressure in simulator.iter_minutes():
+        lb_entries.extend(minute_entries)
+        events.extend(scaling)
+        events.extend(pressure)
+    end = start + timedelta(minutes=simulator.minutes)
+    return lb_entries, events, simulator.monitoring_series(), start, end
+
+
+def bench_log_ingestion(start, end, repeat):
+    """Sliced, parallel gcloud collection of the load balancer window"""
+    stats = {}
+
+    def fetch():
+        stats.clear()
+        with quiet():
+            return fetch_metrics.fetch_load_balancer_logs(start, end, stats)
+
+    logs, seconds = best_of(repeat, fetch)
+    return logs, {
+        'log_ingestion_entries_per_s': len(logs) / seconds,
+        'details': {'entries': len(logs), 'seconds': seconds,
+                    'gcloud_calls': stats.get('attempts', 0), 'slices': stats.get('slices', 0),
+                    'bytes': stats.get('bytes', 0)},
+    }
+
+
+def bench_geoip(logs, geoip_reader, repeat):
+    """Per-IP country lookups, and extract_geographic_metrics over the whole log"""
+    ips = list({ip for ip in map(fetch_metrics.extract_client_ip, logs) if ip})
+
+    def lookup_all():
+        return [fetch_metrics.get_country_from_ip(ip, geoip_reader) for ip in ips]
+
+    _, lookup_s = best_of(repeat, lookup_all)
+    with quiet():
+        fetch_metrics.extract_geographic_metrics(logs[:100], geoip_reader)
+        _, extraction_s = best_of(repeat, fetch_metrics.extract_geographic_metrics, logs, geoip_reader)
+    return {
+        'geoip_lookups_per_s': len(ips) / lookup_s if lookup_s else None,
+        'geographic_extraction_s': extraction_s,
+        'details': {'unique_ips': len(ips)},
+    }
+
+
+def bench_aggregation(logs, events, geoip_reader, repeat):
+    """Flattening plus feature windows, as create_training_dataset does"""
+    import feature_builder
+
+    scaling = [event for event in events if event['resource']['type'] == 'k8s_cluster']
+    pressure = [event for event in events if event['resource']['type'] == 'k8s_node']
+
+    def aggregate():
+        requests = fetch_metrics.flatten_lb_logs(logs, geoip_reader)
+        return feature_builder.build_feature_windows(requests, scaling, pressure)
+
+    windows, seconds = best_of(repeat, aggregate)
+    return windows, {'feature_aggregation_s': seconds, 'details': {'windows': len(windows)}}
+
+
+def import_cold_autoscaler(geoip_db=None):
+    """The admin webapp's cold_autoscaler, with its GeoIP download pointed at geoip_db"""
+    if str(ADMIN_WEBAPP_DIR) not in sys.path:
+        sys.path.insert(0, str(ADMIN_WEBAPP_DIR))
+    import cold_autoscaler
+
+    cold_autoscaler.download_geoip_database = lambda: Path(geoip_db) if geoip_db else None
+    return cold_autoscaler
+
+
+def bench_decision(windows, cold_autoscaler, iterations):
+    """should_scale_based_on_traffic latency over the feature windows' traffic mixes"""
+    inputs = []
+    for window in windows.to_dict('records'):
+        total = window['total_requests']
+        traffic = {region: window[f'{region}_requests'] for region in ('asia', 'europe', 'americas')}
+        traffic['unknown'] = window['unknown_region_requests']
+        inputs.append(({
+            'total_requests': total,
+            'regional_traffic': traffic,
+            'regional_percentages': {region: count / total * 100 if total else 0
+                                     for region, count in traffic.items()},
+        }, {'hot_regions_avg_latency': window['avg_latency_ms']}))
+    if not inputs:
+        return {'decision_latency_p50_us': None, 'decision_latency_p99_us': None}
+
+    samples = []
+    # Decision logging stays out of the measurement
+    logging.disable(logging.INFO)
+    try:
+        for analysis, latency in itertools.islice(itertools.cycle(inputs), iterations):
+            start = time.perf_counter_ns()
+            cold_autoscaler.should_scale_based_on_traffic(analysis, latency)
+            samples.append((time.perf_counter_ns() - start) / 1000)
+    finally:
+        logging.disable(logging.NOTSET)
+
+    return {
+        'decision_latency_p50_us': percentile(samples, 50),
+        'decision_latency_p99_us': percentile(samples, 99),
+        'details': {'decisions': len(samples)},
+    }
+
+
+def bench_vector_index(data_dir, documents, queries):
+    """Embed collected documents into Chroma and time retrieval; skipped without LangChain"""
+    try:
+        from predictive_scaler import InfrastructureScaler
+        with quiet():
+            scaler = InfrastructureScaler(data_dir=data_dir, connect_llm=False)
+    except ImportError as e:
+        print(f"⚠️  Skipping vector index benchmark: {e}")
+        return {'vector_index_build_s': None, 'vector_query_p50_ms': None,
+                'details': {'skipped': str(e)}}
+
+    with quiet():
+        docs = list(itertools.islice(scaler.iter_training_documents(), documents))
+    start = time.perf_counter()
+    with quiet():
+        chunks = scaler.index_documents(docs)
+    build_s = time.perf_counter() - start
+
+    metrics = scaler.load_current_metrics() or {}
+    samples = []
+    for _ in range(queries):
+        start = time.perf_counter()
+        scaler.query_for_scaling_decision(metrics)
+        samples.append((time.perf_counter() - start) * 1000)
+
+    return {
+        'vector_index_build_s': build_s,
+        'vector_query_p50_ms': percentile(samples, 50),
+        'details': {'documents': len(docs), 'chunks': chunks, 'queries': queries},
+    }
+
+
+def bench_collection_cycle(work_dir, hours, geoip_db, repeat):
+    """One full fetch_metrics.py run (--full) per repeat, each into a fresh directory"""
+    fetch_metrics.download_geoip_database = lambda: Path(geoip_db) if geoip_db else None
+    runs = itertools.count()
+    output_dirs = []
+
+    def collect():
+        output_dir = work_dir / f'collection-{next(runs)}'
+        output_dirs.append(output_dir)
+        # Every cycle fetches its own Monitoring API token, as a fresh process would
+        fetch_metrics._monitoring_token = None
+        argv = sys.argv
+        sys.argv = ['fetch_metrics.py', '--output-dir', str(output_dir), '--hours', str(hours), '--full']
+        try:
+            with quiet():
+                fetch_metrics.main()
+        finally:
+            sys.argv = argv
+
+    _, seconds = best_of(repeat, collect)
+    return output_dirs[-1], {'collection_cycle_s': seconds}
+
+
+def bench_autoscaler_cycle(cold_autoscaler, repeat):
+    logging.disable(logging.INFO)
+    try:
+        decision, seconds = best_of(repeat, cold_autoscaler.run_autoscaler_cycle)
+    finally:
+        logging.disable(logging.NOTSET)
+    return {'autoscaler_cycle_s': seconds,
+            'details': {'should_scale': decision['should_scale'], 'reason': decision['reason']}}
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(args):
+    """Run every stage against a FakeCloud; returns the result document"""
+    results = {
+        'benchmark': 'pipeline',
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'git_commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {key: getattr(args, key) for key in
+                       ('hours', 'rpm', 'seed', 'repeat', 'decisions', 'vector_docs',
+                        'gcloud_latency_ms', 'geoip_db')},
+        'metrics': {},
+        'details': {},
+    }
+
+    def record(stage, values):
+        details = values.pop('details', None)
+        if details:
+            results['details'][stage] = details
+        results['metrics'].update(values)
+        for name, value in values.items():
+            unit = BENCHMARK_METRICS[name][0]
+            print(f"  - {name}: {'skipped' if value is None else f'{value:,.3f} {unit}'}")
+
+    print(f"🧪 Generating {args.hours}h of synthetic traffic at ~{args.rpm} requests/min (seed {args.seed})...")
+    lb_entries, events, monitoring, start, end = generate_traffic(args.hours, args.rpm, args.seed)
+    print(f"  {len(lb_entries):,} load balancer entries, {len(events)} cluster events")
+
+    cold_pools = {region: INITIAL_NODES[region] for region in INITIAL_NODES
+                  if region == SERVING_REGIONS['asia']}
+    cloud = FakeCloud(lb_entries + events, monitoring, cold_pools, args.gcloud_latency_ms)
+    cloud.start()
+    geoip_reader = fetch_metrics.open_geoip_reader(args.geoip_db) if args.geoip_db else SyntheticGeoIP()
+
+    with tempfile.TemporaryDirectory(prefix='benchmark-') as tmp:
+        work_dir = Path(tmp)
+        previous_url = fetch_metrics.MONITORING_API_URL
+        fetch_metrics.MONITORING_API_URL = cloud.install(work_dir / 'bin')
+        try:
+            print("\n📥 Log ingestion")
+            logs, values = bench_log_ingestion(start, end, args.repeat)
+            record('log_ingestion', values)
+
+            print("\n🌍 GeoIP resolution")
+            record('geoip', bench_geoip(logs, geoip_reader, args.repeat))
+
+            print("\n📈 Aggregation")
+            windows, values = bench_aggregation(logs, events, geoip_reader, args.repeat)
+            record('aggregation', values)
+
+            cold_autoscaler = import_cold_autoscaler(args.geoip_db)
+            print("\n⚖️  Scaling decision")
+            record('decision', bench_decision(windows, cold_autoscaler, args.decisions))
+
+            print("\n🔁 Collection cycle (fetch_metrics.py --full)")
+            data_dir, values = bench_collection_cycle(work_dir, args.hours, args.geoip_db, args.repeat)
+            record('collection_cycle', values)
+
+            print("\n🔁 Autoscaler cycle")
+            record('autoscaler_cycle', bench_autoscaler_cycle(cold_autoscaler, args.repeat))
+
+            print("\n🔍 Vector index")
+            record('vector_index', bench_vector_index(data_dir, args.vector_docs, args.vector_queries))
+        finally:
+            fetch_metrics.MONITORING_API_URL = previous_url
+            cloud.stop()
+            geoip_reader.close()
+
+    results['details']['gcloud_calls'] = dict(cloud.calls)
+    return results
+
+
+def compare_results(baseline, current, threshold=REGRESSION_THRESHOLD_PCT):
+    """Per-metric change between two result documents
+
+    A metric regresses when it got worse (by its direction in
+    BENCHMARK_METRICS) by more than threshold percent.
+    Returns a list of (name, baseline, current, change %, status).
+    """
+    rows = []
+    for name, (_, higher_is_better) in BENCHMARK_METRICS.items():
+        old = baseline.get('metrics', {}).get(name)
+        new = current.get('metrics', {}).get(name)
+        if old is None or new is None or old == 0:
+            rows.append((name, old, new, None, 'skipped'))
+            continue
+        change = (new - old) / old * 100
+        worse = -change if higher_is_better else change
+        if worse > threshold:
+            status = 'regression'
+        elif worse < -threshold:
+            status = 'improvement'
+        else:
+            status = 'ok'
+        rows.append((name, old, new, change, status))
+    return rows
+
+
+def print_comparison(rows, threshold):
+    icons = {'regression': '❌', 'improvement': '🚀', 'ok': '✅', 'skipped': '➖'}
+    print(f"\n📊 Comparison (regression threshold {threshold:.0f}%):")
+    for name, old, new, change, status in rows:
+        if change is None:
+            print(f"  {icons[status]} {name:30s} skipped")
+        else:
+            print(f"  {icons[status]} {name:30s} {old:14,.3f} → {new:14,.3f} ({change:+.1f}%)")
+    regressions = [row[0] for row in rows if row[4] == 'regression']
+    if regressions:
+        print(f"\n❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+    else:
+        print("\n✅ No regressions")
+    return regressions
+
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the autoscaling data pipeline end to end')
+    parser.add_argument('--hours', type=int, default=1,
+                        help='Hours of synthetic traffic to serve (default: 1)')
+    parser.add_argument('--rpm', type=int, default=2000,
+                        help='Average synthetic requests per minute')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Synthetic traffic seed')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Runs per stage; the fastest is reported')
+    parser.add_argument('--decisions', type=int, default=10000,
+                        help='should_scale_based_on_traffic calls to sample')
+    parser.add_argument('--vector-docs', type=int, default=2000,
+                        help='Collected documents to embed for the vector index stage')
+    parser.add_argument('--vector-queries', type=int, default=20,
+                        help='Similarity searches to sample')
+    parser.add_argument('--gcloud-latency-ms', type=int, default=0,
+                        help='Delay added to every fake gcloud / Monitoring API response')
+    parser.add_argument('--geoip-db', type=str, default=None,
+                        help='GeoLite2-City.mmdb to resolve countries with (default: synthetic reader)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Results file (default: benchmark_results/pipeline-<timestamp>.json)')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='Previous results file to compare this run against')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='Only compare two stored results files')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD_PCT,
+                        help='Percent a metric may worsen before it is flagged (default: 10)')
+    args = parser.parse_args()
+
+    if args.compare:
+        rows = compare_results(load_results(args.compare[0]), load_results(args.compare[1]), args.threshold)
+        return 1 if print_comparison(rows, args.threshold) else 0
+
+    results = run_benchmarks(args)
+
+    output = Path(args.output) if args.output else \
+        RESULTS_DIR / f"pipeline-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Saved results to {output}")
+
+    if args.baseline:
+        rows = compare_results(load_results(args.baseline), results, args.threshold)
+        return 1 if print_comparison(rows, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Columnar storage for collected logs and training features
+Date-partitioned, compressed Parquet datasets read back with column
+projection and predicate pushdown. Requires pyarrow (optional dependency).
+"""
+
+import os
+from datetime import datetime
+from pathlib import Path
+
+COLUMNAR_DIR = 'columnar'
+PARQUET_COMPRESSION = os.environ.get('PARQUET_COMPRESSION', 'zstd')
+
+# Table names under <data_dir>/columnar/
+LB_REQUESTS = 'lb_requests'
+TRAINING_FEATURES = 'training_features'
+MONITORING_SERIES = 'monitoring_series'
+
+# Flattened, typed load balancer request columns
+LB_REQUEST_COLUMNS = ['timestamp', 'insert_id', 'ip', 'country', 'region',
+                      'latency_ms', 'status', 'backend']
+
+
+def available():
+    """True when pyarrow is installed"""
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def lb_requests_schema():
+    import pyarrow as pa
+    return pa.schema([
+        ('timestamp', pa.timestamp('us', tz='UTC')),
+        ('insert_id', pa.string()),
+        ('ip', pa.string()),
+        ('country', pa.string()),
+        ('region', pa.string()),
+        ('latency_ms', pa.float64()),
+        ('status', pa.int32()),
+        ('backend', pa.string()),
+    ])
+
+
+def date_partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive')
+
+
+def table_path(data_dir, table_name):
+    return Path(data_dir) / COLUMNAR_DIR / table_name
+
+
+def table_exists(data_dir, table_name):
+    path = table_path(data_dir, table_name)
+    return path.is_dir() and any(path.glob('date=*/*.parquet'))
+
+
+def table_files(data_dir, table_name):
+    """Parquet files of a table, oldest partition first"""
+    return sorted(table_path(data_dir, table_name).glob('date=*/*.parquet'))
+
+
+def arrow_table(columns, schema=None):
+    """pyarrow.Table of a pandas DataFrame or a dict of equal-length lists (Tables pass through)
+
+    A dict's 'timestamp' column may hold datetimes or ISO strings.
+    """
+    import pyarrow as pa
+
+    if isinstance(columns, pa.Table):
+        return columns
+    if hasattr(columns, 'columns'):
+        return pa.Table.from_pandas(columns, schema=schema, preserve_index=False)
+    timestamps = [ts if isinstance(ts, datetime) else datetime.fromisoformat(str(ts).replace('Z', '+00:00'))
+                  for ts in columns['timestamp']]
+    columns = dict(columns, timestamp=timestamps)
+    return pa.table(columns, schema=schema) if schema is not None else pa.table(columns)
+
+
+def partition_dates(table):
+    """YYYY-MM-DD partition value of each row, from its 'timestamp' column"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    return pc.strftime(pc.cast(table['timestamp'], pa.timestamp('us')), format='%Y-%m-%d')
+
+
+def write_partitioned(data_dir, table_name, columns, run_id, schema=None):
+    """Append rows as date-partitioned Parquet files
+
+    columns is a pandas DataFrame or a dict of equal-length lists. Its
+    'timestamp' column (datetimes or ISO strings) decides the date=YYYY-MM-DD
+    partition. Each run writes its own part-<run_id>-N.parquet files, so repeated
+    runs append instead of overwriting. Returns the number of rows written.
+    """
+    import pyarrow.dataset as ds
+
+    table = arrow_table(columns, schema)
+    if table.num_rows == 0:
+        return 0
+
+    table = table.append_column('date', partition_dates(table))
+
+    ds.write_dataset(
+        table,
+        base_dir=str(table_path(data_dir, table_name)),
+        format='parquet',
+        partitioning=date_partitioning(),
+        basename_template=f"part-{run_id}-{{i}}.parquet",
+        existing_data_behavior='overwrite_or_ignore',
+        file_options=ds.ParquetFileFormat().make_write_options(compression=PARQUET_COMPRESSION)
+    )
+    return table.num_rows
+
+
+def upsert_partitioned(data_dir, table_name, columns, run_id, keys=('timestamp',), schema=None):
+    """Write rows like write_partitioned, replacing stored rows with the same keys
+
+    Only the key columns of the date partitions the new rows fall in are read;
+    a partition whose stored rows share a key with a new row is rewritten
+    without them as part-<run_id>-kept.parquet. A crash midway leaves duplicate rows, never
+    lost ones. Returns the number of rows written.
+    """
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    table = arrow_table(columns, schema)
+    if table.num_rows == 0:
+        return 0
+
+    new_keys = table.select(list(keys))
+    for date in sorted(set(partition_dates(table).to_pylist())):
+        partition_dir = table_path(data_dir, table_name) / f"date={date}"
+        files = sorted(partition_dir.glob('*.parquet'))
+        if not files:
+            continue
+        dataset = ds.dataset([str(path) for path in files], format='parquet')
+        if dataset.to_table(columns=list(keys)).join(new_keys, keys=list(keys), join_type='inner').num_rows == 0:
+            continue
+
+        stored = dataset.to_table()
+        kept = stored.join(new_keys, keys=list(keys), join_type='left anti')
+
+        kept_file = partition_dir / f"part-{run_id}-kept.parquet"
+        if kept.num_rows:
+            kept = kept.select(stored.column_names).sort_by([(key, 'ascending') for key in keys])
+            tmp_file = partition_dir / f"{kept_file.name}.tmp"
+            pq.write_table(kept, str(tmp_file), compression=PARQUET_COMPRESSION)
+            os.replace(tmp_file, kept_file)
+        for path in files:
+            if path != kept_file:
+                path.unlink()
+
+    return write_partitioned(data_dir, table_name, table, run_id)
+
+
+def time_filter(start=None, end=None):
+    """Predicate on the date partition (prunes whole directories) and on timestamp (row groups)"""
+    import pyarrow.dataset as ds
+
+    expression = None
+    if start is not None:
+        expression = (ds.field('date') >= start.strftime('%Y-%m-%d')) & (ds.field('timestamp') >= start)
+    if end is not None:
+        upper = (ds.field('date') <= end.strftime('%Y-%m-%d')) & (ds.field('timestamp') <= end)
+        expression = upper if expression is None else expression & upper
+    return expression
+
+
+def open_dataset(data_dir, table_name):
+    import pyarrow.dataset as ds
+    return ds.dataset(str(table_path(data_dir, table_name)), format='parquet',
+                      partitioning=date_partitioning())
+
+
+def read_table(data_dir, table_name, columns=None, start=None, end=None, filter=None):
+    """Read a table, loading only the requested columns, partitions and row groups
+
+    Returns a pyarrow.Table, or None when the table does not exist.
+    """
+    if not table_exists(data_dir, table_name):
+        return None
+
+    expression = time_filter(start, end)
+    if filter is not None:
+        expression = filter if expression is None else expression & filter
+
+    return open_dataset(data_dir, table_name).to_table(columns=columns, filter=expression)
+
+
+def iter_records(data_dir, table_name, columns=None, start=None, end=None, batch_size=1024):
+    """Stream rows of a table as dicts, one record batch at a time"""
+    if not table_exists(data_dir, table_name):
+        return
+
+    scanner = open_dataset(data_dir, table_name).scanner(
+        columns=columns, filter=time_filter(start, end), batch_size=batch_size)
+    for batch in scanner.to_batches():
+        yield from batch.to_pylist()
+
+
+def read_latest_row(data_dir, table_name, columns=None):
+    """Newest row of a table, scanning only its most recent date partition"""
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+
+    files = table_files(data_dir, table_name)
+    if not files:
+        return None
+
+    latest_date = files[-1].parent.name.split('=', 1)[1]
+    projection = None if columns is None else sorted(set(columns) | {'timestamp'})
+    table = open_dataset(data_dir, table_name).to_table(
+        columns=projection, filter=ds.field('date') == latest_date)
+    if table.num_rows == 0:
+        return None
+
+    # Of rows sharing the latest timestamp, take the last one read (the newest part file)
+    latest = table.filter(pc.equal(table['timestamp'], pc.max(table['timestamp'])))
+    row = latest.slice(latest.num_rows - 1, 1).to_pylist()[0]
+    return {name: row[name] for name in (columns or row)}
+
+
+def replay_traffic_data(data_dir, start=None, end=None):
+    """Replay stored requests in the cold autoscaler's traffic_data format
+
+    Returns {country: {'requests': n, 'region': region}}, ready for
+    cold_autoscaler.analyze_geographic_traffic(), aggregated from the projected
+    country/region columns only.
+    """
+    table = read_table(data_dir, LB_REQUESTS, columns=['country', 'region'], start=start, end=end)
+    if table is None or table.num_rows == 0:
+        return {}
+
+    counts = table.group_by(['country', 'region']).aggregate([([], 'count_all')])
+    traffic_data = {}
+    for row in counts.to_pylist():
+        if row['country'] == 'unknown':
+            continue
+        entry = traffic_data.setdefault(row['country'], {'requests': 0, 'region': row['region']})
+        entry['requests'] += row['count_all']
+    return traffic_data
+
+
+def main():
+    import argparse
+    import json
+    from datetime import timedelta, timezone
+
+    parser = argparse.ArgumentParser(description='Replay stored load balancer traffic for the cold autoscaler')
+    parser.add_argument('--data-dir', type=str, default='./ml_training_data',
+                        help='Directory written by fetch_metrics.py')
+    parser.add_argument('--hours', type=float, default=2,
+                        help='Replay window ending at --end (default: 2, as the cold autoscaler)')
+    parser.add_argument('--end', type=str, default=None,
+                        help='Window end as ISO timestamp (default: now)')
+    args = parser.parse_args()
+
+    if not available():
+        print("❌ pyarrow is required: pip install pyarrow")
+        return 1
+
+    end = datetime.fromisoformat(args.end) if args.end else datetime.now(timezone.utc)
+    if end.tzinfo is None:
+        end = end.replace(tzinfo=timezone.utc)
+    traffic_data = replay_traffic_data(args.data_dir, start=end - timedelta(hours=args.hours), end=end)
+    print(json.dumps(traffic_data, indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Fake gcloud for benchmarks and offline runs
+FakeCloud serves `gcloud logging read`, `gcloud container ...` and
+`gcloud auth print-access-token` from in-memory log entries over local HTTP,
+plus the Monitoring API timeSeries endpoint. Run as a script, this file is the
+gcloud executable: it forwards its arguments to FAKE_GCLOUD_URL.
+"""
+
+import bisect
+import json
+import os
+import re
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+FAKE_GCLOUD_URL_ENV = 'FAKE_GCLOUD_URL'
+FAKE_ACCESS_TOKEN = 'fake-access-token'
+
+RESOURCE_TYPE = re.compile(r'resource\.type="([^"]+)"')
+TIME_BOUND = re.compile(r'timestamp\s*(>=|<=|>|<)\s*"([^"]+)"')
+REASON_MATCH = re.compile(r'jsonPayload\.reason=~"([^"]+)"')
+METRIC_TYPE = re.compile(r'metric\.type="([^"]+)"')
+
+
+def flag_value(args, name, default=None):
+    """Value of --name=value or --name value in a gcloud argument list"""
+    for i, arg in enumerate(args):
+        if arg.startswith(f'{name}='):
+            return arg.split('=', 1)[1]
+        if arg == name and i + 1 < len(args):
+            return args[i + 1]
+    return default
+
+
+class FakeCloud:
+    """In-memory stand-in for the gcloud CLI and the Monitoring API
+
+    Log entries are bucketed by resource type and kept in timestamp order, so
+    each `logging read` is two bisects plus the JSON encoding of the result.
+    latency_ms delays every response to mimic API round trips.
+    """
+
+    def __init__(self, entries=(), monitoring=None, cold_pools=None, latency_ms=0):
+        from fetch_metrics import timestamp_sort_key
+
+        self.sort_key = timestamp_sort_key
+        self.latency_ms = latency_ms
+        self.monitoring = {}
+        for series_list in (monitoring or {}).values():
+            for series in series_list:
+                self.monitoring.setdefault(series['metric']['type'], []).append(series)
+        # Autoscaling max nodes per cluster region, as reported by `container clusters describe`
+        self.max_nodes = dict(cold_pools or {})
+        self.calls = Counter()
+        self.server = None
+        self._lock = threading.Lock()
+
+        by_type = {}
+        for entry in entries:
+            by_type.setdefault(entry.get('resource', {}).get('type'), []).append(entry)
+        self.entries = {}
+        self.keys = {}
+        for resource_type, typed in by_type.items():
+            typed.sort(key=lambda entry: self.sort_key(entry.get('timestamp')))
+            self.entries[resource_type] = typed
+            self.keys[resource_type] = [self.sort_key(entry.get('timestamp')) for entry in typed]
+
+    # gcloud commands
+
+    def run(self, args):
+        """Handle one gcloud invocation, returning (exit code, output)"""
+        command = ' '.join(args[:3] if args[:1] == ['container'] else args[:2])
+        with self._lock:
+            self.calls[command] += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+
+        if args[:2] == ['logging', 'read']:
+            return 0, json.dumps(self.logging_read(args[2], args[3:]))
+        if args[:2] == ['auth', 'print-access-token']:
+            return 0, FAKE_ACCESS_TOKEN + '\n'
+        if args[:3] == ['container', 'clusters', 'describe']:
+            return self.describe_cluster(args)
+        if args[:3] == ['container', 'node-pools', 'update']:
+            return self.update_node_pool(args)
+        if args[:3] == ['container', 'clusters', 'resize']:
+            return 0, ''
+        return 1, f"ERROR: (gcloud) fake gcloud does not implement: {' '.join(args[:3])}\n"
+
+    def logging_read(self, query, flags):
+        """Entries matching a logging filter's resource type, time bounds and reason regex"""
+        resource_type = RESOURCE_TYPE.search(query)
+        if not resource_type or 'protoPayload.' in query:
+            # Synthetic traffic has no audit log entries
+            return []
+        keys = self.keys.get(resource_type.group(1), [])
+        entries = self.entries.get(resource_type.group(1), [])
+
+        low, high = 0, len(keys)
+        for operator, value in TIME_BOUND.findall(query):
+            bound = self.sort_key(value)
+            if operator == '>=':
+                low = max(low, bisect.bisect_left(keys, bound))
+            elif operator == '>':
+                low = max(low, bisect.bisect_right(keys, bound))
+            elif operator == '<':
+                high = min(high, bisect.bisect_left(keys, bound))
+            else:
+                high = min(high, bisect.bisect_right(keys, bound))
+        selected = entries[low:high]
+
+        reason = REASON_MATCH.search(query)
+        if reason:
+            pattern = re.compile(reason.group(1))
+            selected = [entry for entry in selected
+                        if pattern.match(entry.get('jsonPayload', {}).get('reason', ''))]
+
+        limit = int(flag_value(flags, '--limit', 0) or 0)
+        if flag_value(flags, '--order', 'desc') == 'asc':
+            return selected[:limit] if limit else selected
+        selected = selected[::-1]
+        return selected[:limit] if limit else selected
+
+    def describe_cluster(self, args):
+        region = flag_value(args, '--region')
+        if region not in self.max_nodes:
+            return 1, f"ERROR: (gcloud.container.clusters.describe) cluster {args[3]} not found\n"
+        max_nodes = self.max_nodes[region]
+        return 0, json.dumps({
+            'name': args[3],
+            'status': 'RUNNING',
+            'nodePools': [{'name': f'{region}-cold-pool', 'autoscaling': {
+                'enabled': True, 'minNodeCount': 0, 'maxNodeCount': max_nodes,
+                'totalMinNodeCount': 0, 'totalMaxNodeCount': max_nodes,
+            }}],
+        })
+
+    def update_node_pool(self, args):
+        region = flag_value(args, '--region')
+        max_nodes = flag_value(args, '--total-max-nodes', flag_value(args, '--max-nodes'))
+        if region not in self.max_nodes or max_nodes is None:
+            return 1, "ERROR: (gcloud.container.node-pools.update) invalid arguments\n"
+        with self._lock:
+            self.max_nodes[region] = int(max_nodes)
+        return 0, ''
+
+    # Monitoring API
+
+    def time_series(self, params):
+        """timeSeries.list: series of the filtered metric with points inside the interval"""
+        metric_type = METRIC_TYPE.search(params.get('filter', ''))
+        start = self.sort_key(params.get('interval.startTime'))
+        end = self.sort_key(params.get('interval.endTime'))
+        series_list = []
+        for series in self.monitoring.get(metric_type.group(1) if metric_type else None, []):
+            points = [point for point in series['points']
+                      if start <= self.sort_key(point['interval']['endTime']) <= end]
+            if points:
+                series_list.append(dict(series, points=points))
+        return {'timeSeries': series_list}
+
+    # HTTP server
+
+    def start(self):
+        """Serve on an ephemeral localhost port; returns the base URL"""
+        cloud = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                args = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                code, output = cloud.run(args)
+                self.reply(200 if code == 0 else 400, output.encode('utf-8'))
+
+            def do_GET(self):
+                url = urllib.parse.urlsplit(self.path)
+                if not url.path.endswith('/timeSeries'):
+                    self.reply(404, b'{}')
+                    return
+                with cloud._lock:
+                    cloud.calls['monitoring timeSeries.list'] += 1
+                params = dict(urllib.parse.parse_qsl(url.query))
+                self.reply(200, json.dumps(cloud.time_series(params)).encode('utf-8'))
+
+            def reply(self, status, body):
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.url
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def install(self, bin_dir):
+        """Put a `gcloud` executable forwarding to this server on PATH for this process and its children
+
+        Returns the Monitoring API base URL to point fetch_metrics.MONITORING_API_URL at.
+        """
+        bin_dir = Path(bin_dir)
+        bin_dir.mkdir(parents=True, exist_ok=True)
+        shim = bin_dir / 'gcloud'
+        shim.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{Path(__file__).resolve()}" "$@"\n')
+        shim.chmod(0o755)
+        os.environ['PATH'] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+        os.environ[FAKE_GCLOUD_URL_ENV] = self.url
+        return f"{self.url}/v3"
+
+
+def main():
+    """gcloud entry point: forward argv to the FakeCloud server and relay its output"""
+    url = os.environ.get(FAKE_GCLOUD_URL_ENV)
+    if not url:
+        sys.stderr.write(f"ERROR: (gcloud) {FAKE_GCLOUD_URL_ENV} is not set\n")
+        return 2
+
+    request = urllib.request.Request(f"{url}/gcloud", data=json.dumps(sys.argv[1:]).encode('utf-8'),
+                                     headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request) as response:
+            sys.stdout.buffer.write(response.read())
+        return 0
+    except urllib.error.HTTPError as e:
+        sys.stderr.buffer.write(e.read())
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Time-series feature builder for predictive scaling training data
+Turns flattened load balancer requests (see fetch_metrics.flatten_lb_logs) and
+cluster events into one feature row per interval using vectorized pandas groupbys
+"""
+
+import os
+
+from monitoring_series import MONITORING_FEATURE_COLUMNS
+
+# Width of each feature window (pandas offset alias) and how many windows rolling features span
+FEATURE_INTERVAL = os.environ.get('FEATURE_INTERVAL', '5min')
+ROLLING_WINDOWS = int(os.environ.get('FEATURE_ROLLING_WINDOWS', '6'))
+
+FEATURE_REGIONS = ['asia', 'europe', 'americas']
+LATENCY_QUANTILES = {'latency_p50_ms': 0.5, 'latency_p95_ms': 0.95, 'latency_p99_ms': 0.99}
+
+# Features shifted by one window and rolling aggregates over ROLLING_WINDOWS windows
+LAG_FEATURES = ['total_requests', 'asia_requests', 'asia_percentage', 'latency_p95_ms']
+ROLLING_FEATURES = {
+    'total_requests_rolling_mean': ('total_requests', 'mean'),
+    'asia_requests_rolling_mean': ('asia_requests', 'mean'),
+    'asia_percentage_rolling_mean': ('asia_percentage', 'mean'),
+    'latency_p95_rolling_max': ('latency_p95_ms', 'max'),
+    'error_rate_rolling_mean': ('error_rate_percentage', 'mean'),
+}
+
+
+def requests_frame(requests):
+    """DataFrame of flattened requests (dict of columns) with a UTC timestamp column"""
+    import pandas as pd
+
+    frame = pd.DataFrame(requests)
+    if frame.empty:
+        return frame
+    frame['timestamp'] = pd.to_datetime(frame['timestamp'], utc=True)
+    frame['latency_ms'] = pd.to_numeric(frame['latency_ms'], errors='coerce').fillna(0)
+    frame['status'] = pd.to_numeric(frame['status'], errors='coerce')
+    return frame
+
+
+def event_counts(events, interval):
+    """Number of events per window, indexed by window start"""
+    import pandas as pd
+
+    timestamps = pd.to_datetime([event['timestamp'] for event in events if event.get('timestamp')],
+                                utc=True, format='ISO8601')
+    if len(timestamps) == 0:
+        return pd.Series(dtype='int64')
+    return pd.Series(1, index=timestamps.floor(interval)).groupby(level=0).sum()
+
+
+def window_index(frame, event_series, interval):
+    """Every window from the first to the last observation, so idle windows become rows too"""
+    import pandas as pd
+
+    bounds = []
+    if not frame.empty:
+        bounds += [frame['timestamp'].min(), frame['timestamp'].max()]
+    for series in event_series:
+        if not series.empty:
+            bounds += [series.index.min(), series.index.max()]
+    if not bounds:
+        return None
+    return pd.date_range(min(bounds).floor(interval), max(bounds).floor(interval),
+                         freq=interval, name='timestamp')
+
+
+def build_feature_windows(requests, scaling_events=(), pressure_events=(),
+                          interval=FEATURE_INTERVAL, monitoring_features=None):
+    """Build one feature row per interval
+
+    Each row has per-region request counts and percentages, latency quantiles,
+    error rates, scaling/pressure event counts and lagged/rolling features.
+    monitoring_features (monitoring_series.monitoring_window_features) is
+    joined on the window start; windows without a monitored backend latency
+    fall back to the window's mean request latency.
+
+    Returns a DataFrame with a 'timestamp' (window start, UTC) column, sorted by time.
+    """
+    import numpy as np
+    import pandas as pd
+
+    frame = requests_frame(requests)
+    scaling = event_counts(scaling_events, interval)
+    pressure = event_counts(pressure_events, interval)
+    monitoring_windows = [] if monitoring_features is None else [monitoring_features]
+    index = window_index(frame, [scaling, pressure] + monitoring_windows, interval)
+    if index is None:
+        return pd.DataFrame(columns=['timestamp'])
+
+    features = pd.DataFrame(index=index)
+    if frame.empty:
+        frame = pd.DataFrame({
+            'timestamp': pd.Series(dtype='datetime64[ns, UTC]'), 'country': pd.Series(dtype='object'),
+            'region': pd.Series(dtype='object'), 'latency_ms': pd.Series(dtype='float64'),
+            'status': pd.Series(dtype='float64')
+        })
+    window = frame['timestamp'].dt.floor(interval).rename('timestamp')
+
+    # Request volume by region
+    total = frame.groupby(window).size().reindex(index, fill_value=0)
+    features['total_requests'] = total
+    region_counts = pd.crosstab(window, frame['region']).reindex(index=index, columns=FEATURE_REGIONS,
+                                                                 fill_value=0)
+    safe_total = total.replace(0, np.nan)
+    for region in FEATURE_REGIONS:
+        features[f'{region}_requests'] = region_counts[region]
+        features[f'{region}_percentage'] = (region_counts[region] / safe_total * 100).fillna(0)
+    features['unknown_region_requests'] = (frame['country'] == 'unknown').groupby(window).sum() \
+        .reindex(index, fill_value=0)
+
+    # Geographic diversity and the dominant country per window
+    features['unique_countries'] = frame.groupby(window)['country'].nunique().reindex(index, fill_value=0)
+    country_counts = frame.groupby([window, frame['country']]).size()
+    if country_counts.empty:
+        features['top_country'] = 'unknown'
+        features['top_country_requests'] = 0
+    else:
+        top = country_counts.groupby(level=0).idxmax()
+        features['top_country'] = pd.Series([key[1] for key in top], index=top.index) \
+            .reindex(index).fillna('unknown')
+        features['top_country_requests'] = country_counts.groupby(level=0).max().reindex(index, fill_value=0)
+
+    # Latency distribution of requests that report one
+    timed = frame['latency_ms'] > 0
+    latency = frame.loc[timed, 'latency_ms'].groupby(window[timed])
+    features['avg_latency_ms'] = latency.mean().reindex(index).fillna(0)
+    if timed.any():
+        quantiles = latency.quantile(list(LATENCY_QUANTILES.values())).unstack()
+    else:
+        quantiles = pd.DataFrame(columns=list(LATENCY_QUANTILES.values()))
+    for name, q in LATENCY_QUANTILES.items():
+        features[name] = quantiles[q].reindex(index).fillna(0) if q in quantiles else 0.0
+
+    # Monitoring columns are always present so appended Parquet parts share one schema
+    if monitoring_features is None:
+        monitoring_features = pd.DataFrame()
+    monitored = monitoring_features.reindex(index=index, columns=MONITORING_FEATURE_COLUMNS)
+    features['avg_backend_latency_ms'] = monitored['avg_backend_latency_ms'].fillna(features['avg_latency_ms'])
+    for name in MONITORING_FEATURE_COLUMNS[1:]:
+        features[name] = monitored[name].astype('float64').fillna(0)
+
+    # Error rates over requests with a status code
+    status = frame['status']
+    with_status = status.notna().groupby(window).sum().reindex(index, fill_value=0).replace(0, np.nan)
+    features['error_rate_percentage'] = ((status >= 500).groupby(window).sum().reindex(index, fill_value=0)
+                                         / with_status * 100).fillna(0)
+    features['client_error_rate_percentage'] = (((status >= 400) & (status < 500)).groupby(window).sum()
+                                                .reindex(index, fill_value=0) / with_status * 100).fillna(0)
+
+    # Cluster events
+    features['scaling_events_count'] = scaling.reindex(index, fill_value=0).astype('int64')
+    features['pressure_events_count'] = pressure.reindex(index, fill_value=0).astype('int64')
+
+    # Lagged and rolling features (the first windows use what history they have)
+    for name in LAG_FEATURES:
+        features[f'{name}_lag1'] = features[name].shift(1).fillna(0)
+    for name, (source, how) in ROLLING_FEATURES.items():
+        features[name] = getattr(features[source].rolling(ROLLING_WINDOWS, min_periods=1), how)()
+    previous = features['total_requests'].shift(1).replace(0, np.nan)
+    features['total_requests_change_pct'] = ((features['total_requests'] - previous) / previous * 100).fillna(0)
+
+    return features.reset_index()
+
+
+def summarize_countries(requests):
+    """Request counts and mean latency (of requests reporting one) per country"""
+    frame = requests_frame(requests)
+    if frame.empty:
+        return {}, {}
+
+    counts = frame['country'].value_counts()
+    timed = frame[frame['latency_ms'] > 0]
+    latencies = timed.groupby('country')['latency_ms'].mean()
+    return ({country: int(count) for country, count in counts.items()},
+            {country: float(value) for country, value in latencies.items()})
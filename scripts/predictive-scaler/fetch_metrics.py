@@ -12,25 +12,25 @@ import argparse
 from datetime import datetime, timedelta, timezone
 import csv
 import gzip
+import hashlib
 import shutil
 from pathlib import Path
+import urllib.error
+import urllib.parse
 import urllib.request
 import tarfile
 import socket
 import struct
 import sys
-import geoip2.database
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-import sys
-import subprocess
-
-# Try to import geoip2, install if not available
-try:
-    import geoip2.database
-except ImportError:
-    print("Installing geoip2 library...")
-    subprocess.check_call([sys.executable, "-m", "pip", "install", "geoip2"])
-    import geoip2.database
+import columnar_store
+import feature_builder
+import monitoring_series
+from feature_builder import FEATURE_INTERVAL, ROLLING_WINDOWS
 
 # Configuration
 PROJECT_ID = os.environ.get('PROJECT_ID', 'uporto-cd')
@@ -39,6 +39,67 @@ OUTPUT_DIR = Path('ml_training_data')
 GEOIP_DIR = Path('geoip_data')
 GEOIP_DB_URL = 'https://github.com/P3TERX/GeoLite.mmdb/raw/download/GeoLite2-City.mmdb'
 
+# Concurrent collection: each fetch is an idle-waiting gcloud subprocess.
+# FETCH_WORKERS bounds how many gcloud processes run at once across all queries and slices.
+FETCH_WORKERS = int(os.environ.get('FETCH_WORKERS', '6'))
+GCLOUD_TIMEOUT_SECONDS = int(os.environ.get('GCLOUD_TIMEOUT_SECONDS', '300'))
+GCLOUD_MAX_RETRIES = int(os.environ.get('GCLOUD_MAX_RETRIES', '3'))
+GCLOUD_BACKOFF_SECONDS = 2
+# stderr markers of failures a retry cannot fix (bad filter or flags, missing permissions)
+GCLOUD_PERMANENT_ERRORS = ('INVALID_ARGUMENT', 'PERMISSION_DENIED', 'UNAUTHENTICATED', 'NOT_FOUND',
+                           'unrecognized arguments', 'Invalid value', 'does not have permission')
+
+# Time-sliced pagination: gcloud logging read caps each call at --limit entries,
+# so windows are split into slices and any slice that hits the limit is subdivided
+LOG_PAGE_LIMIT = 1000
+LB_PAGE_LIMIT = 5000
+INITIAL_SLICE_HOURS = 6
+SLICE_SPLIT_FACTOR = 4
+MIN_SLICE_SECONDS = 60
+
+# Incremental collection: per-query high-water marks and date-partitioned NDJSON output
+CHECKPOINT_FILE = 'collection_checkpoints.json'
+# Checkpoint entry recording where the last run's feature windows end
+FEATURES_CHECKPOINT = 'training_features'
+PARTITION_FORMAT = 'date={date}'
+
+# Monitoring metrics are read from the Monitoring API with server-side alignment:
+# per-series aligner over MONITORING_ALIGNMENT_SECONDS, then a cross-series reducer per region.
+# Distributions are summed (ALIGN_DELTA + REDUCE_SUM) so quantiles come from merged buckets.
+MONITORING_API_URL = os.environ.get('MONITORING_API_URL', 'https://monitoring.googleapis.com/v3')
+MONITORING_ALIGNMENT_SECONDS = int(os.environ.get('MONITORING_ALIGNMENT_SECONDS', '60'))
+MONITORING_QUERIES = {
+    'cpu_utilization': {
+        'metric_type': 'compute.googleapis.com/instance/cpu/utilization',
+        'aligner': 'ALIGN_MEAN',
+        'reducer': 'REDUCE_MEAN',
+        'group_by': ['resource.label.zone'],
+    },
+    'backend_latencies': {
+        'metric_type': 'loadbalancing.googleapis.com/https/backend_latencies',
+        'aligner': 'ALIGN_DELTA',
+        'reducer': 'REDUCE_SUM',
+        'group_by': ['resource.label.backend_scope'],
+    },
+}
+
+_gcloud_slots = threading.BoundedSemaphore(FETCH_WORKERS)
+_stats_lock = threading.Lock()
+_token_lock = threading.Lock()
+_monitoring_token = None
+
+def set_gcloud_concurrency(workers):
+    """Set the maximum number of concurrent gcloud processes"""
+    global _gcloud_slots
+    _gcloud_slots = threading.BoundedSemaphore(max(1, workers))
+
+def add_stat(stats, key, amount):
+    """Thread-safe counter update on a shared per-query stats dict"""
+    if stats is None:
+        return
+    with _stats_lock:
+        stats[key] = stats.get(key, 0) + amount
+
 # Log queries for different components
 LOG_QUERIES = {
     'gke_cluster_autoscaling': '''
@@ -103,6 +164,18 @@ def download_geoip_database():
 
     return db_path
 
+def open_geoip_reader(db_path):
+    """Open a GeoIP reader, importing (and if needed installing) geoip2 on first use"""
+    # Try to import geoip2, install if not available
+    try:
+        import geoip2.database
+    except ImportError:
+        print("Installing geoip2 library...")
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "geoip2"])
+        import geoip2.database
+
+    return geoip2.database.Reader(str(db_path))
+
 def get_country_from_ip(ip_address, geoip_reader):
     """Get country from IP address using GeoIP database"""
     try:
@@ -134,194 +207,564 @@ def get_country_from_ip(ip_address, geoip_reader):
 
     return 'unknown'
 
-def run_gcloud_command(cmd):
-    """Execute gcloud command and return output"""
-    try:
-        result = subprocess.run(cmd, shell=True, capture_output=True, text=True, check=True)
-        return result.stdout
-    except subprocess.CalledProcessError as e:
-        print(f"Error executing command: {e}")
-        print(f"stderr: {e.stderr}")
+def is_retryable_gcloud_error(error):
+    """False for a gcloud failure that would fail the same way again (usage, filter or permission errors)"""
+    if error.returncode == 2:
+        # argparse usage error
+        return False
+    stderr = error.stderr or ''
+    return not any(marker in stderr for marker in GCLOUD_PERMANENT_ERRORS)
+
+def run_gcloud_command(cmd, stats=None, timeout=None, retries=None):
+    """Execute gcloud command and return output
+
+    cmd is an argument list (no shell). Timeouts and transient failures are
+    retried with exponential backoff; rejected requests are not. When a stats
+    dict is given, attempts and bytes received are accumulated into it.
+    """
+    timeout = timeout or GCLOUD_TIMEOUT_SECONDS
+    retries = GCLOUD_MAX_RETRIES if retries is None else retries
+
+    for attempt in range(1, retries + 2):
+        add_stat(stats, 'attempts', 1)
+        try:
+            with _gcloud_slots:
+                result = subprocess.run(cmd, capture_output=True, text=True, check=True, timeout=timeout)
+            add_stat(stats, 'bytes', len(result.stdout.encode('utf-8')))
+            return result.stdout
+        except subprocess.CalledProcessError as e:
+            print(f"Error executing command: {e}")
+            print(f"stderr: {e.stderr}")
+            if not is_retryable_gcloud_error(e):
+                break
+        except subprocess.TimeoutExpired:
+            print(f"⏱️  gcloud timed out after {timeout}s: {' '.join(cmd[:3])}")
+
+        if attempt <= retries:
+            # Exponential backoff with jitter so parallel retries do not stampede the API
+            delay = GCLOUD_BACKOFF_SECONDS * (2 ** (attempt - 1)) * (1 + random.random())
+            print(f"  🔁 Retrying in {delay:.1f}s (attempt {attempt + 1}/{retries + 1})")
+            time.sleep(delay)
+
+    if stats is not None:
+        stats['status'] = 'failed'
+    return None
+
+def monitoring_access_token(stats=None):
+    """OAuth token for the Monitoring API, fetched once per run from gcloud"""
+    global _monitoring_token
+    with _token_lock:
+        if _monitoring_token is None:
+            output = run_gcloud_command(['gcloud', 'auth', 'print-access-token'], stats)
+            _monitoring_token = output.strip() if output else None
+        return _monitoring_token
+
+def monitoring_api_get(path, params, token, stats=None):
+    """GET a Monitoring API resource, retrying throttling and server errors with backoff"""
+    url = f"{MONITORING_API_URL}/{path}?{urllib.parse.urlencode(params)}"
+    request = urllib.request.Request(url, headers={'Authorization': f'Bearer {token}'})
+
+    for attempt in range(1, GCLOUD_MAX_RETRIES + 2):
+        add_stat(stats, 'attempts', 1)
+        try:
+            with urllib.request.urlopen(request, timeout=GCLOUD_TIMEOUT_SECONDS) as response:
+                body = response.read()
+            add_stat(stats, 'bytes', len(body))
+            return json.loads(body)
+        except urllib.error.HTTPError as e:
+            print(f"Error querying monitoring API: HTTP {e.code} {e.reason}")
+            if e.code != 429 and e.code < 500:
+                break
+        except (urllib.error.URLError, socket.timeout, json.JSONDecodeError) as e:
+            print(f"Error querying monitoring API: {e}")
+
+        if attempt <= GCLOUD_MAX_RETRIES:
+            delay = GCLOUD_BACKOFF_SECONDS * (2 ** (attempt - 1)) * (1 + random.random())
+            print(f"  🔁 Retrying in {delay:.1f}s (attempt {attempt + 1}/{GCLOUD_MAX_RETRIES + 1})")
+            time.sleep(delay)
+
+    if stats is not None:
+        stats['status'] = 'failed'
+    return None
+
+def fetch_monitoring_metrics(metric_name, start_time, end_time, stats=None):
+    """Fetch one metric as aligned, per-region series (see MONITORING_QUERIES)
+
+    Alignment and cross-series reduction happen server side, so the payload
+    is one point per region and alignment period instead of every raw point.
+    """
+    query = MONITORING_QUERIES[metric_name]
+    print(f"\n📊 Fetching monitoring metrics: {query['metric_type']}")
+
+    token = monitoring_access_token(stats)
+    if not token:
+        if stats is not None:
+            stats['status'] = 'failed'
+        return []
+
+    params = [
+        ('filter', f'metric.type="{query["metric_type"]}"'),
+        ('interval.startTime', start_time.strftime('%Y-%m-%dT%H:%M:%SZ')),
+        ('interval.endTime', end_time.strftime('%Y-%m-%dT%H:%M:%SZ')),
+        ('aggregation.alignmentPeriod', f'{MONITORING_ALIGNMENT_SECONDS}s'),
+        ('aggregation.perSeriesAligner', query['aligner']),
+        ('aggregation.crossSeriesReducer', query['reducer']),
+    ] + [('aggregation.groupByFields', field) for field in query['group_by']]
+
+    series = []
+    page_token = None
+    while True:
+        page = monitoring_api_get(f'projects/{PROJECT_ID}/timeSeries',
+                                  params + ([('pageToken', page_token)] if page_token else []),
+                                  token, stats)
+        if page is None:
+            break
+        series.extend(page.get('timeSeries', []))
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            break
+
+    print(f"✅ Fetched {len(series)} aligned time series for {metric_name}")
+    return series
+
+def timestamp_sort_key(timestamp):
+    """Chronological sort key for RFC3339 timestamps with variable fractional digits"""
+    timestamp = (timestamp or '').rstrip('Z').split('+')[0]
+    seconds, _, fraction = timestamp.partition('.')
+    return seconds, fraction.ljust(9, '0')
+
+def entry_id(log):
+    """insertId of a log entry, or a hash of its content for entries without one"""
+    insert_id = log.get('insertId')
+    if insert_id:
+        return insert_id
+    return 'sha1:' + hashlib.sha1(json.dumps(log, sort_keys=True).encode('utf-8')).hexdigest()
+
+def merge_log_slices(slices):
+    """Merge per-slice results in timestamp order, dropping duplicates by entry_id"""
+    merged = {}
+    for logs in slices:
+        for log in logs:
+            merged.setdefault(entry_id(log), log)
+    return sorted(merged.values(), key=lambda log: timestamp_sort_key(log.get('timestamp')))
+
+def split_window(start_time, end_time, parts):
+    """Split [start_time, end_time) into equal slices aligned to whole seconds"""
+    total_seconds = (end_time - start_time).total_seconds()
+    step = max(1, int(total_seconds // parts))
+    # Windows shorter than `parts` seconds yield fewer slices, none past end_time
+    bounds = [min(start_time + timedelta(seconds=step * i), end_time) for i in range(parts)] + [end_time]
+    return [(bounds[i], bounds[i + 1]) for i in range(parts) if bounds[i] < bounds[i + 1]]
+
+def fetch_log_slice(query, slice_start, slice_end, limit, stats=None, inclusive_end=False):
+    """Fetch one time slice with a single gcloud logging read call
+
+    Returns the parsed entries, or None if the call or parsing failed.
+    """
+    start_str = slice_start.strftime('%Y-%m-%dT%H:%M:%SZ')
+    end_str = slice_end.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    # Slices are half-open so neighbours do not overlap; the last one keeps the window end
+    end_operator = '<=' if inclusive_end else '<'
+    time_filter = f'timestamp>="{start_str}" AND timestamp{end_operator}"{end_str}"'
+    full_query = f'{query} AND {time_filter}'
+
+    # Build gcloud command
+    cmd = [
+        'gcloud', 'logging', 'read', full_query,
+        f'--project={PROJECT_ID}',
+        '--format=json',
+        '--order=asc',
+        f'--limit={limit}'
+    ]
+
+    output = run_gcloud_command(cmd, stats)
+    if output is None:
         return None
 
-def fetch_monitoring_metrics(metric_type, start_time, end_time):
-    """Fetch monitoring metrics using gcloud"""
-    print(f"\n📊 Fetching monitoring metrics: {metric_type}")
-
-    # Format timestamps for monitoring API
-    start_str = start_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-    end_str = end_time.strftime('%Y-%m-%dT%H:%M:%S.%fZ')
-
-    cmd = f'''
-        gcloud monitoring time-series list \
-            --project={PROJECT_ID} \
-            --filter='metric.type="{metric_type}"' \
-            --interval-start-time="{start_str}" \
-            --interval-end-time="{end_str}" \
-            --format=json
-    '''
+    try:
+        return json.loads(output) if output.strip() else []
+    except json.JSONDecodeError:
+        print(f"⚠️  Could not parse JSON output")
+        return None
 
-    output = run_gcloud_command(cmd)
-    if output:
-        try:
-            metrics = json.loads(output) if output.strip() else []
-            print(f"✅ Fetched {len(metrics)} metric time series")
-            return metrics
-        except json.JSONDecodeError:
-            print(f"⚠️  Could not parse metrics JSON")
-            return []
-    return []
-
-def fetch_load_balancer_logs(start_time, end_time):
+def fetch_sliced_logs(query, start_time, end_time, limit, stats=None):
+    """Fetch a whole window in parallel time slices, subdividing slices that hit the limit
+
+    Completeness no longer depends on volume: a slice returning `limit` entries
+    may be truncated, so it is split SLICE_SPLIT_FACTOR ways and refetched until
+    slices fit or reach MIN_SLICE_SECONDS.
+    """
+    initial_parts = max(1, int((end_time - start_time).total_seconds() // (INITIAL_SLICE_HOURS * 3600)))
+    pending = split_window(start_time, end_time, initial_parts)
+    results = []
+    failed_slices = 0
+    truncated_slices = 0
+
+    # Slices only wait on gcloud; concurrency is bounded globally by _gcloud_slots
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+        while pending:
+            add_stat(stats, 'slices', len(pending))
+            futures = {
+                executor.submit(fetch_log_slice, query, slice_start, slice_end, limit,
+                                stats, slice_end == end_time): (slice_start, slice_end)
+                for slice_start, slice_end in pending
+            }
+            pending = []
+
+            for future in as_completed(futures):
+                slice_start, slice_end = futures[future]
+                logs = future.result()
+                if logs is None:
+                    failed_slices += 1
+                    continue
+
+                results.append(logs)
+                if len(logs) < limit:
+                    continue
+
+                if (slice_end - slice_start).total_seconds() >= 2 * MIN_SLICE_SECONDS:
+                    pending.extend(split_window(slice_start, slice_end, SLICE_SPLIT_FACTOR))
+                else:
+                    truncated_slices += 1
+
+    if truncated_slices:
+        print(f"⚠️  {truncated_slices} slice(s) still hit --limit={limit} at {MIN_SLICE_SECONDS}s granularity")
+    if failed_slices and stats is not None:
+        stats['status'] = f'partial ({failed_slices} slice(s) failed)'
+        if not results:
+            stats['status'] = 'failed'
+
+    return merge_log_slices(results)
+
+def fetch_load_balancer_logs(start_time, end_time, stats=None):
     """Fetch load balancer access logs specifically"""
     print(f"\n📊 Fetching load balancer access logs...")
 
-    # Format timestamps
-    start_str = start_time.strftime('%Y-%m-%dT%H:%M:%SZ')
-    end_str = end_time.strftime('%Y-%m-%dT%H:%M:%SZ')
-
     # More specific query for HTTP load balancer logs
     query = f'''
         resource.type="http_load_balancer"
         resource.labels.project_id="{PROJECT_ID}"
         httpRequest.requestMethod!=""
-        timestamp>="{start_str}"
-        timestamp<="{end_str}"
     '''
 
-    cmd = f'''
-        gcloud logging read '{query}' \
-            --project={PROJECT_ID} \
-            --format=json \
-            --limit=5000
-    '''
+    logs = fetch_sliced_logs(query, start_time, end_time, LB_PAGE_LIMIT, stats)
+    print(f"✅ Fetched {len(logs)} load balancer logs")
+    return logs
 
-    output = run_gcloud_command(cmd)
-    if output:
-        try:
-            logs = json.loads(output) if output.strip() else []
-            print(f"✅ Fetched {len(logs)} load balancer logs")
-            return logs
-        except json.JSONDecodeError:
-            print(f"⚠️  Could not parse JSON output")
-            return []
-    return []
-
-def fetch_logs(query_name, query, start_time, end_time, output_file):
+def fetch_logs(query_name, query, start_time, end_time, stats=None):
     """Fetch logs using gcloud logging read"""
     print(f"\n📊 Fetching {query_name} logs...")
 
-    # Format timestamps
-    start_str = start_time.strftime('%Y-%m-%dT%H:%M:%SZ')
-    end_str = end_time.strftime('%Y-%m-%dT%H:%M:%SZ')
+    logs = fetch_sliced_logs(query, start_time, end_time, LOG_PAGE_LIMIT, stats)
 
-    # Build query with timestamp
-    time_filter = f'timestamp>="{start_str}" AND timestamp<="{end_str}"'
-    full_query = f'{query} AND {time_filter}'
+    print(f"✅ Fetched {len(logs)} log entries")
+    return logs
 
-    # Build gcloud command
-    cmd = f'''
-        gcloud logging read '{full_query}' \
-            --project={PROJECT_ID} \
-            --format=json \
-            --order=asc \
-            --limit=1000
-    '''
+def load_checkpoints(output_dir):
+    """Load per-query high-water marks from a previous run"""
+    checkpoint_file = output_dir / CHECKPOINT_FILE
+    if not checkpoint_file.exists():
+        return {}
+    try:
+        with open(checkpoint_file, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"⚠️  Ignoring unreadable checkpoint file: {e}")
+        return {}
+
+def save_checkpoints(output_dir, checkpoints):
+    """Atomically persist high-water marks so a crash never leaves a half-written file"""
+    checkpoint_file = output_dir / CHECKPOINT_FILE
+    tmp_file = checkpoint_file.with_suffix('.tmp')
+    with open(tmp_file, 'w') as f:
+        json.dump(checkpoints, f, indent=2)
+    os.replace(tmp_file, checkpoint_file)
+
+def parse_log_timestamp(timestamp):
+    """Parse an RFC3339 log timestamp, truncated to whole seconds, as UTC"""
+    seconds = timestamp_sort_key(timestamp)[0]
+    return datetime.strptime(seconds, '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc)
+
+def checkpoint_start_time(checkpoint, default_start):
+    """Resume from the high-water mark's second (inclusive), or the default window start"""
+    if not checkpoint or not checkpoint.get('timestamp'):
+        return default_start
+    return parse_log_timestamp(checkpoint['timestamp'])
+
+def feature_window_start(checkpoint, interval):
+    """Start of the window the previous run ended in (it was partial, so it is rebuilt), or None"""
+    import pandas as pd
+
+    if not checkpoint or not checkpoint.get('timestamp'):
+        return None
+    return pd.Timestamp(parse_log_timestamp(checkpoint['timestamp'])).floor(interval).to_pydatetime()
 
-    output = run_gcloud_command(cmd)
-    if output:
-        with open(output_file, 'w') as f:
-            f.write(output)
+def feature_history_start(window_start, interval):
+    """How far back to fetch so the rebuilt windows' lag and rolling features see full history"""
+    import pandas as pd
 
-        # Parse and count entries
-        try:
-            logs = json.loads(output) if output.strip() else []
-            print(f"✅ Fetched {len(logs)} log entries")
-            return logs
-        except json.JSONDecodeError:
-            print(f"⚠️  Could not parse JSON output")
-            return []
-    return []
+    return window_start - ROLLING_WINDOWS * pd.Timedelta(interval).to_pytimedelta()
+
+def filter_new_entries(logs, checkpoint):
+    """Drop entries at or before the high-water mark
+
+    Fetches resume at the high-water second, so entries in that second are
+    matched against the insertIds recorded with the checkpoint.
+    """
+    if not checkpoint or not checkpoint.get('timestamp'):
+        return logs
+
+    hwm_key = timestamp_sort_key(checkpoint['timestamp'])
+    seen_ids = set(checkpoint.get('insert_ids', []))
+    new_logs = []
+    for log in logs:
+        key = timestamp_sort_key(log.get('timestamp'))
+        if key < hwm_key or (key[0] == hwm_key[0] and entry_id(log) in seen_ids):
+            continue
+        new_logs.append(log)
+    return new_logs
+
+def advance_checkpoint(checkpoint, logs):
+    """High-water mark after appending logs (sorted by timestamp)"""
+    if not logs:
+        return checkpoint
+
+    last_timestamp = logs[-1].get('timestamp')
+    last_second = timestamp_sort_key(last_timestamp)[0]
+    # Keep every insertId in the last second - the next run refetches from that second
+    boundary_ids = [entry_id(log) for log in logs
+                    if timestamp_sort_key(log.get('timestamp'))[0] == last_second]
+    if checkpoint and timestamp_sort_key(checkpoint.get('timestamp'))[0] == last_second:
+        boundary_ids = sorted(set(boundary_ids) | set(checkpoint.get('insert_ids', [])))
+
+    return {
+        'timestamp': last_timestamp,
+        'insert_ids': boundary_ids,
+        'updated_at': datetime.now(timezone.utc).isoformat()
+    }
+
+def append_partitioned(output_dir, query_name, logs, run_id):
+    """Append entries to <query_name>/date=YYYY-MM-DD/part-<run_id>.ndjson files"""
+    by_date = {}
+    for log in logs:
+        date = (log.get('timestamp') or 'unknown')[:10]
+        by_date.setdefault(date, []).append(log)
+
+    written = []
+    for date, entries in sorted(by_date.items()):
+        partition_dir = output_dir / query_name / PARTITION_FORMAT.format(date=date)
+        partition_dir.mkdir(parents=True, exist_ok=True)
+        part_file = partition_dir / f"part-{run_id}.ndjson"
+        with open(part_file, 'a') as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        written.append(part_file)
+    return written
+
+def timed_fetch(name, fetch_func, *args):
+    """Run one fetch, returning (name, result, stats) with duration, bytes and attempts"""
+    stats = {'attempts': 0, 'bytes': 0, 'slices': 0}
+    start = time.perf_counter()
+    try:
+        result = fetch_func(*args, stats=stats)
+        stats.setdefault('status', 'ok')
+    except Exception as e:
+        print(f"❌ {name} failed: {e}")
+        result = []
+        stats['status'] = 'failed'
+    stats['duration_s'] = time.perf_counter() - start
+    stats['entries'] = len(result) if result else 0
+    return name, result or [], stats
+
+def print_fetch_summary(fetch_stats, wall_time):
+    """Print per-query duration and payload size"""
+    print(f"\n⏱️  Collection summary ({wall_time:.1f}s wall time, "
+          f"{sum(s['duration_s'] for s in fetch_stats.values()):.1f}s of fetch time):")
+    for name, stats in sorted(fetch_stats.items(), key=lambda item: item[1]['duration_s'], reverse=True):
+        print(f"  - {name:<28} {stats['duration_s']:6.1f}s {stats['bytes'] / 1024:9.1f} KiB "
+              f"{stats['entries']:6d} entries  {stats['slices'] or 1} slice(s)  "
+              f"{stats['attempts']} attempt(s)  {stats['status']}")
+
+# Country name fragments per serving region (matched as substrings of lower-case names)
+ASIA_COUNTRIES = ['singapore', 'thailand', 'japan', 'china', 'india', 'australia', 'indonesia', 'malaysia', 'philippines', 'vietnam', 'korea']
+EUROPE_COUNTRIES = ['germany', 'france', 'uk', 'united kingdom', 'spain', 'italy', 'netherlands', 'belgium', 'poland', 'sweden', 'portugal']
+AMERICAS_COUNTRIES = ['united states', 'us', 'canada', 'brazil', 'mexico', 'argentina', 'chile', 'colombia']
+
+def classify_region(country):
+    """Map a country name to asia/europe/americas/unknown (same order as the cold autoscaler)"""
+    country = (country or '').lower()
+    if any(ac in country for ac in ASIA_COUNTRIES):
+        return 'asia'
+    if any(ec in country for ec in EUROPE_COUNTRIES):
+        return 'europe'
+    if any(ac in country for ac in AMERICAS_COUNTRIES):
+        return 'americas'
+    return 'unknown'
+
+def extract_client_ip(log):
+    """Client IP address of a load balancer log entry, or None"""
+    ip_address = None
+
+    # Extract IP address from various fields
+    if 'httpRequest' in log:
+        request = log['httpRequest']
+
+        # Try to get IP address
+        ip_address = request.get('remoteIp') or request.get('userIp')
+
+        # Sometimes IP is in headers
+        if not ip_address and 'requestHeaders' in request:
+            headers = request['requestHeaders']
+            ip_address = headers.get('X-Forwarded-For') or headers.get('X-Real-IP')
+            # X-Forwarded-For might have multiple IPs, take the first
+            if ip_address and ',' in ip_address:
+                ip_address = ip_address.split(',')[0].strip()
+
+    # Try jsonPayload for IP
+    if not ip_address and 'jsonPayload' in log:
+        payload = log['jsonPayload']
+        if isinstance(payload, dict):
+            ip_address = payload.get('remoteIp') or payload.get('clientIp') or payload.get('sourceIp')
+
+    return ip_address or None
+
+def extract_lb_fields(logs, full=True):
+    """Walk the nested log entries once, collecting raw load balancer fields as columns
+
+    With full=False only the fields geographic metrics need (ip, remote_country,
+    latency) are collected.
+    """
+    names = ['ip', 'remote_country', 'latency']
+    if full:
+        names += ['timestamp', 'insert_id', 'status', 'backend']
+    fields = {name: [] for name in names}
+    ip_column, country_column, latency_column = fields['ip'], fields['remote_country'], fields['latency']
+
+    for log in logs:
+        request = log.get('httpRequest') or {}
+        ip_column.append(extract_client_ip(log))
+        country_column.append((request.get('remoteLocation') or {}).get('country'))
+        latency_column.append(request.get('latency'))
+        if not full:
+            continue
+
+        payload = log.get('jsonPayload')
+        if not isinstance(payload, dict):
+            payload = {}
+        fields['timestamp'].append(log.get('timestamp'))
+        fields['insert_id'].append(entry_id(log))
+        fields['status'].append(request.get('status'))
+        fields['backend'].append(log.get('resource', {}).get('labels', {}).get('backend_service_name')
+                                 or payload.get('backendTargetName'))
+
+    return fields
+
+def parse_latency_column(latencies):
+    """Parse log latencies ('0.123s', '45ms' or numbers) to milliseconds, 0 if unparseable
+
+    Vectorized over the whole column with Arrow string kernels when pyarrow is
+    installed and every value is a string, otherwise with pandas .str methods.
+    Returns a float ndarray.
+    """
+    import numpy as np
+
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        text = pa.array(latencies, type=pa.string())
+        valid = pc.match_substring_regex(text, r'^[-+0-9.eE]+m?s$')
+        value = pc.cast(pc.if_else(valid, pc.utf8_rtrim(text, characters='ms'), None), pa.float64())
+        latency_ms = pc.multiply(value, pc.if_else(pc.ends_with(text, 'ms'), 1.0, 1000.0))
+        return np.nan_to_num(latency_ms.to_numpy(zero_copy_only=False), nan=0.0)
+    except (ImportError, TypeError, ValueError):
+        pass
+
+    import pandas as pd
+
+    values = pd.Series(latencies, dtype=object)
+    text = values.str
+    # Non-strings become NaN under .str, so numbers are handled separately below
+    has_unit = text.endswith('s').fillna(False).astype(bool).to_numpy()
+    is_ms = text.endswith('ms').fillna(False).astype(bool).to_numpy()
+
+    parsed = pd.to_numeric(text.rstrip('ms'), errors='coerce').to_numpy(dtype='float64')
+    latency_ms = np.where(has_unit, np.where(is_ms, parsed, parsed * 1000), np.nan)
+
+    is_text = text.len().notna().to_numpy()
+    numeric = pd.to_numeric(values.where(~is_text), errors='coerce').to_numpy(dtype='float64')
+    latency_ms = np.where(is_text, latency_ms, numeric)
+    return np.nan_to_num(latency_ms, nan=0.0)
+
+def resolve_countries(ips, remote_countries, geoip_reader=None):
+    """Resolve a country per row, looking up each distinct IP address once
+
+    Rows without an IP (None or '') fall back to the log's remoteLocation
+    country, else 'unknown'. Returns an object ndarray aligned with ips.
+    """
+    import numpy as np
+    import pandas as pd
+
+    ips = pd.Series(ips, dtype=object)
+    codes, unique_ips = pd.factorize(ips.where(ips != '', None))
+    # Rows without an IP have code -1 and pick up the trailing None
+    ip_countries = np.array([get_country_from_ip(ip, geoip_reader) for ip in unique_ips] + [None], dtype=object)
+    countries = ip_countries[codes]
+
+    missing = codes == -1
+    if missing.any():
+        fallback = pd.Series(remote_countries, dtype=object)[missing].str.lower()
+        countries[missing] = fallback.where(fallback.notna() & (fallback != ''), 'unknown').to_numpy()
+    return countries
+
+def lb_requests_frame(logs, geoip_reader=None):
+    """Flatten load balancer entries into a typed DataFrame with vectorized parsing
+
+    Returns one row per entry; entries without a parseable timestamp keep NaT.
+    """
+    import pandas as pd
+
+    fields = extract_lb_fields(logs)
+    countries = pd.Series(resolve_countries(fields['ip'], fields['remote_country'], geoip_reader), dtype=object)
+    regions = countries.map({country: classify_region(country) for country in countries.unique()})
+    timestamps = pd.to_datetime(pd.Series(fields['timestamp'], dtype=object), utc=True,
+                                format='ISO8601', errors='coerce')
+
+    return pd.DataFrame({
+        'timestamp': timestamps.dt.floor('us'),
+        'insert_id': pd.Series(fields['insert_id'], dtype=object),
+        'ip': pd.Series(fields['ip'], dtype=object),
+        'country': countries,
+        'region': regions.astype(object),
+        'latency_ms': parse_latency_column(fields['latency']),
+        'status': pd.to_numeric(pd.Series(fields['status'], dtype=object), errors='coerce').astype('Int32'),
+        'backend': pd.Series(fields['backend'], dtype=object),
+    })
 
 def extract_geographic_metrics(logs, geoip_reader=None):
-    """Extract geographic distribution metrics from load balancer logs using GeoIP"""
-    geographic_data = {}
-    latency_by_country = {}
-    ip_addresses_found = 0
+    """Extract geographic distribution metrics from load balancer logs using GeoIP
+
+    Records are flattened once into columns, countries are resolved once per
+    distinct IP and counts/latencies are aggregated with bincount.
+    """
+    import numpy as np
+    import pandas as pd
 
     print(f"  Processing {len(logs)} logs for geographic data...")
 
-    for log in logs:
-        country = None
-        ip_address = None
-
-        # Extract IP address from various fields
-        if 'httpRequest' in log:
-            request = log['httpRequest']
-
-            # Try to get IP address
-            ip_address = request.get('remoteIp') or request.get('userIp')
-
-            # Sometimes IP is in headers
-            if not ip_address and 'requestHeaders' in request:
-                headers = request['requestHeaders']
-                ip_address = headers.get('X-Forwarded-For') or headers.get('X-Real-IP')
-                # X-Forwarded-For might have multiple IPs, take the first
-                if ip_address and ',' in ip_address:
-                    ip_address = ip_address.split(',')[0].strip()
-
-        # Try jsonPayload for IP
-        if not ip_address and 'jsonPayload' in log:
-            payload = log['jsonPayload']
-            if isinstance(payload, dict):
-                ip_address = payload.get('remoteIp') or payload.get('clientIp') or payload.get('sourceIp')
-
-        # Get country from IP
-        if ip_address:
-            ip_addresses_found += 1
-            country = get_country_from_ip(ip_address, geoip_reader)
-
-        # If still no country, check if it's already in the log
-        if not country and 'httpRequest' in log:
-            request = log['httpRequest']
-            if 'remoteLocation' in request:
-                country = request['remoteLocation'].get('country', None)
-                if country:
-                    country = country.lower()
-
-        # Default to unknown
-        if not country:
-            country = 'unknown'
-
-        # Count the request
-        geographic_data[country] = geographic_data.get(country, 0) + 1
-
-        # Extract latency if available
-        if 'httpRequest' in log:
-            request = log['httpRequest']
-            latency = request.get('latency', '0s')
-
-            # Parse latency to milliseconds
-            latency_ms = 0
-            if isinstance(latency, str):
-                if latency.endswith('s'):
-                    try:
-                        latency_ms = float(latency[:-1]) * 1000
-                    except ValueError:
-                        latency_ms = 0
-                elif latency.endswith('ms'):
-                    try:
-                        latency_ms = float(latency[:-2])
-                    except ValueError:
-                        latency_ms = 0
-            elif isinstance(latency, (int, float)):
-                latency_ms = float(latency)
-
-            # Track latency by country
-            if country not in latency_by_country:
-                latency_by_country[country] = []
-            if latency_ms > 0:
-                latency_by_country[country].append(latency_ms)
+    fields = extract_lb_fields(logs, full=False)
+    ip_addresses_found = sum(1 for ip in fields['ip'] if ip)
+    countries = resolve_countries(fields['ip'], fields['remote_country'], geoip_reader)
+    latency_ms = parse_latency_column(fields['latency'])
+
+    codes, names = pd.factorize(countries)
+    counts = np.bincount(codes, minlength=len(names))
+    timed = latency_ms > 0
+    timed_counts = np.bincount(codes[timed], minlength=len(names))
+    latency_sums = np.bincount(codes[timed], weights=latency_ms[timed], minlength=len(names))
+
+    geographic_data = {name: int(count) for name, count in zip(names, counts)}
 
     # Print what we found
     print(f"  Found {ip_addresses_found} IP addresses in logs")
@@ -334,13 +777,28 @@ def extract_geographic_metrics(logs, geoip_reader=None):
         print("  No geographic data found in logs")
 
     # Calculate average latencies
-    avg_latencies = {}
-    for country, latencies in latency_by_country.items():
-        if latencies:
-            avg_latencies[country] = sum(latencies) / len(latencies)
+    avg_latencies = {name: float(total / count)
+                     for name, total, count in zip(names, latency_sums, timed_counts) if count}
 
     return geographic_data, avg_latencies
 
+def flatten_lb_logs(logs, geoip_reader=None):
+    """Flatten load balancer entries into the columnar lb_requests table layout (a DataFrame)"""
+    frame = lb_requests_frame(logs, geoip_reader)
+    return frame.loc[frame['timestamp'].notna(), columnar_store.LB_REQUEST_COLUMNS].reset_index(drop=True)
+
+def write_lb_requests(output_dir, lb_requests, run_id):
+    """Write flattened load balancer requests to the date-partitioned Parquet table
+
+    Rows are upserted on insert_id: the two load balancer queries overlap and
+    keep separate high-water marks, so a request can be new to both in
+    different runs.
+    """
+    rows = columnar_store.upsert_partitioned(output_dir, columnar_store.LB_REQUESTS, lb_requests, run_id,
+                                             keys=('insert_id',), schema=columnar_store.lb_requests_schema())
+    print(f"🗃️  Wrote {rows} flattened requests to {columnar_store.table_path(output_dir, columnar_store.LB_REQUESTS)}")
+    return rows
+
 def extract_scaling_events(logs):
     """Extract cluster scaling events"""
     scaling_events = []
@@ -380,13 +838,21 @@ def extract_resource_pressure(logs):
 
     return pressure_events
 
-def create_training_dataset(all_logs, monitoring_metrics, output_dir, geoip_reader=None):
-    """Create structured training dataset from logs and metrics"""
-    dataset = []
+def create_training_dataset(all_logs, monitoring_metrics, output_dir, geoip_reader=None,
+                            lb_requests=None, interval=FEATURE_INTERVAL, window_start=None):
+    """Create a time-series training dataset with one feature row per interval
 
+    lb_requests are the flattened load balancer requests (flatten_lb_logs); they
+    are built from all_logs when not given. With window_start, only windows from
+    there on are kept (earlier data is lag/rolling history) and they replace
+    stored windows with the same timestamp. Returns the summary of the whole run.
+    """
     # Extract metrics from different log types
-    lb_logs = all_logs.get('load_balancer_access', []) + all_logs.get('load_balancer_metrics', [])
-    geographic_data, latency_by_country = extract_geographic_metrics(lb_logs, geoip_reader)
+    if lb_requests is None:
+        lb_logs = merge_log_slices([all_logs.get('load_balancer_access', []),
+                                    all_logs.get('load_balancer_metrics', [])])
+        lb_requests = flatten_lb_logs(lb_logs, geoip_reader)
+    geographic_data, latency_by_country = feature_builder.summarize_countries(lb_requests)
 
     scaling_events = extract_scaling_events(all_logs.get('gke_cluster_autoscaling', []))
     pressure_events = extract_resource_pressure(all_logs.get('gke_node_pressure', []))
@@ -397,29 +863,20 @@ def create_training_dataset(all_logs, monitoring_metrics, output_dir, geoip_read
     # Geographic distribution features
     total_requests = sum(geographic_data.values()) if geographic_data else 0
 
-    # Regional distribution (with more countries)
-    asia_countries = ['singapore', 'thailand', 'japan', 'china', 'india', 'australia', 'indonesia', 'malaysia', 'philippines', 'vietnam', 'korea']
-    europe_countries = ['germany', 'france', 'uk', 'united kingdom', 'spain', 'italy', 'netherlands', 'belgium', 'poland', 'sweden', 'portugal']
-    americas_countries = ['united states', 'us', 'canada', 'brazil', 'mexico', 'argentina', 'chile', 'colombia']
-
+    # Regional distribution
     asia_requests = sum(count for country, count in geographic_data.items()
-                        if any(ac in country.lower() for ac in asia_countries))
+                        if any(ac in country.lower() for ac in ASIA_COUNTRIES))
     europe_requests = sum(count for country, count in geographic_data.items()
-                          if any(ec in country.lower() for ec in europe_countries))
+                          if any(ec in country.lower() for ec in EUROPE_COUNTRIES))
     americas_requests = sum(count for country, count in geographic_data.items()
-                            if any(ac in country.lower() for ac in americas_countries))
-
-    # Extract average latencies from monitoring metrics
-    avg_backend_latency = 0
-    if monitoring_metrics.get('backend_latencies'):
-        latency_values = []
-        for series in monitoring_metrics['backend_latencies']:
-            for point in series.get('points', []):
-                value = point.get('value', {}).get('doubleValue', 0)
-                if value > 0:
-                    latency_values.append(value)
-        if latency_values:
-            avg_backend_latency = sum(latency_values) / len(latency_values)
+                            if any(ac in country.lower() for ac in AMERICAS_COUNTRIES))
+
+    # Aligned per-minute monitoring rows; backend latencies are distributions in ms
+    monitoring_rows = []
+    for metric_name, series_list in monitoring_metrics.items():
+        monitoring_rows.extend(monitoring_series.parse_time_series(metric_name, series_list))
+    latency_rows = [row for row in monitoring_rows if row['metric'] == 'backend_latencies']
+    avg_backend_latency_ms = monitoring_series.weighted_mean(latency_rows)
 
     # Create feature vector
     features = {
@@ -431,7 +888,7 @@ def create_training_dataset(all_logs, monitoring_metrics, output_dir, geoip_read
         'asia_percentage': (asia_requests / total_requests * 100) if total_requests > 0 else 0,
         'europe_percentage': (europe_requests / total_requests * 100) if total_requests > 0 else 0,
         'americas_percentage': (americas_requests / total_requests * 100) if total_requests > 0 else 0,
-        'avg_backend_latency_ms': avg_backend_latency * 1000,  # Convert to ms
+        'avg_backend_latency_ms': avg_backend_latency_ms,
         'scaling_events_count': len(scaling_events),
         'pressure_events_count': len(pressure_events),
         'unique_countries': len(geographic_data),
@@ -440,14 +897,29 @@ def create_training_dataset(all_logs, monitoring_metrics, output_dir, geoip_read
         'unknown_region_requests': geographic_data.get('unknown', 0)
     }
 
-    # Save as CSV for training
+    # One row per interval - the run-wide vector above only feeds the summary and prompt
+    windows = feature_builder.build_feature_windows(
+        lb_requests, scaling_events, pressure_events, interval,
+        monitoring_features=monitoring_series.monitoring_window_features(monitoring_rows, interval))
+    if window_start is not None:
+        windows = windows[windows['timestamp'] >= window_start].reset_index(drop=True)
+
+    # Save as CSV for training (this run's windows)
     csv_file = output_dir / 'training_features.csv'
-    with open(csv_file, 'w', newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=features.keys())
-        writer.writeheader()
-        writer.writerow(features)
+    windows.to_csv(csv_file, index=False)
 
-    print(f"✅ Created training dataset: {csv_file}")
+    print(f"✅ Created training dataset: {csv_file} ({len(windows)} windows of {interval})")
+
+    # Keep the feature history in the columnar store as well (the CSV only holds the latest run).
+    # Rebuilt windows and refetched monitoring points replace the stored ones.
+    if columnar_store.available() and not windows.empty:
+        run_id = datetime.fromisoformat(features['timestamp']).strftime('%Y%m%dT%H%M%SZ')
+        columnar_store.upsert_partitioned(output_dir, columnar_store.TRAINING_FEATURES, windows, run_id)
+        print(f"✅ Upserted features into {columnar_store.table_path(output_dir, columnar_store.TRAINING_FEATURES)}")
+        if monitoring_rows:
+            columnar_store.upsert_partitioned(output_dir, columnar_store.MONITORING_SERIES,
+                                              monitoring_series.monitoring_table_columns(monitoring_rows), run_id,
+                                              keys=('timestamp', 'metric', 'region'))
 
     # Save detailed logs for analysis
     detailed_file = output_dir / 'detailed_analysis.json'
@@ -457,6 +929,8 @@ def create_training_dataset(all_logs, monitoring_metrics, output_dir, geoip_read
             'latency_by_country': latency_by_country,
             'scaling_events': scaling_events,
             'pressure_events': pressure_events,
+            'feature_interval': interval,
+            'feature_windows': len(windows),
             'summary': features
         }, f, indent=2)
 
@@ -467,9 +941,15 @@ def create_training_dataset(all_logs, monitoring_metrics, output_dir, geoip_read
 def main():
     parser = argparse.ArgumentParser(description='Collect GCP logs for ML training')
     parser.add_argument('--hours', type=int, default=24,
-                        help='Number of hours of logs to collect')
+                        help='Number of hours of logs to collect (first run or --full)')
     parser.add_argument('--output-dir', type=str, default='./ml_training_data',
                         help='Output directory for logs')
+    parser.add_argument('--full', action='store_true',
+                        help='Ignore high-water marks and re-collect the whole --hours window')
+    parser.add_argument('--workers', type=int, default=FETCH_WORKERS,
+                        help='Maximum number of gcloud calls to run concurrently')
+    parser.add_argument('--interval', type=str, default=FEATURE_INTERVAL,
+                        help='Training feature window, as a pandas offset alias (default: 5min)')
 
     args = parser.parse_args()
 
@@ -482,7 +962,7 @@ def main():
     db_path = download_geoip_database()
     if db_path and db_path.exists():
         try:
-            geoip_reader = geoip2.database.Reader(str(db_path))
+            geoip_reader = open_geoip_reader(db_path)
             print("✅ Loaded GeoIP database")
         except Exception as e:
             print(f"⚠️  Failed to load GeoIP database: {e}")
@@ -496,33 +976,92 @@ def main():
     print(f"Time range: {start_time} to {end_time}")
     print(f"Output directory: {output_dir}")
 
-    # Collect all logs
+    # Resume each query from its high-water mark unless a full re-collection is requested
+    checkpoints = {} if args.full else load_checkpoints(output_dir)
+    query_starts = {
+        name: checkpoint_start_time(checkpoints.get(name), start_time)
+        for name in list(LOG_QUERIES) + ['load_balancer_access']
+    }
+    resumed = sum(1 for name in query_starts if name in checkpoints)
+    if resumed:
+        print(f"♻️  Resuming {resumed} queries from their high-water marks")
+
+    # Feature windows are rebuilt from the one the previous run ended in. Every query (and
+    # monitoring) is fetched from ROLLING_WINDOWS before it, so those windows' lag and
+    # rolling features are complete; entries before the high-water marks are not re-appended.
+    window_start = feature_window_start(checkpoints.get(FEATURES_CHECKPOINT), args.interval)
+    history_start = start_time if window_start is None else feature_history_start(window_start, args.interval)
+    fetch_starts = {name: min(query_start, history_start) for name, query_start in query_starts.items()}
+    if window_start is not None:
+        print(f"♻️  Rebuilding feature windows from {window_start}")
+
+    # Collect all logs concurrently - total wall time approaches the slowest query
     all_logs = {}
-
-    for query_name, query in LOG_QUERIES.items():
-        output_file = output_dir / f"{query_name}.json"
-        logs = fetch_logs(query_name, query, start_time, end_time, output_file)
-        all_logs[query_name] = logs
-
-    # Fetch load balancer logs separately for better geographic data
-    lb_logs = fetch_load_balancer_logs(start_time, end_time)
-    if lb_logs:
-        all_logs['load_balancer_access'] = lb_logs
-        lb_file = output_dir / "load_balancer_access.json"
-        with open(lb_file, 'w') as f:
-            json.dump(lb_logs, f, indent=2)
-
-    # Fetch monitoring metrics
-    monitoring_metrics = {
-        'cpu_utilization': fetch_monitoring_metrics(
-            "compute.googleapis.com/instance/cpu/utilization",
-            start_time, end_time
-        ),
-        'backend_latencies': fetch_monitoring_metrics(
-            "loadbalancing.googleapis.com/https/backend_latencies",
-            start_time, end_time
+    monitoring_metrics = {}
+    fetch_stats = {}
+
+    set_gcloud_concurrency(args.workers)
+    collection_start = time.perf_counter()
+    # One orchestrating thread per query; gcloud processes are bounded by --workers
+    with ThreadPoolExecutor(max_workers=len(LOG_QUERIES) + 1 + len(MONITORING_QUERIES)) as executor:
+        futures = [
+            executor.submit(timed_fetch, query_name, fetch_logs, query_name, query,
+                            fetch_starts[query_name], end_time)
+            for query_name, query in LOG_QUERIES.items()
+        ]
+        # Fetch load balancer logs separately for better geographic data
+        futures.append(executor.submit(timed_fetch, 'load_balancer_access',
+                                       fetch_load_balancer_logs,
+                                       fetch_starts['load_balancer_access'], end_time))
+        futures.extend(
+            executor.submit(timed_fetch, f"monitoring:{metric_name}",
+                            fetch_monitoring_metrics, metric_name, history_start, end_time)
+            for metric_name in MONITORING_QUERIES
         )
-    }
+
+        for future in as_completed(futures):
+            name, result, stats = future.result()
+            fetch_stats[name] = stats
+            if name.startswith('monitoring:'):
+                monitoring_metrics[name.split(':', 1)[1]] = result
+            else:
+                all_logs[name] = result
+
+    print_fetch_summary(fetch_stats, time.perf_counter() - collection_start)
+
+    # Append only entries beyond each high-water mark, then advance it
+    run_id = end_time.strftime('%Y%m%dT%H%M%SZ')
+    fetched_logs = dict(all_logs)
+    for name in list(all_logs):
+        if fetch_stats[name]['status'] != 'ok':
+            # Never advance past a gap - the next run retries the same window and stores it then
+            print(f"⚠️  {name}: incomplete fetch, checkpoint not advanced")
+            all_logs[name] = []
+            continue
+
+        new_logs = filter_new_entries(all_logs[name], checkpoints.get(name))
+        all_logs[name] = new_logs
+        if new_logs:
+            append_partitioned(output_dir, name, new_logs, run_id)
+            checkpoints[name] = advance_checkpoint(checkpoints.get(name), new_logs)
+
+    save_checkpoints(output_dir, checkpoints)
+    print(f"💾 Appended {sum(len(logs) for logs in all_logs.values())} new entries "
+          f"to partitioned NDJSON files in {output_dir}")
+
+    lb_logs = all_logs.get('load_balancer_access', [])
+    # Flatten both load balancer queries once; they overlap, so merge by insertId first
+    lb_requests = flatten_lb_logs(merge_log_slices([fetched_logs.get('load_balancer_access', []),
+                                                    fetched_logs.get('load_balancer_metrics', [])]),
+                                  geoip_reader)
+    if columnar_store.available():
+        # Requests at or before the high-water marks were stored by an earlier run
+        new_ids = {entry_id(log) for log in lb_logs + all_logs.get('load_balancer_metrics', [])}
+        write_lb_requests(output_dir, lb_requests[lb_requests['insert_id'].isin(new_ids)], run_id)
+    else:
+        print("⚠️  pyarrow not installed, skipping columnar Parquet output")
+    if not lb_logs:
+        all_logs.pop('load_balancer_access', None)
 
     # Save a sample of logs to understand structure
     if lb_logs:
@@ -534,7 +1073,17 @@ def main():
         print("  Review this file to understand log structure")
 
     # Create training dataset
-    features = create_training_dataset(all_logs, monitoring_metrics, output_dir, geoip_reader)
+    features = create_training_dataset(fetched_logs, monitoring_metrics, output_dir, geoip_reader,
+                                       lb_requests=lb_requests, interval=args.interval,
+                                       window_start=window_start)
+
+    # After a gap the next run rebuilds the same windows once the data is there
+    if all(stats['status'] == 'ok' for stats in fetch_stats.values()):
+        checkpoints[FEATURES_CHECKPOINT] = {
+            'timestamp': end_time.isoformat(),
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        }
+        save_checkpoints(output_dir, checkpoints)
 
     # Close GeoIP reader
     if geoip_reader:
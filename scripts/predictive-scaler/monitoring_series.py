@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Aligned Cloud Monitoring time series for predictive scaling
+Parses the per-region, per-minute series fetch_metrics.py requests, turns
+distribution values into latency quantiles and rolls them up into feature windows
+"""
+
+import math
+
+MONITORING_PERCENTILES = {'p50': 0.5, 'p95': 0.95, 'p99': 0.99}
+
+# Columns of the stored monitoring_series table (one row per metric, region and minute)
+MONITORING_COLUMNS = ['timestamp', 'metric', 'region', 'geo_region', 'value', 'count', 'p50', 'p95', 'p99']
+
+# Window features rolled up from the aligned series (avg_backend_latency_ms first)
+MONITORING_FEATURE_COLUMNS = [
+    'avg_backend_latency_ms', 'backend_requests',
+    'backend_latency_p50_ms', 'backend_latency_p95_ms', 'backend_latency_p99_ms',
+    'asia_backend_latency_p95_ms', 'europe_backend_latency_p95_ms', 'americas_backend_latency_p95_ms',
+    'cpu_utilization_percentage', 'asia_cpu_utilization_percentage',
+    'europe_cpu_utilization_percentage', 'americas_cpu_utilization_percentage',
+]
+
+# GCP location prefixes per serving region used by the feature builder
+GEO_REGION_PREFIXES = {
+    'asia': ('asia-', 'australia-'),
+    'europe': ('europe-',),
+    'americas': ('us-', 'northamerica-', 'southamerica-'),
+}
+
+
+def series_region(series):
+    """GCP region of a grouped series (zones such as europe-west2-a roll up to europe-west2)"""
+    labels = series.get('resource', {}).get('labels', {})
+    location = (labels.get('backend_scope') or labels.get('region') or labels.get('zone')
+                or labels.get('location') or 'global')
+    parts = location.split('-')
+    if len(parts) == 3 and len(parts[2]) == 1:
+        return '-'.join(parts[:2])
+    return location
+
+
+def geo_region(location):
+    """Map a GCP location to asia/europe/americas/unknown"""
+    for region, prefixes in GEO_REGION_PREFIXES.items():
+        if location.startswith(prefixes):
+            return region
+    return 'unknown'
+
+
+def bucket_bounds(bucket_options, count):
+    """(lower, upper) bounds of the first `count` buckets of a distribution
+
+    Bucket 0 is the underflow bucket and the last defined bucket the overflow
+    bucket, as in the Monitoring API's Distribution.BucketOptions.
+    """
+    if 'exponentialBuckets' in bucket_options:
+        options = bucket_options['exponentialBuckets']
+        finite = int(options.get('numFiniteBuckets', 0))
+        scale, growth = float(options.get('scale', 1)), float(options.get('growthFactor', 2))
+        edges = [scale * growth ** i for i in range(finite + 1)]
+    elif 'linearBuckets' in bucket_options:
+        options = bucket_options['linearBuckets']
+        finite = int(options.get('numFiniteBuckets', 0))
+        offset, width = float(options.get('offset', 0)), float(options.get('width', 1))
+        edges = [offset + width * i for i in range(finite + 1)]
+    else:
+        edges = [float(bound) for bound in bucket_options.get('explicitBuckets', {}).get('bounds', [])]
+
+    bounds = [(-math.inf, edges[0] if edges else math.inf)]
+    bounds += [(edges[i], edges[i + 1]) for i in range(len(edges) - 1)]
+    bounds.append((edges[-1] if edges else -math.inf, math.inf))
+    return bounds[:count]
+
+
+def distribution_quantiles(bucket_options, bucket_counts, quantiles=MONITORING_PERCENTILES):
+    """Estimate quantiles from bucket counts, interpolating linearly inside the bucket"""
+    counts = [int(count) for count in bucket_counts]
+    total = sum(counts)
+    if not total:
+        return {name: 0.0 for name in quantiles}
+
+    bounds = bucket_bounds(bucket_options, len(counts))
+    estimates = {}
+    for name, q in quantiles.items():
+        rank = q * total
+        cumulative = 0
+        for (lower, upper), count in zip(bounds, counts):
+            if count and cumulative + count >= rank:
+                if math.isinf(lower):
+                    estimates[name] = upper
+                elif math.isinf(upper):
+                    estimates[name] = lower
+                else:
+                    estimates[name] = lower + (upper - lower) * (rank - cumulative) / count
+                break
+            cumulative += count
+    return estimates
+
+
+def merge_bucket_counts(bucket_counts_list):
+    """Sum bucket counts of distributions sharing the same bucket options"""
+    merged = []
+    for bucket_counts in bucket_counts_list:
+        if len(bucket_counts) > len(merged):
+            merged.extend([0] * (len(bucket_counts) - len(merged)))
+        for i, count in enumerate(bucket_counts):
+            merged[i] += int(count)
+    return merged
+
+
+def parse_time_series(metric_name, series_list):
+    """Flatten aligned API series into rows, one per region and alignment period
+
+    Distribution points get count, mean and quantiles (and keep their buckets
+    under 'buckets' for merging); numeric points get their value.
+    """
+    rows = []
+    for series in series_list or []:
+        region = series_region(series)
+        for point in series.get('points', []):
+            value = point.get('value', {})
+            row = {
+                'timestamp': point.get('interval', {}).get('endTime'),
+                'metric': metric_name,
+                'region': region,
+                'geo_region': geo_region(region),
+                'value': None, 'count': None, 'p50': None, 'p95': None, 'p99': None,
+            }
+            if 'distributionValue' in value:
+                distribution = value['distributionValue']
+                counts = [int(count) for count in distribution.get('bucketCounts', [])]
+                row.update(distribution_quantiles(distribution.get('bucketOptions', {}), counts))
+                row['count'] = int(distribution.get('count', sum(counts)))
+                row['value'] = float(distribution.get('mean', 0.0))
+                row['bucket_options'] = distribution.get('bucketOptions', {})
+                row['buckets'] = counts
+            elif 'doubleValue' in value:
+                row['value'] = float(value['doubleValue'])
+            elif 'int64Value' in value:
+                row['value'] = float(value['int64Value'])
+            else:
+                continue
+            if row['timestamp']:
+                rows.append(row)
+    return rows
+
+
+def weighted_mean(rows):
+    """Count-weighted mean of distribution rows"""
+    total = sum(row['count'] or 0 for row in rows)
+    if not total:
+        return 0.0
+    return sum(row['value'] * row['count'] for row in rows if row['count']) / total
+
+
+def rollup_distributions(rows):
+    """Merged quantiles, mean and count of distribution rows with matching buckets"""
+    counts = merge_bucket_counts(row['buckets'] for row in rows)
+    summary = distribution_quantiles(rows[0]['bucket_options'], counts)
+    summary['mean'] = weighted_mean(rows)
+    summary['count'] = sum(row['count'] or 0 for row in rows)
+    return summary
+
+
+def monitoring_window_features(rows, interval):
+    """Roll aligned rows up to feature windows
+
+    Backend latency quantiles come from bucket counts merged over each window
+    (overall and per serving region); CPU utilization is averaged. Returns a
+    DataFrame indexed by window start, or None without rows.
+    """
+    import pandas as pd
+
+    if not rows:
+        return None
+
+    windows = pd.to_datetime([row['timestamp'] for row in rows], utc=True, format='ISO8601').floor(interval)
+    grouped = {}
+    for window, row in zip(windows, rows):
+        grouped.setdefault((window, row['metric']), []).append(row)
+
+    features = {}
+    for (window, metric), metric_rows in grouped.items():
+        target = features.setdefault(window, {})
+        if metric == 'backend_latencies':
+            overall = rollup_distributions(metric_rows)
+            target['avg_backend_latency_ms'] = overall['mean']
+            target['backend_requests'] = overall['count']
+            for name in MONITORING_PERCENTILES:
+                target[f'backend_latency_{name}_ms'] = overall[name]
+            for region in GEO_REGION_PREFIXES:
+                region_rows = [row for row in metric_rows if row['geo_region'] == region]
+                if region_rows:
+                    target[f'{region}_backend_latency_p95_ms'] = rollup_distributions(region_rows)['p95']
+        elif metric == 'cpu_utilization':
+            target['cpu_utilization_percentage'] = 100 * sum(row['value'] for row in metric_rows) / len(metric_rows)
+            for region in GEO_REGION_PREFIXES:
+                region_values = [row['value'] for row in metric_rows if row['geo_region'] == region]
+                if region_values:
+                    target[f'{region}_cpu_utilization_percentage'] = 100 * sum(region_values) / len(region_values)
+
+    frame = pd.DataFrame.from_dict(features, orient='index').sort_index()
+    frame = frame.reindex(columns=MONITORING_FEATURE_COLUMNS)
+    frame.index.name = 'timestamp'
+    return frame
+
+
+def monitoring_table_columns(rows):
+    """Rows as columns for the columnar monitoring_series table (buckets dropped)"""
+    return {name: [row[name] for row in rows] for name in MONITORING_COLUMNS}
@@ -2,49 +2,368 @@
 """
 Predictive Scaling System using RAG with Ollama
 Analyzes GCP logs and metrics to make intelligent scaling decisions
+
+Heavy dependencies (pandas, LangChain, Chroma, HuggingFace embeddings) are
+imported inside the methods that use them, so --help, the daemon entry point
+and tools that only need the decision helpers start in milliseconds.
 """
 
 import json
 import os
 import sys
+import time
+import math
+import hashlib
 import argparse
+from collections import OrderedDict
 from pathlib import Path
-from datetime import datetime, timedelta
-import pandas as pd
-import numpy as np
-
-# LangChain imports
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Chroma
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.llms import Ollama
-from langchain.docstore.document import Document
-from langchain.schema import BaseRetriever
+from datetime import datetime, timedelta, timezone
+
+import columnar_store
+
+# Collected log files (written by fetch_metrics.py) and how they are labelled
+LOG_FILES = {
+    'load_balancer_access': 'Load Balancer Access',
+    'gke_cluster_autoscaling': 'GKE Autoscaling Events',
+    'gke_node_pressure': 'Node Pressure Events',
+    'backend_service_requests': 'Backend Service Requests',
+    'cluster_events': 'Cluster Events'
+}
+FEATURES_FILE = 'training_features.csv'
+# Columns read from the columnar training_features table (see columnar_store.py)
+FEATURE_COLUMNS = [
+    'timestamp', 'total_requests', 'asia_requests', 'europe_requests', 'americas_requests',
+    'asia_percentage', 'europe_percentage', 'americas_percentage', 'avg_backend_latency_ms',
+    'scaling_events_count', 'pressure_events_count', 'unique_countries',
+    'top_country', 'top_country_requests', 'latency_p50_ms', 'latency_p95_ms', 'latency_p99_ms',
+    'error_rate_percentage', 'total_requests_rolling_mean', 'asia_percentage_rolling_mean',
+    'total_requests_change_pct', 'backend_latency_p95_ms', 'asia_backend_latency_p95_ms',
+    'cpu_utilization_percentage'
+]
+FEATURE_HISTORY_DAYS = int(os.environ.get('FEATURE_HISTORY_DAYS', '30'))
+# fetch_metrics.py writes pretty-printed JSON arrays; NDJSON files are also accepted
+LOG_FILE_SUFFIXES = ('.json', '.ndjson', '.jsonl')
+
+# Documents per embedding batch and bytes per read when streaming log files
+DOCUMENT_BATCH_SIZE = int(os.environ.get('DOCUMENT_BATCH_SIZE', '512'))
+JSON_READ_CHUNK_SIZE = 1 << 16
+
+OLLAMA_BASE_URL = os.environ.get('OLLAMA_BASE_URL', 'http://localhost:11434')
+
+# Deterministic thresholds - same decision framework the LLM prompt describes
+ASIA_REQUESTS_THRESHOLD_UPPER = int(os.environ.get('ASIA_REQUESTS_THRESHOLD_UPPER', '50'))
+ASIA_PERCENTAGE_THRESHOLD_UPPER = float(os.environ.get('ASIA_PERCENTAGE_THRESHOLD_UPPER', '10.0'))
+LATENCY_THRESHOLD_UPPER_MS = float(os.environ.get('LATENCY_THRESHOLD_UPPER_MS', '500'))
+ASIA_REQUESTS_THRESHOLD_LOWER = int(os.environ.get('ASIA_REQUESTS_THRESHOLD_LOWER', '10'))
+ASIA_PERCENTAGE_THRESHOLD_LOWER = float(os.environ.get('ASIA_PERCENTAGE_THRESHOLD_LOWER', '2.0'))
+LATENCY_THRESHOLD_LOWER_MS = float(os.environ.get('LATENCY_THRESHOLD_LOWER_MS', '200'))
+
+# Decision cache
+DECISION_CACHE_TTL_SECONDS = int(os.environ.get('DECISION_CACHE_TTL_SECONDS', '900'))
+DECISION_CACHE_MAX_ENTRIES = 256
+
+# Quantization steps used to build cache keys - metrics that only differ
+# within one step are treated as the same scenario
+METRIC_QUANTIZATION_STEPS = {
+    'total_requests': 25,
+    'asia_requests': 10,
+    'europe_requests': 10,
+    'americas_requests': 10,
+    'asia_percentage': 2.5,
+    'europe_percentage': 2.5,
+    'americas_percentage': 2.5,
+    'avg_backend_latency_ms': 25,
+    'scaling_events_count': 1,
+    'pressure_events_count': 1,
+}
+
+# Structured decision output
+COLD_REGION = os.environ.get('COLD_REGION', 'asia-southeast1')
+MAX_TARGET_NODES = 5
+RULES_SCALE_UP_NODES = 2
+LLM_MAX_ATTEMPTS = int(os.environ.get('LLM_MAX_ATTEMPTS', '3'))
+
+SCALING_ACTIONS = ['SCALE_UP_ASIA', 'SCALE_DOWN_ASIA', 'NO_CHANGE']
+CONFIDENCE_LEVELS = ['HIGH', 'MEDIUM', 'LOW']
+PRIMARY_TRIGGERS = ['geographic_traffic', 'latency', 'resource_pressure', 'cost_optimization']
+
+SCALING_DECISION_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'action': {'type': 'string', 'enum': SCALING_ACTIONS},
+        'confidence': {'type': 'string', 'enum': CONFIDENCE_LEVELS},
+        'target_nodes': {'type': 'integer', 'minimum': 0, 'maximum': MAX_TARGET_NODES},
+        'primary_trigger': {'type': 'string', 'enum': PRIMARY_TRIGGERS},
+        'key_factors': {'type': 'array', 'items': {'type': 'string'}},
+        'risk_assessment': {'type': 'string'},
+        'rollback_condition': {'type': 'string'}
+    },
+    'required': ['action', 'confidence', 'target_nodes', 'primary_trigger', 'key_factors']
+}
+
+
+def validate_scaling_decision(payload):
+    """Validate a decoded LLM decision against SCALING_DECISION_SCHEMA, raising ValueError"""
+    if not isinstance(payload, dict):
+        raise ValueError(f"expected a JSON object, got {type(payload).__name__}")
+
+    missing = [field for field in SCALING_DECISION_SCHEMA['required'] if field not in payload]
+    if missing:
+        raise ValueError(f"missing required fields: {', '.join(missing)}")
+
+    for field, spec in SCALING_DECISION_SCHEMA['properties'].items():
+        if field not in payload:
+            continue
+        value = payload[field]
+
+        if spec['type'] == 'string' and not isinstance(value, str):
+            raise ValueError(f"'{field}' must be a string")
+        if spec['type'] == 'integer' and (isinstance(value, bool) or not isinstance(value, int)):
+            raise ValueError(f"'{field}' must be an integer")
+        if spec['type'] == 'array' and not (isinstance(value, list) and all(isinstance(item, str) for item in value)):
+            raise ValueError(f"'{field}' must be a list of strings")
+
+        if 'enum' in spec and value not in spec['enum']:
+            raise ValueError(f"'{field}' must be one of {', '.join(spec['enum'])}, got {value!r}")
+        if 'minimum' in spec and value < spec['minimum']:
+            raise ValueError(f"'{field}' must be >= {spec['minimum']}")
+        if 'maximum' in spec and value > spec['maximum']:
+            raise ValueError(f"'{field}' must be <= {spec['maximum']}")
+
+    if payload['action'] == 'SCALE_DOWN_ASIA' and payload['target_nodes'] != 0:
+        raise ValueError("SCALE_DOWN_ASIA requires target_nodes 0")
+    if payload['action'] == 'SCALE_UP_ASIA' and payload['target_nodes'] < 1:
+        raise ValueError("SCALE_UP_ASIA requires target_nodes >= 1")
+
+
+def build_scaling_decision(payload):
+    """Turn a validated decision payload into the dict shape the cold autoscaler executes
+
+    The result mirrors cold_autoscaler.should_scale_based_on_traffic, so callers can run
+    scale_cluster_nodes(region, decision['target_nodes']) for each of decision['target_regions'].
+    """
+    validate_scaling_decision(payload)
+
+    should_scale = payload['action'] != 'NO_CHANGE'
+    key_factors = payload['key_factors']
+
+    return {
+        'should_scale': should_scale,
+        'action': payload['action'],
+        'target_regions': [COLD_REGION] if should_scale else [],
+        'target_nodes': payload['target_nodes'],
+        'confidence': payload['confidence'],
+        'trigger': 'scale_down' if payload['action'] == 'SCALE_DOWN_ASIA' else payload['primary_trigger'],
+        'reason': " + ".join(key_factors) if key_factors else payload['action'],
+        'key_factors': key_factors,
+        'risk_assessment': payload.get('risk_assessment', ''),
+        'rollback_condition': payload.get('rollback_condition', '')
+    }
+
+
+def parse_scaling_decision(text):
+    """Extract, validate and build a scaling decision from raw LLM output"""
+    text = (text or '').strip()
+
+    # Tolerate markdown fences or prose around the object despite the JSON-only instruction
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end < start:
+        raise ValueError("no JSON object found in response")
+
+    try:
+        payload = json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise ValueError(f"invalid JSON: {e}")
+
+    return build_scaling_decision(payload)
+
+
+def log_file_paths(data_dir, log_file):
+    """Existing files holding entries for one log type
+
+    Covers legacy flat files (<log_file>.json) and the date partitions that
+    incremental collection appends to (<log_file>/date=YYYY-MM-DD/part-*.ndjson).
+    """
+    data_dir = Path(data_dir)
+    candidates = [data_dir / f"{log_file}{suffix}" for suffix in LOG_FILE_SUFFIXES]
+    paths = [path for path in candidates if path.is_file()]
+
+    partition_root = data_dir / log_file
+    if partition_root.is_dir():
+        paths.extend(sorted(path for path in partition_root.glob('date=*/*')
+                            if path.suffix in LOG_FILE_SUFFIXES and path.is_file()))
+    return paths
+
+
+def iter_json_records(file_path, chunk_size=JSON_READ_CHUNK_SIZE):
+    """Incrementally yield records from a JSON array file or an NDJSON file
+
+    Only one read chunk plus the record being decoded is held in memory, so
+    pretty-printed arrays from fetch_metrics.py and NDJSON logs of any size
+    stream at constant memory.
+    """
+    decoder = json.JSONDecoder()
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        position = 0
+        eof = False
+        in_array = None
+
+        while True:
+            # Skip whitespace and array separators
+            while position < len(buffer) and buffer[position] in ' \t\r\n,':
+                position += 1
+
+            if position >= len(buffer):
+                if eof:
+                    break
+                buffer = buffer[position:]
+                position = 0
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    eof = True
+                buffer += chunk
+                continue
+
+            if in_array is None:
+                # The first significant character decides the layout
+                in_array = buffer[position] == '['
+                if in_array:
+                    position += 1
+                continue
+
+            if in_array and buffer[position] == ']':
+                break
+
+            try:
+                record, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError(f"truncated or invalid JSON in {file_path} near offset {position}")
+                # Record spans the chunk boundary - read more and retry
+                buffer = buffer[position:]
+                position = 0
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    eof = True
+                buffer += chunk
+                continue
+
+            position = end
+            yield record
+
+
+def iter_batches(iterable, batch_size):
+    """Group an iterable into lists of at most batch_size items"""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def check_ollama_health(model_name, base_url=OLLAMA_BASE_URL, timeout=3):
+    """Cheap Ollama probe: list installed models instead of running a generation"""
+    import urllib.request
+
+    with urllib.request.urlopen(f"{base_url}/api/tags", timeout=timeout) as response:
+        tags = json.loads(response.read().decode('utf-8'))
+
+    installed = {model.get('name', '') for model in tags.get('models', [])}
+    # Ollama reports "mistral:latest" for a model pulled as "mistral"
+    if model_name not in installed and f"{model_name}:latest" not in installed:
+        raise RuntimeError(f"model '{model_name}' is not installed (available: {', '.join(sorted(installed)) or 'none'})")
+
+
+class DecisionCache:
+    """TTL cache of LLM scaling decisions keyed on quantized metrics + retrieved context"""
+
+    def __init__(self, ttl_seconds=DECISION_CACHE_TTL_SECONDS, max_entries=DECISION_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def make_key(current_metrics, context):
+        """Build a cache key from quantized metrics and a hash of the retrieved context"""
+        quantized = []
+        for metric, step in sorted(METRIC_QUANTIZATION_STEPS.items()):
+            try:
+                value = float(current_metrics.get(metric, 0) or 0)
+            except (TypeError, ValueError):
+                value = 0.0
+            if math.isnan(value):
+                value = 0.0
+            quantized.append(f"{metric}={int(round(value / step))}")
+
+        context_hash = hashlib.sha256(context.encode('utf-8')).hexdigest()
+        return f"{'|'.join(quantized)}|ctx={context_hash}"
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+
+        stored_at, decision = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[key]
+            return None
+
+        self._entries.move_to_end(key)
+        return decision
+
+    def put(self, key, decision):
+        self._entries[key] = (time.monotonic(), decision)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
 
 class InfrastructureScaler:
-    def __init__(self, data_dir="./ml_training_data", model_name="mistral"):
+    def __init__(self, data_dir="./ml_training_data", model_name="mistral",
+                 cache_ttl=DECISION_CACHE_TTL_SECONDS, connect_llm=True):
         self.data_dir = Path(data_dir)
         self.model_name = model_name
         self.embeddings = None
         self.vectorstore = None
         self.llm = None
-        self.setup_components()
+        self.decision_cache = DecisionCache(ttl_seconds=cache_ttl)
+        self.decision_stats = {'rules': 0, 'cache': 0, 'llm': 0}
+        self.setup_components(connect_llm)
 
-    def setup_components(self):
-        """Initialize LLM and embedding components"""
+    def setup_components(self, connect_llm=True):
+        """Initialize LLM and embedding components
+
+        connect_llm=False only loads the embeddings, for indexing and retrieval
+        without an Ollama server (e.g. benchmark_pipeline.py).
+        """
         print("🔧 Setting up AI components...")
 
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        from langchain_community.llms import Ollama
+
         # Use sentence-transformers for better embeddings
         self.embeddings = HuggingFaceEmbeddings(
             model_name="all-MiniLM-L6-v2",
             model_kwargs={'device': 'cpu'}  # Use CPU for AMD compatibility
         )
 
+        if not connect_llm:
+            return
+
         # Initialize Ollama
         try:
-            self.llm = Ollama(model=self.model_name, temperature=0.3)
-            # Test connection
-            test_response = self.llm.invoke("Test connection")
+            check_ollama_health(self.model_name)
+            # format="json" constrains Ollama's sampler to emit valid JSON
+            self.llm = Ollama(model=self.model_name, base_url=OLLAMA_BASE_URL,
+                              temperature=0.3, format="json")
             print(f"✅ Connected to Ollama model: {self.model_name}")
         except Exception as e:
             print(f"❌ Failed to connect to Ollama: {e}")
@@ -52,64 +371,103 @@ class InfrastructureScaler:
             sys.exit(1)
 
     def load_training_data(self):
-        """Load and process logs into documents"""
+        """Load and process logs into documents
+
+        Materializes everything; prefer iter_training_documents() for large data sets.
+        """
         print("📊 Loading training data...")
-        documents = []
-
-        # Load different log types
-        log_files = {
-            'load_balancer_access': 'Load Balancer Access',
-            'gke_cluster_autoscaling': 'GKE Autoscaling Events',
-            'gke_node_pressure': 'Node Pressure Events',
-            'backend_service_requests': 'Backend Service Requests',
-            'cluster_events': 'Cluster Events'
-        }
+        documents = list(self.iter_training_documents())
+        print(f"✅ Loaded {len(documents)} total documents")
+        return documents
 
-        for log_file, log_type in log_files.items():
-            file_path = self.data_dir / f"{log_file}.json"
-            if file_path.exists():
-                try:
-                    with open(file_path, 'r') as f:
-                        logs = json.load(f)
-
-                    print(f"  Loading {len(logs)} entries from {log_type}")
-
-                    for log in logs:
-                        doc_text = self.convert_log_to_text(log, log_type)
-                        if doc_text:
-                            documents.append(Document(
-                                page_content=doc_text,
-                                metadata={
-                                    'source': log_type,
-                                    'timestamp': log.get('timestamp', ''),
-                                    'log_file': log_file
-                                }
-                            ))
-
-                except Exception as e:
-                    print(f"  ⚠️  Failed to load {log_file}: {e}")
-
-        # Load training features
-        features_file = self.data_dir / 'training_features.csv'
-        if features_file.exists():
-            try:
-                df = pd.read_csv(features_file)
-                for _, row in df.iterrows():
-                    doc_text = self.convert_features_to_text(row)
-                    documents.append(Document(
+    def iter_training_documents(self):
+        """Lazily yield documents for every collected log file and feature row"""
+        for log_file in LOG_FILES:
+            yield from self.iter_log_documents(log_file)
+
+        yield from self.iter_feature_documents()
+
+    def iter_log_documents(self, log_file):
+        """Lazily yield documents for one log type, across all its files"""
+        for file_path in log_file_paths(self.data_dir, log_file):
+            yield from self.iter_log_file_documents(file_path, log_file)
+
+    def iter_log_file_documents(self, file_path, log_file):
+        """Stream one collected log file (JSON array or NDJSON) into documents"""
+        from langchain.docstore.document import Document
+
+        log_type = LOG_FILES[log_file]
+        count = 0
+
+        try:
+            for log in iter_json_records(file_path):
+                if not isinstance(log, dict):
+                    continue
+                count += 1
+                doc_text = self.convert_log_to_text(log, log_type)
+                if doc_text:
+                    yield Document(
                         page_content=doc_text,
                         metadata={
-                            'source': 'Training Features',
-                            'timestamp': row.get('timestamp', ''),
-                            'log_file': 'training_features'
+                            'source': log_type,
+                            'timestamp': log.get('timestamp', ''),
+                            'log_file': log_file
                         }
-                    ))
-                print(f"  Loading {len(df)} feature vectors")
-            except Exception as e:
-                print(f"  ⚠️  Failed to load training features: {e}")
+                    )
+        except (OSError, ValueError) as e:
+            print(f"  ⚠️  Failed to load {file_path.name}: {e}")
 
-        print(f"✅ Loaded {len(documents)} total documents")
-        return documents
+        print(f"  Loaded {count} entries from {log_type} ({file_path.name})")
+
+    def has_columnar_features(self):
+        return (columnar_store.available()
+                and columnar_store.table_exists(self.data_dir, columnar_store.TRAINING_FEATURES))
+
+    def iter_feature_rows(self):
+        """Yield training feature rows, preferring the columnar feature history over the CSV
+
+        The Parquet table is read with only FEATURE_COLUMNS and only the last
+        FEATURE_HISTORY_DAYS date partitions.
+        """
+        if self.has_columnar_features():
+            since = datetime.now(timezone.utc) - timedelta(days=FEATURE_HISTORY_DAYS)
+            for row in columnar_store.iter_records(self.data_dir, columnar_store.TRAINING_FEATURES,
+                                                   columns=FEATURE_COLUMNS, start=since,
+                                                   batch_size=DOCUMENT_BATCH_SIZE):
+                row['timestamp'] = row['timestamp'].isoformat()
+                yield row
+            return
+
+        import pandas as pd
+
+        features_file = self.data_dir / FEATURES_FILE
+        if not features_file.exists():
+            return
+
+        for chunk in pd.read_csv(features_file, chunksize=DOCUMENT_BATCH_SIZE):
+            for _, row in chunk.iterrows():
+                yield row
+
+    def iter_feature_documents(self):
+        """Lazily yield documents for training feature vectors"""
+        from langchain.docstore.document import Document
+
+        count = 0
+        try:
+            for row in self.iter_feature_rows():
+                count += 1
+                yield Document(
+                    page_content=self.convert_features_to_text(row),
+                    metadata={
+                        'source': 'Training Features',
+                        'timestamp': row.get('timestamp', ''),
+                        'log_file': 'training_features'
+                    }
+                )
+        except Exception as e:
+            print(f"  ⚠️  Failed to load training features: {e}")
+
+        print(f"  Loaded {count} feature vectors")
 
     def convert_log_to_text(self, log, log_type):
         """Convert log entry to meaningful text for embeddings"""
@@ -271,13 +629,17 @@ class InfrastructureScaler:
     def convert_features_to_text(self, row):
         """Convert feature row to text"""
         text = f"""
-        Infrastructure Metrics Summary:
+        Infrastructure Metrics Summary ({row.get('timestamp', 'latest')}):
         - Total Requests: {row.get('total_requests', 0)}
         - Geographic Distribution:
           * Asia: {row.get('asia_percentage', 0):.1f}% ({row.get('asia_requests', 0)} requests)
           * Europe: {row.get('europe_percentage', 0):.1f}% ({row.get('europe_requests', 0)} requests)
           * Americas: {row.get('americas_percentage', 0):.1f}% ({row.get('americas_requests', 0)} requests)
-        - Average Backend Latency: {row.get('avg_backend_latency_ms', 0):.0f}ms
+        - Average Backend Latency: {row.get('avg_backend_latency_ms', 0):.0f}ms (p95 {row.get('backend_latency_p95_ms', 0):.0f}ms, Asia p95 {row.get('asia_backend_latency_p95_ms', 0):.0f}ms)
+        - CPU Utilization: {row.get('cpu_utilization_percentage', 0):.0f}%
+        - Request Latency p50/p95/p99: {row.get('latency_p50_ms', 0):.0f}/{row.get('latency_p95_ms', 0):.0f}/{row.get('latency_p99_ms', 0):.0f}ms
+        - Error Rate: {row.get('error_rate_percentage', 0):.1f}%
+        - Trend: {row.get('total_requests_change_pct', 0):+.0f}% requests vs previous window, rolling mean {row.get('total_requests_rolling_mean', 0):.0f} requests, Asia {row.get('asia_percentage_rolling_mean', 0):.1f}%
         - Scaling Events: {row.get('scaling_events_count', 0)}
         - Resource Pressure Events: {row.get('pressure_events_count', 0)}
         - Geographic Diversity: {row.get('unique_countries', 0)} countries
@@ -288,9 +650,40 @@ class InfrastructureScaler:
         return text.strip()
 
     def create_vector_store(self, documents):
-        """Create vector store from documents"""
+        """Create vector store from an iterable of documents, embedding in bounded batches
+
+        Returns the number of chunks embedded.
+        """
         print("🔍 Creating vector embeddings...")
 
+        try:
+            added = self.index_documents(documents)
+            print(f"✅ Created vector store with {added} embeddings")
+            return added
+        except Exception as e:
+            print(f"❌ Failed to create vector store: {e}")
+            raise
+
+    def index_documents(self, documents, batch_size=None):
+        """Feed a (possibly lazy) stream of documents into the vector store batch by batch
+
+        Peak memory is bounded by the batch size rather than by the size of the log files.
+        """
+        added = 0
+        for batch in iter_batches(documents, batch_size or DOCUMENT_BATCH_SIZE):
+            added += self.add_documents(batch)
+        return added
+
+    def add_documents(self, documents):
+        """Split and embed documents into the vector store, creating it on first use
+
+        Chunks get content-derived ids; those already in the index are dropped
+        before embedding, so re-ingesting an unchanged entry costs no embedding call.
+        Returns the number of new chunks embedded.
+        """
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+        from langchain_community.vectorstores import Chroma
+
         # Split documents into chunks
         text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=1000,
@@ -299,21 +692,30 @@ class InfrastructureScaler:
         )
 
         splits = text_splitter.split_documents(documents)
-        print(f"  Split into {len(splits)} chunks")
 
-        # Create vector store
-        persist_directory = self.data_dir / "chroma_db"
+        unique_splits = {}
+        for split in splits:
+            doc_id = hashlib.sha1(f"{split.metadata.get('log_file', '')}:{split.page_content}".encode('utf-8')).hexdigest()
+            unique_splits.setdefault(doc_id, split)
 
-        try:
-            self.vectorstore = Chroma.from_documents(
-                documents=splits,
-                embedding=self.embeddings,
+        if not unique_splits:
+            return 0
+
+        if self.vectorstore is None:
+            persist_directory = self.data_dir / "chroma_db"
+            self.vectorstore = Chroma(
+                embedding_function=self.embeddings,
                 persist_directory=str(persist_directory)
             )
-            print(f"✅ Created vector store with {len(splits)} embeddings")
-        except Exception as e:
-            print(f"❌ Failed to create vector store: {e}")
-            raise
+
+        existing = set(self.vectorstore.get(ids=list(unique_splits), include=[])['ids'])
+        ids = [doc_id for doc_id in unique_splits if doc_id not in existing]
+        if not ids:
+            return 0
+
+        chunks = [unique_splits[doc_id] for doc_id in ids]
+        self.vectorstore.add_documents(chunks, ids=ids)
+        return len(chunks)
 
     def query_for_scaling_decision(self, current_metrics, k=5):
         """Query vector store for relevant scaling context"""
@@ -338,18 +740,52 @@ class InfrastructureScaler:
 
         return relevant_docs, query
 
-    def make_scaling_decision(self, current_metrics):
-        """Make intelligent scaling decision using RAG"""
-        print("🤔 Analyzing current metrics for scaling decision...")
-
-        # Get relevant historical context
-        relevant_docs, query = self.query_for_scaling_decision(current_metrics)
-
-        # Build context from relevant documents
-        context = "\n\n".join([doc.page_content for doc in relevant_docs])
+    def rules_based_decision(self, current_metrics):
+        """Apply the deterministic decision framework; return None when it is ambiguous"""
+        asia_requests = float(current_metrics.get('asia_requests', 0) or 0)
+        asia_percentage = float(current_metrics.get('asia_percentage', 0) or 0)
+        latency = float(current_metrics.get('avg_backend_latency_ms', 0) or 0)
+        pressure_events = float(current_metrics.get('pressure_events_count', 0) or 0)
+
+        high_asia_traffic = (asia_requests > ASIA_REQUESTS_THRESHOLD_UPPER
+                             or asia_percentage > ASIA_PERCENTAGE_THRESHOLD_UPPER)
+        high_latency = latency > LATENCY_THRESHOLD_UPPER_MS
+        has_pressure = pressure_events > 0
+
+        low_asia_traffic = (asia_requests < ASIA_REQUESTS_THRESHOLD_LOWER
+                            and asia_percentage < ASIA_PERCENTAGE_THRESHOLD_LOWER)
+        low_latency = latency < LATENCY_THRESHOLD_LOWER_MS
+
+        key_factors = [
+            f"Asia traffic {asia_percentage:.1f}% ({asia_requests:.0f} requests)",
+            f"Backend latency {latency:.0f}ms",
+            f"{pressure_events:.0f} resource pressure events"
+        ]
+
+        if high_asia_traffic and (high_latency or has_pressure):
+            action, target_nodes, trigger = 'SCALE_UP_ASIA', RULES_SCALE_UP_NODES, 'geographic_traffic'
+        elif not (high_asia_traffic or high_latency or has_pressure):
+            if low_asia_traffic and low_latency:
+                action, target_nodes, trigger = 'SCALE_DOWN_ASIA', 0, 'cost_optimization'
+            else:
+                action, target_nodes, trigger = 'NO_CHANGE', 0, 'geographic_traffic'
+        else:
+            # Mixed signals - this is what the LLM and historical context are for
+            return None
 
-        # Create prompt for LLM
-        prompt = f"""
+        return build_scaling_decision({
+            'action': action,
+            'confidence': 'HIGH',
+            'target_nodes': target_nodes,
+            'primary_trigger': trigger,
+            'key_factors': key_factors,
+            'risk_assessment': 'Decided by deterministic thresholds (no LLM call)',
+            'rollback_condition': 'Re-evaluated on the next decision cycle'
+        })
+
+    def build_decision_prompt(self, current_metrics, context):
+        """Build the LLM prompt requesting a JSON decision that matches the schema"""
+        return f"""
         You are an expert cloud infrastructure engineer making scaling decisions for a multi-region GKE deployment.
 
         CURRENT METRICS:
@@ -368,45 +804,107 @@ class InfrastructureScaler:
 
         INFRASTRUCTURE SETUP:
         - Hot regions (always active): europe-west2, us-south1
-        - Cold regions (scale-to-zero): asia-southeast1
+        - Cold regions (scale-to-zero): {COLD_REGION}
 
         DECISION FRAMEWORK:
         1. Scale UP Asia cluster if:
-           - Asia traffic > 50 requests OR > 10% of total traffic
-           - High latency (> 500ms) to hot regions
+           - Asia traffic > {ASIA_REQUESTS_THRESHOLD_UPPER} requests OR > {ASIA_PERCENTAGE_THRESHOLD_UPPER:.0f}% of total traffic
+           - High latency (> {LATENCY_THRESHOLD_UPPER_MS:.0f}ms) to hot regions
            - Resource pressure in hot regions
 
         2. Scale DOWN Asia cluster if:
-           - Asia traffic < 10 requests AND < 2% of total traffic
-           - Low latency (< 200ms) to hot regions
+           - Asia traffic < {ASIA_REQUESTS_THRESHOLD_LOWER} requests AND < {ASIA_PERCENTAGE_THRESHOLD_LOWER:.0f}% of total traffic
+           - Low latency (< {LATENCY_THRESHOLD_LOWER_MS:.0f}ms) to hot regions
            - No resource pressure
 
-        Based on the current metrics and historical patterns, provide a structured scaling recommendation:
+        Based on the current metrics and historical patterns, reply with ONLY a JSON object
+        (no prose, no markdown) that matches this JSON schema:
 
-        RECOMMENDATION: [SCALE_UP_ASIA | SCALE_DOWN_ASIA | NO_CHANGE]
-        CONFIDENCE: [HIGH | MEDIUM | LOW]
-        TARGET_NODES: [0-5]
-        
-        REASONING:
-        - Primary trigger: [geographic_traffic | latency | resource_pressure | cost_optimization]
-        - Key factors: [list 2-3 key factors from the data]
-        - Risk assessment: [potential risks of this decision]
-        
-        EXECUTION:
-        - Immediate action: [specific command or action to take]
-        - Monitoring: [what to watch after scaling]
-        - Rollback condition: [when to reverse this decision]
+        {json.dumps(SCALING_DECISION_SCHEMA, indent=2)}
+
+        Rules:
+        - SCALE_DOWN_ASIA requires target_nodes 0
+        - SCALE_UP_ASIA requires target_nodes between 1 and {MAX_TARGET_NODES}
+        - key_factors lists 2-3 key factors from the data
         """
 
+    def request_llm_decision(self, prompt):
+        """Ask the LLM for a JSON decision, retrying malformed output with a bounded budget"""
+        last_error = None
+        attempt_prompt = prompt
+
+        for attempt in range(1, LLM_MAX_ATTEMPTS + 1):
+            response = self.llm.invoke(attempt_prompt)
+            self.decision_stats['llm'] += 1
+            try:
+                return parse_scaling_decision(response), response, attempt
+            except ValueError as e:
+                last_error = e
+                print(f"  ⚠️  Malformed LLM decision (attempt {attempt}/{LLM_MAX_ATTEMPTS}): {e}")
+                attempt_prompt = (f"{prompt}\n\n"
+                                  f"Your previous reply was rejected: {e}\n"
+                                  f"Reply again with ONLY a JSON object matching the schema.")
+
+        raise ValueError(f"no valid decision after {LLM_MAX_ATTEMPTS} attempts: {last_error}")
+
+    def make_scaling_decision(self, current_metrics):
+        """Make intelligent scaling decision using RAG"""
+        print("🤔 Analyzing current metrics for scaling decision...")
+
+        # Fast path: unambiguous threshold decisions need neither retrieval nor the LLM
+        decision = self.rules_based_decision(current_metrics)
+        if decision:
+            self.decision_stats['rules'] += 1
+            print("⚡ Thresholds are unambiguous, skipping LLM")
+            print("🎯 Scaling Decision:")
+            print(json.dumps(decision, indent=2))
+            return {
+                'recommendation': decision['action'],
+                'decision': decision,
+                'decision_source': 'rules',
+                'context_docs': 0,
+                'query_used': None,
+                'current_metrics': current_metrics
+            }
+
+        # Get relevant historical context
+        relevant_docs, query = self.query_for_scaling_decision(current_metrics)
+
+        # Build context from relevant documents
+        context = "\n\n".join([doc.page_content for doc in relevant_docs])
+
+        cache_key = self.decision_cache.make_key(current_metrics, context)
+        decision = self.decision_cache.get(cache_key)
+        if decision is not None:
+            self.decision_stats['cache'] += 1
+            print("♻️  Reusing cached decision for equivalent metrics and context")
+            print("🎯 Scaling Decision:")
+            print(json.dumps(decision, indent=2))
+            return {
+                'recommendation': decision['action'],
+                'decision': decision,
+                'decision_source': 'cache',
+                'context_docs': len(relevant_docs),
+                'query_used': query,
+                'current_metrics': current_metrics
+            }
+
+        prompt = self.build_decision_prompt(current_metrics, context)
+
         try:
             # Get LLM response
-            response = self.llm.invoke(prompt)
+            decision, response, attempts = self.request_llm_decision(prompt)
+            self.decision_cache.put(cache_key, decision)
 
             print("🎯 Scaling Decision:")
-            print(response)
+            print(json.dumps(decision, indent=2))
 
             return {
-                'recommendation': response,
+                'recommendation': decision['action'],
+                'decision': decision,
+                'decision_source': 'llm',
+                'llm_attempts': attempts,
+                'raw_response': response,
                 'context_docs': len(relevant_docs),
                 'query_used': query,
                 'current_metrics': current_metrics
@@ -416,39 +914,50 @@ class InfrastructureScaler:
             print(f"❌ Failed to get scaling decision: {e}")
             return None
 
+    def load_current_metrics(self):
+        """Load current metrics from the latest training features row"""
+        if self.has_columnar_features():
+            row = columnar_store.read_latest_row(self.data_dir, columnar_store.TRAINING_FEATURES,
+                                                 columns=FEATURE_COLUMNS)
+            if row:
+                row['timestamp'] = row['timestamp'].isoformat()
+                return row
+
+        import pandas as pd
+
+        features_file = self.data_dir / FEATURES_FILE
+        if features_file.exists():
+            df = pd.read_csv(features_file)
+            if not df.empty:
+                return df.iloc[-1].to_dict()
+
+        # Use mock data for testing
+        return {
+            'total_requests': 150,
+            'asia_requests': 75,
+            'europe_requests': 50,
+            'americas_requests': 25,
+            'asia_percentage': 50.0,
+            'europe_percentage': 33.3,
+            'americas_percentage': 16.7,
+            'avg_backend_latency_ms': 250,
+            'scaling_events_count': 2,
+            'pressure_events_count': 1,
+            'unique_countries': 8
+        }
+
     def run_analysis(self):
         """Run complete analysis pipeline"""
         print("🚀 Starting Predictive Scaling Analysis...")
 
-        # Load training data
-        documents = self.load_training_data()
-        if not documents:
+        # Stream training data straight into the vector store
+        print("📊 Loading training data...")
+        if not self.create_vector_store(self.iter_training_documents()):
             print("❌ No training data found")
             return
 
-        # Create vector store
-        self.create_vector_store(documents)
-
         # Load current metrics (from latest training features)
-        features_file = self.data_dir / 'training_features.csv'
-        if features_file.exists():
-            df = pd.read_csv(features_file)
-            current_metrics = df.iloc[-1].to_dict()
-        else:
-            # Use mock data for testing
-            current_metrics = {
-                'total_requests': 150,
-                'asia_requests': 75,
-                'europe_requests': 50,
-                'americas_requests': 25,
-                'asia_percentage': 50.0,
-                'europe_percentage': 33.3,
-                'americas_percentage': 16.7,
-                'avg_backend_latency_ms': 250,
-                'scaling_events_count': 2,
-                'pressure_events_count': 1,
-                'unique_countries': 8
-            }
+        current_metrics = self.load_current_metrics()
 
         # Make scaling decision
         decision = self.make_scaling_decision(current_metrics)
@@ -471,11 +980,28 @@ def main():
                         help='Ollama model to use (mistral, llama2, codellama)')
     parser.add_argument('--test', action='store_true',
                         help='Run test analysis with mock data')
+    parser.add_argument('--cache-ttl', type=int, default=DECISION_CACHE_TTL_SECONDS,
+                        help='Seconds an LLM decision is reused for equivalent metrics')
+    parser.add_argument('--daemon', action='store_true',
+                        help='Keep models and index warm and serve decisions over HTTP')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='Daemon listen address')
+    parser.add_argument('--port', type=int, default=8765,
+                        help='Daemon listen port')
+    parser.add_argument('--poll-interval', type=int, default=30,
+                        help='Seconds between data directory scans in daemon mode')
 
     args = parser.parse_args()
 
+    if args.daemon:
+        import scaler_daemon
+        return scaler_daemon.serve(data_dir=args.data_dir, model_name=args.model,
+                                   cache_ttl=args.cache_ttl, host=args.host,
+                                   port=args.port, poll_interval=args.poll_interval)
+
     # Initialize scaler
-    scaler = InfrastructureScaler(data_dir=args.data_dir, model_name=args.model)
+    scaler = InfrastructureScaler(data_dir=args.data_dir, model_name=args.model,
+                                  cache_ttl=args.cache_ttl)
 
     # Run analysis
     decision = scaler.run_analysis()
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Long-running Predictive Scaler daemon
+Keeps the embedding model, vector index and Ollama client warm, ingests new
+log files from fetch_metrics.py incrementally and serves decisions over HTTP
+"""
+
+import json
+import time
+import threading
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import columnar_store
+from predictive_scaler import InfrastructureScaler, LOG_FILES, FEATURES_FILE, log_file_paths
+
+# Number of recent latency samples kept per metric
+LATENCY_WINDOW = 1000
+
+
+def percentile(samples, q):
+    """Nearest-rank percentile of a list of numbers"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class LatencyTracker:
+    """Rolling latency samples (ms) grouped by name"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, duration_ms):
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(duration_ms)
+            self._counts[name] = self._counts.get(name, 0) + 1
+
+    def summary(self):
+        with self._lock:
+            return {
+                name: {
+                    'count': self._counts[name],
+                    'p50_ms': round(percentile(list(samples), 50), 2),
+                    'p95_ms': round(percentile(list(samples), 95), 2),
+                    'max_ms': round(max(samples), 2),
+                }
+                for name, samples in self._samples.items()
+            }
+
+
+class ScalerDaemon:
+    """Warm InfrastructureScaler plus a data directory watcher"""
+
+    def __init__(self, scaler, poll_interval=30):
+        self.scaler = scaler
+        self.poll_interval = poll_interval
+        self.latency = LatencyTracker()
+        self.started_at = datetime.now()
+        self.documents_ingested = 0
+        self.last_ingest = None
+        self._file_state = {}
+        self._stop = threading.Event()
+        # Chroma and the LLM client are not safe to drive from several threads at once
+        self._lock = threading.Lock()
+
+    def scan_data_dir(self):
+        """Return the watched files that are new or changed since the last scan"""
+        changed = []
+        watched = [(path, log_file)
+                   for log_file in LOG_FILES
+                   for path in log_file_paths(self.scaler.data_dir, log_file)]
+        features_path = self.scaler.data_dir / FEATURES_FILE
+        if features_path.is_file():
+            watched.append((features_path, None))
+        watched.extend((path, None) for path in
+                       columnar_store.table_files(self.scaler.data_dir, columnar_store.TRAINING_FEATURES))
+
+        for path, log_file in watched:
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+
+            state = (stat.st_mtime_ns, stat.st_size)
+            if self._file_state.get(path) != state:
+                changed.append((path, log_file, state))
+
+        return changed
+
+    def iter_changed_documents(self, changed):
+        features_changed = False
+        for path, log_file, _ in changed:
+            if log_file is None:
+                features_changed = True
+            else:
+                yield from self.scaler.iter_log_file_documents(path, log_file)
+        # The CSV and Parquet parts are one feature history - re-read it once
+        if features_changed:
+            yield from self.scaler.iter_feature_documents()
+
+    def ingest_changes(self):
+        """Stream documents from new or changed files into the warm index"""
+        changed = self.scan_data_dir()
+        if not changed:
+            return 0
+
+        start = time.perf_counter()
+        with self._lock:
+            added = self.scaler.index_documents(self.iter_changed_documents(changed))
+
+        # Only mark files as seen once they are safely in the index
+        for path, _, state in changed:
+            self._file_state[path] = state
+
+        self.documents_ingested += added
+        self.last_ingest = datetime.now().isoformat()
+        self.latency.record('ingest', (time.perf_counter() - start) * 1000)
+        print(f"📥 Ingested {added} chunks from {len(changed)} changed file(s)")
+        return added
+
+    def watch(self):
+        """Poll the data directory until stopped"""
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.ingest_changes()
+            except Exception as e:
+                print(f"⚠️  Incremental ingest failed: {e}")
+
+    def decide(self, current_metrics=None):
+        """Make a scaling decision with the warm components"""
+        start = time.perf_counter()
+        if current_metrics is None:
+            current_metrics = self.scaler.load_current_metrics()
+
+        with self._lock:
+            decision = self.scaler.make_scaling_decision(current_metrics)
+
+        duration_ms = (time.perf_counter() - start) * 1000
+        self.latency.record('decision', duration_ms)
+        if decision:
+            self.latency.record(f"decision_{decision['decision_source']}", duration_ms)
+            decision['latency_ms'] = round(duration_ms, 2)
+        return decision
+
+    def stats(self):
+        return {
+            'started_at': self.started_at.isoformat(),
+            'model': self.scaler.model_name,
+            'data_dir': str(self.scaler.data_dir),
+            'documents_ingested': self.documents_ingested,
+            'last_ingest': self.last_ingest,
+            'decision_sources': dict(self.scaler.decision_stats),
+            'cached_decisions': len(self.scaler.decision_cache),
+            'latency': self.latency.summary()
+        }
+
+    def stop(self):
+        self._stop.set()
+
+
+def make_handler(daemon):
+    """Build a request handler class bound to a ScalerDaemon"""
+
+    class DecisionHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status, payload):
+            body = json.dumps(payload, default=str).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_decision(self, current_metrics=None):
+            try:
+                decision = daemon.decide(current_metrics)
+            except ValueError as e:
+                # e.g. the vector store is not initialized until training data arrives
+                self._send_json(503, {'status': 'error', 'error': str(e)})
+                return
+            except Exception as e:
+                print(f"❌ Decision request failed: {type(e).__name__}: {e}")
+                self._send_json(500, {'status': 'error', 'error': f'{type(e).__name__}: {e}'})
+                return
+
+            if decision:
+                self._send_json(200, decision)
+            else:
+                self._send_json(502, {'status': 'error', 'error': 'Failed to get scaling decision'})
+
+        def do_GET(self):
+            if self.path == '/health':
+                self._send_json(200, {'status': 'ok'})
+            elif self.path == '/stats':
+                self._send_json(200, daemon.stats())
+            elif self.path == '/decision':
+                self._send_decision()
+            else:
+                self._send_json(404, {'status': 'error', 'error': 'Not found'})
+
+        def do_POST(self):
+            if self.path != '/decision':
+                self._send_json(404, {'status': 'error', 'error': 'Not found'})
+                return
+
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                current_metrics = json.loads(self.rfile.read(length) or b'{}')
+                if not isinstance(current_metrics, dict):
+                    raise ValueError("metrics must be a JSON object")
+            except ValueError as e:
+                self._send_json(400, {'status': 'error', 'error': f'Invalid metrics: {e}'})
+                return
+
+            self._send_decision(current_metrics)
+
+        def log_message(self, format, *args):
+            print(f"🌐 {self.address_string()} {format % args}")
+
+    return DecisionHandler
+
+
+def serve(data_dir, model_name, cache_ttl, host='127.0.0.1', port=8765, poll_interval=30):
+    """Start the daemon: warm up, ingest everything once, then watch and serve"""
+    print("🚀 Starting Predictive Scaler daemon...")
+    scaler = InfrastructureScaler(data_dir=data_dir, model_name=model_name, cache_ttl=cache_ttl)
+    daemon = ScalerDaemon(scaler, poll_interval=poll_interval)
+
+    try:
+        daemon.ingest_changes()
+    except Exception as e:
+        # Files that failed stay unseen, so the watcher retries them
+        print(f"⚠️  Initial ingest failed: {e}")
+    if scaler.vectorstore is None:
+        print("⚠️  No training data yet - waiting for fetch_metrics.py output")
+
+    watcher = threading.Thread(target=daemon.watch, daemon=True)
+    watcher.start()
+
+    server = ThreadingHTTPServer((host, port), make_handler(daemon))
+    print(f"✅ Serving decisions on http://{host}:{port} (GET/POST /decision, GET /stats, GET /health)")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n🛑 Stopping daemon...")
+    finally:
+        daemon.stop()
+        server.server_close()
+
+    return 0
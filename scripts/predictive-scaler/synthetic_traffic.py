@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Synthetic traffic generator for load and scale testing
+Produces seeded, realistic CDN traffic (diurnal patterns per country, flash
+crowds, per region-pair latency distributions, scaling and pressure events
+driven by load) and streams it to disk in the formats fetch_metrics.py emits
+"""
+
+import argparse
+import json
+import math
+import random
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from fetch_metrics import PROJECT_ID, append_partitioned
+
+# country, serving region group, share of traffic, UTC offset (hours), /16 prefixes of its client IPs
+COUNTRY_PROFILES = [
+    ('germany', 'europe', 0.16, 1, ['35.195.', '34.89.']),
+    ('united kingdom', 'europe', 0.10, 0, ['81.2.', '86.12.']),
+    ('france', 'europe', 0.08, 1, ['90.45.', '92.88.']),
+    ('portugal', 'europe', 0.06, 0, ['85.240.', '89.152.']),
+    ('united states', 'americas', 0.20, -6, ['35.188.', '34.66.']),
+    ('canada', 'americas', 0.04, -5, ['24.114.', '99.224.']),
+    ('brazil', 'americas', 0.06, -3, ['177.32.', '189.6.']),
+    ('singapore', 'asia', 0.08, 8, ['35.185.', '34.84.']),
+    ('japan', 'asia', 0.09, 9, ['126.10.', '153.156.']),
+    ('india', 'asia', 0.08, 5, ['49.36.', '117.96.']),
+    ('australia', 'asia', 0.05, 10, ['1.120.', '101.160.']),
+]
+
+# Serving clusters (hot regions always on, the cold Asia region scales from zero)
+SERVING_REGIONS = {'europe': 'europe-west2', 'americas': 'us-south1', 'asia': 'asia-southeast1'}
+FALLBACK_REGION = 'europe-west2'
+INITIAL_NODES = {'europe-west2': 2, 'us-south1': 2, 'asia-southeast1': 0}
+MAX_NODES = 5
+
+# Median backend latency (ms) per (client region group, serving region)
+LATENCY_MEDIAN_MS = {
+    ('europe', 'europe-west2'): 35, ('europe', 'us-south1'): 120, ('europe', 'asia-southeast1'): 170,
+    ('americas', 'europe-west2'): 110, ('americas', 'us-south1'): 40, ('americas', 'asia-southeast1'): 200,
+    ('asia', 'europe-west2'): 190, ('asia', 'us-south1'): 210, ('asia', 'asia-southeast1'): 30,
+}
+LATENCY_SIGMA = 0.35
+
+# Autoscaling model: utilization thresholds and cooldowns in minutes
+SCALE_UP_UTILIZATION = 0.8
+SCALE_DOWN_UTILIZATION = 0.3
+SCALE_UP_COOLDOWN = 5
+SCALE_DOWN_COOLDOWN = 15
+PRESSURE_UTILIZATION = 0.95
+
+# Monitoring histogram buckets (same shape as loadbalancing.googleapis.com latencies)
+LATENCY_BUCKET_OPTIONS = {'exponentialBuckets': {'numFiniteBuckets': 66, 'growthFactor': 1.4, 'scale': 1}}
+
+IPS_PER_COUNTRY = 2000
+VIDEO_COUNT = 40
+SEGMENTS_PER_VIDEO = 600
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 Chrome/120.0 Safari/537.36',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_0 like Mac OS X) AppleWebKit/605.1.15 Mobile/15E148',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:121.0) Gecko/20100101 Firefox/121.0',
+    'VLC/3.0.20 LibVLC/3.0.20',
+]
+
+
+class SyntheticGeoIP:
+    """Stand-in for a geoip2 Reader resolving the generator's IP prefixes to their country"""
+
+    class _Country:
+        def __init__(self, name):
+            self.name = name
+
+    class _Response:
+        def __init__(self, name):
+            self.country = SyntheticGeoIP._Country(name)
+
+    def __init__(self, profiles=COUNTRY_PROFILES):
+        self.prefixes = {prefix: country for country, _, _, _, prefixes in profiles for prefix in prefixes}
+        self.lookups = 0
+
+    def city(self, ip_address):
+        self.lookups += 1
+        prefix = '.'.join(ip_address.split('.')[:2]) + '.'
+        if prefix not in self.prefixes:
+            raise ValueError(f"{ip_address} not in synthetic database")
+        return self._Response(self.prefixes[prefix].title())
+
+    def close(self):
+        pass
+
+
+def diurnal_factor(minute, utc_offset):
+    """Load multiplier for the local time of day: quiet around 08:00, peak around 20:00
+
+    Averages 1 over a day, so --rpm is the mean request rate.
+    """
+    local_hour = (minute.hour + minute.minute / 60 + utc_offset) % 24
+    return (0.25 + 0.75 * (1 + math.cos(2 * math.pi * (local_hour - 20) / 24)) / 2) / 0.625
+
+
+def poisson(rng, lam):
+    """Poisson sample (normal approximation for large rates)"""
+    if lam <= 0:
+        return 0
+    if lam > 50:
+        return max(0, int(round(rng.gauss(lam, math.sqrt(lam)))))
+    threshold, count, product = math.exp(-lam), 0, rng.random()
+    while product > threshold:
+        count += 1
+        product *= rng.random()
+    return count
+
+
+class TrafficSimulator:
+    """Minute-by-minute traffic model; iter_minutes() yields each minute's log entries"""
+
+    def __init__(self, start, hours=24, requests_per_minute=2000, seed=42, flash_crowds_per_day=3):
+        self.rng = random.Random(seed)
+        self.seed = seed
+        self.start = start.replace(second=0, microsecond=0)
+        self.minutes = int(hours * 60)
+        self.requests_per_minute = requests_per_minute
+        # One node serves a quarter of the average total load
+        self.node_capacity = max(1.0, requests_per_minute / 4)
+        self.nodes = dict(INITIAL_NODES)
+        self.last_scaled = {region: -10 ** 6 for region in self.nodes}
+        self.insert_counter = 0
+        self.ip_pools = {
+            country: [f"{self.rng.choice(prefixes)}{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}"
+                      for _ in range(IPS_PER_COUNTRY)]
+            for country, _, _, _, prefixes in COUNTRY_PROFILES
+        }
+        self.flash_crowds = self.plan_flash_crowds(flash_crowds_per_day * hours / 24)
+        # Requests per (client region group, serving region) in the current minute
+        self.pending_demand = {}
+        # Per-minute monitoring accumulators: (minute index, region) -> bucket counts / latency sum
+        self.latency_buckets = {}
+        self.latency_sums = {}
+        self.cpu = {}
+
+    def plan_flash_crowds(self, expected):
+        """Flash crowds: a country's traffic multiplied 3-10x for 10-60 minutes with a ramp"""
+        crowds = []
+        for _ in range(poisson(self.rng, expected)):
+            country = self.rng.choices([p[0] for p in COUNTRY_PROFILES], [p[2] for p in COUNTRY_PROFILES])[0]
+            crowds.append({
+                'country': country,
+                'start': self.rng.randrange(max(1, self.minutes)),
+                'duration': self.rng.randint(10, 60),
+                'multiplier': self.rng.uniform(3, 10),
+            })
+        return crowds
+
+    def flash_factor(self, country, index):
+        factor = 1.0
+        for crowd in self.flash_crowds:
+            offset = index - crowd['start']
+            if crowd['country'] != country or not 0 <= offset < crowd['duration']:
+                continue
+            # Linear ramp over the first and last fifth of the crowd
+            ramp = min(1.0, (offset + 1) / max(1, crowd['duration'] / 5),
+                       (crowd['duration'] - offset) / max(1, crowd['duration'] / 5))
+            factor *= 1 + (crowd['multiplier'] - 1) * ramp
+        return factor
+
+    def serving_region(self, group):
+        region = SERVING_REGIONS.get(group, FALLBACK_REGION)
+        return region if self.nodes[region] > 0 else FALLBACK_REGION
+
+    def next_insert_id(self):
+        self.insert_counter += 1
+        return f"{self.seed:04x}{self.insert_counter:012x}"
+
+    def lb_entry(self, timestamp, country, group, region, utilization):
+        rng = self.rng
+        median = LATENCY_MEDIAN_MS[(group, region)] * (1 + 3 * max(0.0, utilization - 0.7))
+        latency_ms = median * math.exp(rng.gauss(0, LATENCY_SIGMA))
+
+        roll = rng.random()
+        if roll < 0.002 + 0.5 * max(0.0, utilization - 0.9):
+            status = rng.choice((500, 502, 503))
+        elif roll < 0.02:
+            status = 404
+        elif roll < 0.07:
+            status = 304
+        else:
+            status = 200
+
+        video = rng.randrange(VIDEO_COUNT)
+        segment = rng.randrange(SEGMENTS_PER_VIDEO)
+        path = f"/hls/video{video}/playlist.m3u8" if segment % 50 == 0 else f"/hls/video{video}/segment{segment}.ts"
+        return {
+            'insertId': self.next_insert_id(),
+            'timestamp': timestamp.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            'httpRequest': {
+                'requestMethod': 'GET',
+                'requestUrl': f"https://cdn.uporto-cd.example{path}",
+                'status': status,
+                'responseSize': str(rng.randint(200_000, 2_000_000) if path.endswith('.ts') else rng.randint(300, 900)),
+                'userAgent': rng.choice(USER_AGENTS),
+                'remoteIp': rng.choice(self.ip_pools[country]),
+                'latency': f"{latency_ms / 1000:.6f}s",
+            },
+            'resource': {
+                'type': 'http_load_balancer',
+                'labels': {
+                    'project_id': PROJECT_ID,
+                    'backend_service_name': f"video-streaming-{region}",
+                    'forwarding_rule_name': 'video-streaming-https',
+                    'url_map_name': 'video-streaming-lb',
+                    'zone': 'global',
+                },
+            },
+            'jsonPayload': {
+                '@type': 'type.googleapis.com/google.cloud.loadbalancing.type.LoadBalancerLogEntry',
+                'statusDetails': 'response_sent_by_backend',
+                'backendTargetName': f"video-streaming-{region}",
+            },
+            'severity': 'ERROR' if status >= 500 else 'INFO',
+            'logName': f"projects/{PROJECT_ID}/logs/requests",
+        }, latency_ms
+
+    def cluster_event(self, timestamp, region, reason, message, node=None):
+        labels = {'project_id': PROJECT_ID, 'cluster_name': f"{PROJECT_ID}-gke-{region}", 'location': region}
+        if node:
+            labels['node_name'] = node
+        return {
+            'insertId': self.next_insert_id(),
+            'timestamp': timestamp.strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            'resource': {'type': 'k8s_node' if node else 'k8s_cluster', 'labels': labels},
+            'jsonPayload': {'reason': reason, 'message': message},
+            'severity': 'WARNING' if node else 'INFO',
+        }
+
+    def autoscale(self, index, minute, demand):
+        """Scale serving regions on utilization; returns (scaling events, pressure events)"""
+        scaling, pressure = [], []
+        for region, nodes in self.nodes.items():
+            utilization = demand.get(region, 0) / (max(nodes, 1) * self.node_capacity)
+            timestamp = minute + timedelta(seconds=59)
+            since = index - self.last_scaled[region]
+
+            if nodes == 0:
+                # Cold region: wakes up once the demand it would absorb is worth a node
+                wanted = sum(count for (group, served), count in self.pending_demand.items()
+                             if SERVING_REGIONS.get(group) == region)
+                if wanted > 0.5 * self.node_capacity and since >= SCALE_UP_COOLDOWN:
+                    new = 1
+                else:
+                    continue
+            elif utilization > SCALE_UP_UTILIZATION and nodes < MAX_NODES and since >= SCALE_UP_COOLDOWN:
+                new = nodes + 1
+            elif utilization < SCALE_DOWN_UTILIZATION and since >= SCALE_DOWN_COOLDOWN and \
+                    nodes > (0 if region == SERVING_REGIONS['asia'] else 1):
+                new = nodes - 1
+            else:
+                new = nodes
+
+            if nodes and utilization > PRESSURE_UTILIZATION and self.rng.random() < 0.3:
+                node = f"gke-{region}-pool-{self.rng.randrange(max(nodes, 1))}"
+                reason = self.rng.choice(('MemoryPressure', 'DiskPressure', 'NodeNotReady'))
+                pressure.append(self.cluster_event(timestamp, region, reason,
+                                                   f"Node {node} condition {reason} at {utilization:.0%} load", node))
+
+            if new != nodes:
+                direction = 'Up' if new > nodes else 'Down'
+                scaling.append(self.cluster_event(
+                    timestamp, region, f"Scaled{direction}Group",
+                    f"Scaled {direction.lower()} node pool in {region} from {nodes} to {new} nodes "
+                    f"(utilization {utilization:.0%})"))
+                self.nodes[region] = new
+                self.last_scaled[region] = index
+
+            self.cpu[(index, region)] = min(1.0, utilization) if self.nodes[region] else 0.0
+        return scaling, pressure
+
+    def record_latency(self, index, region, latency_ms):
+        buckets = self.latency_buckets.setdefault((index, region), [0] * 68)
+        bucket = 0 if latency_ms < 1 else min(67, int(math.log(latency_ms) / math.log(1.4)) + 1)
+        buckets[bucket] += 1
+        self.latency_sums[(index, region)] = self.latency_sums.get((index, region), 0.0) + latency_ms
+
+    def iter_minutes(self):
+        """Yield (minute, lb_entries, scaling_events, pressure_events), entries sorted by time"""
+        for index in range(self.minutes):
+            minute = self.start + timedelta(minutes=index)
+            arrivals = []
+            self.pending_demand.clear()
+            demand = {}
+            for country, group, share, utc_offset, _ in COUNTRY_PROFILES:
+                rate = (self.requests_per_minute * share * diurnal_factor(minute, utc_offset)
+                        * self.flash_factor(country, index))
+                count = poisson(self.rng, rate)
+                region = self.serving_region(group)
+                self.pending_demand[(group, region)] = self.pending_demand.get((group, region), 0) + count
+                demand[region] = demand.get(region, 0) + count
+                arrivals.extend((country, group, region) for _ in range(count))
+
+            utilization = {region: demand.get(region, 0) / (max(nodes, 1) * self.node_capacity)
+                           for region, nodes in self.nodes.items()}
+            offsets = sorted(self.rng.random() * 60 for _ in arrivals)
+            self.rng.shuffle(arrivals)
+
+            lb_entries = []
+            for offset, (country, group, region) in zip(offsets, arrivals):
+                entry, latency_ms = self.lb_entry(minute + timedelta(seconds=offset), country, group,
+                                                  region, utilization[region])
+                self.record_latency(index, region, latency_ms)
+                lb_entries.append(entry)
+
+            scaling, pressure = self.autoscale(index, minute, demand)
+            yield minute, lb_entries, scaling, pressure
+
+    def monitoring_series(self):
+        """Aligned per-minute series in the Monitoring API shape fetch_metrics.py requests"""
+        def end_time(index):
+            return (self.start + timedelta(minutes=index + 1)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+        latencies = {}
+        for (index, region), buckets in sorted(self.latency_buckets.items()):
+            count = sum(buckets)
+            latencies.setdefault(region, []).append({
+                'interval': {'startTime': end_time(index - 1), 'endTime': end_time(index)},
+                'value': {'distributionValue': {
+                    'count': str(count),
+                    'mean': self.latency_sums[(index, region)] / count,
+                    'bucketOptions': LATENCY_BUCKET_OPTIONS,
+                    'bucketCounts': [str(c) for c in buckets],
+                }},
+            })
+        cpu = {}
+        for (index, region), value in sorted(self.cpu.items()):
+            cpu.setdefault(region, []).append({
+                'interval': {'startTime': end_time(index - 1), 'endTime': end_time(index)},
+                'value': {'doubleValue': value},
+            })
+
+        return {
+            'backend_latencies': [
+                {'metric': {'type': 'loadbalancing.googleapis.com/https/backend_latencies'},
+                 'resource': {'type': 'https_lb_rule', 'labels': {'backend_scope': region}},
+                 'metricKind': 'DELTA', 'valueType': 'DISTRIBUTION', 'points': points[::-1]}
+                for region, points in latencies.items()
+            ],
+            'cpu_utilization': [
+                {'metric': {'type': 'compute.googleapis.com/instance/cpu/utilization'},
+                 'resource': {'type': 'gce_instance', 'labels': {'zone': f"{region}-a"}},
+                 'metricKind': 'GAUGE', 'valueType': 'DOUBLE', 'points': points[::-1]}
+                for region, points in cpu.items()
+            ],
+        }
+
+
+def generate(output_dir, start, hours=24, requests_per_minute=2000, seed=42,
+             flash_crowds_per_day=3, monitoring=True, run_id='synthetic'):
+    """Stream synthetic traffic into output_dir, one minute at a time
+
+    Writes <query>/date=YYYY-MM-DD/part-<run_id>.ndjson partitions for
+    load_balancer_access, gke_cluster_autoscaling and gke_node_pressure, plus
+    monitoring/<metric>.json aligned series. Returns entry counts.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    simulator = TrafficSimulator(start, hours, requests_per_minute, seed, flash_crowds_per_day)
+    counts = {'load_balancer_access': 0, 'gke_cluster_autoscaling': 0, 'gke_node_pressure': 0}
+
+    for minute, lb_entries, scaling, pressure in simulator.iter_minutes():
+        for name, entries in (('load_balancer_access', lb_entries),
+                              ('gke_cluster_autoscaling', scaling),
+                              ('gke_node_pressure', pressure)):
+            if entries:
+                append_partitioned(output_dir, name, entries, run_id)
+                counts[name] += len(entries)
+
+    if monitoring:
+        monitoring_dir = output_dir / 'monitoring'
+        monitoring_dir.mkdir(exist_ok=True)
+        for metric_name, series in simulator.monitoring_series().items():
+            with open(monitoring_dir / f"{metric_name}.json", 'w') as f:
+                json.dump(series, f)
+
+    counts['flash_crowds'] = len(simulator.flash_crowds)
+    counts['final_nodes'] = dict(simulator.nodes)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic CDN traffic in fetch_metrics.py formats')
+    parser.add_argument('--output-dir', type=str, default='./synthetic_data',
+                        help='Output directory (same layout as fetch_metrics.py --output-dir)')
+    parser.add_argument('--hours', type=float, default=24,
+                        help='Hours of traffic to generate')
+    parser.add_argument('--start', type=str, default=None,
+                        help='Start time as ISO timestamp (default: --hours before now)')
+    parser.add_argument('--rpm', type=int, default=2000,
+                        help='Average requests per minute across all countries')
+    parser.add_argument('--seed', type=int, default=42,
+                        help='Random seed - the same seed and arguments produce identical output')
+    parser.add_argument('--flash-crowds-per-day', type=float, default=3,
+                        help='Expected number of flash crowds per simulated day')
+    parser.add_argument('--no-monitoring', action='store_true',
+                        help='Skip the aligned monitoring series')
+    args = parser.parse_args()
+
+    if args.start:
+        start = datetime.fromisoformat(args.start.replace('Z', '+00:00'))
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+    else:
+        start = datetime.now(timezone.utc) - timedelta(hours=args.hours)
+
+    print(f"🧪 Generating {args.hours}h of synthetic traffic at ~{args.rpm} requests/min (seed {args.seed})")
+    counts = generate(args.output_dir, start, args.hours, args.rpm, args.seed,
+                      args.flash_crowds_per_day, not args.no_monitoring)
+
+    print(f"✅ Wrote synthetic data to {args.output_dir}")
+    print(f"  - {counts['load_balancer_access']:,} load balancer entries")
+    print(f"  - {counts['gke_cluster_autoscaling']} scaling events, {counts['gke_node_pressure']} pressure events")
+    print(f"  - {counts['flash_crowds']} flash crowds, final nodes: {counts['final_nodes']}")
+    return 0
+
+
+if __name__ == "__main__":
+    exit(main())
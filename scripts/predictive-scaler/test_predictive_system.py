@@ -6,10 +6,23 @@ Creates mock data and tests the RAG pipeline
 
 import json
 import csv
+import sys
+import time
+import subprocess
+import tempfile
 from pathlib import Path
 from datetime import datetime, timedelta
 import random
 
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+# Startup budgets for the lazy-import layout of predictive_scaler.py
+IMPORT_TIME_BUDGET_MS = 100
+HELP_TIME_BUDGET_MS = 200
+HEAVY_MODULES = ('pandas', 'numpy', 'langchain', 'langchain_community', 'chromadb',
+                 'sentence_transformers', 'torch', 'transformers', 'geoip2')
+
+
 def create_mock_training_data(output_dir="./ml_training_data"):
     """Create mock training data for testing"""
     output_dir = Path(output_dir)
@@ -170,6 +183,7 @@ def create_mock_training_data(output_dir="./ml_training_data"):
     print(f"  - {len(pressure_logs)} pressure events")
     print(f"  - {len(scenarios)} training scenarios")
 
+
 def test_ollama_connection():
     """Test connection to Ollama"""
     try:
@@ -191,6 +205,7 @@ def test_ollama_connection():
         print("Make sure Ollama is running and mistral model is installed")
         return False
 
+
 def test_embeddings():
     """Test embedding generation"""
     try:
@@ -212,11 +227,813 @@ def test_embeddings():
         print(f"❌ Embeddings test failed: {e}")
         return False
 
+
+def measure_import_time(module_name):
+    """Import a module in a fresh interpreter with -X importtime
+
+    Returns (cumulative import time of the module in ms, set of top-level modules imported).
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+        cwd=SCRIPT_DIR, capture_output=True, text=True, check=True
+    )
+
+    cumulative_ms = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        name = name.strip()
+        imported.add(name.split('.')[0])
+        if name == module_name:
+            cumulative_ms = int(cumulative) / 1000
+
+    return cumulative_ms, imported
+
+
+def test_import_time_budget():
+    """Importing the scaler modules must not pull in heavy ML dependencies"""
+    for module_name in ('predictive_scaler', 'scaler_daemon', 'fetch_metrics'):
+        # Best of three smooths out cold .pyc compilation and disk cache effects
+        timings = []
+        for _ in range(3):
+            cumulative_ms, imported = measure_import_time(module_name)
+            timings.append(cumulative_ms)
+
+            heavy = sorted(imported.intersection(HEAVY_MODULES))
+            assert not heavy, f"{module_name} imports heavy modules at load time: {heavy}"
+
+        assert min(timings) < IMPORT_TIME_BUDGET_MS, \
+            f"{module_name} import took {min(timings):.1f}ms (budget {IMPORT_TIME_BUDGET_MS}ms)"
+
+
+def test_help_startup_budget():
+    """predictive_scaler.py --help must answer within the CLI startup budget"""
+    timings = []
+    for _ in range(3):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, 'predictive_scaler.py', '--help'],
+                       cwd=SCRIPT_DIR, capture_output=True, check=True)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    assert min(timings) < HELP_TIME_BUDGET_MS, \
+        f"--help took {min(timings):.0f}ms (budget {HELP_TIME_BUDGET_MS}ms)"
+
+
+def test_streaming_json_reader():
+    """Legacy JSON arrays and NDJSON stream to the same records across chunk boundaries"""
+    from predictive_scaler import iter_json_records, iter_batches
+
+    logs = [{
+        'timestamp': f"2025-01-30T14:{i % 60:02d}:00Z",
+        'httpRequest': {'latency': f"{i}ms", 'userAgent': 'Mozilla/5.0 [test], {"quoted"}'}
+    } for i in range(200)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        array_file = Path(tmp) / "load_balancer_access.json"
+        ndjson_file = Path(tmp) / "load_balancer_access.ndjson"
+        truncated_file = Path(tmp) / "truncated.json"
+
+        with open(array_file, 'w') as f:
+            json.dump(logs, f, indent=2)
+        with open(ndjson_file, 'w') as f:
+            f.writelines(json.dumps(log) + "\n" for log in logs)
+        truncated_file.write_text('[{"timestamp": "a"}, {"timestamp": ')
+
+        # A tiny read size forces records to straddle chunk boundaries
+        assert list(iter_json_records(array_file, chunk_size=13)) == logs
+        assert list(iter_json_records(ndjson_file, chunk_size=13)) == logs
+
+        try:
+            list(iter_json_records(truncated_file))
+            assert False, "truncated file should raise"
+        except ValueError:
+            pass
+
+    assert [len(batch) for batch in iter_batches(range(10), 4)] == [4, 4, 2]
+
+
+def test_columnar_store_roundtrip():
+    """Flattened requests land in date partitions and read back with projection and time predicates"""
+    import columnar_store
+    if not columnar_store.available():
+        print("⚠️  pyarrow not installed, skipping columnar store test")
+        return
+
+    from datetime import datetime, timedelta, timezone
+    from fetch_metrics import flatten_lb_logs
+
+    start = datetime(2025, 1, 30, 23, 0, tzinfo=timezone.utc)
+    logs = [{
+        'timestamp': (start + timedelta(minutes=i)).strftime('%Y-%m-%dT%H:%M:%S.123456789Z'),
+        'insertId': str(i),
+        'httpRequest': {'remoteIp': '35.185.0.1' if i % 2 else '34.66.0.1', 'latency': '0.250s', 'status': 200},
+        'resource': {'labels': {'backend_service_name': 'video-backend'}}
+    } for i in range(120)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        columnar_store.write_partitioned(tmp, columnar_store.LB_REQUESTS, flatten_lb_logs(logs), 'test',
+                                         schema=columnar_store.lb_requests_schema())
+
+        partitions = {path.parent.name for path in columnar_store.table_files(tmp, columnar_store.LB_REQUESTS)}
+        assert partitions == {'date=2025-01-30', 'date=2025-01-31'}
+
+        table = columnar_store.read_table(tmp, columnar_store.LB_REQUESTS, columns=['latency_ms'],
+                                          start=start + timedelta(minutes=60))
+        assert table.column_names == ['latency_ms']
+        assert table.num_rows == 60
+        assert set(table['latency_ms'].to_pylist()) == {250.0}
+
+        traffic = columnar_store.replay_traffic_data(tmp, end=start + timedelta(minutes=9, seconds=30))
+        assert traffic == {'singapore': {'requests': 5, 'region': 'asia'},
+                           'united states': {'requests': 5, 'region': 'americas'}}
+
+
+def test_missing_client_ip():
+    """Entries with an empty or absent client IP fall back to remoteLocation, else count as unknown"""
+    from fetch_metrics import extract_geographic_metrics, flatten_lb_logs
+
+    logs = [
+        {'insertId': '1', 'timestamp': '2025-01-30T14:00:00Z',
+         'httpRequest': {'remoteIp': '35.185.0.1', 'latency': '0.100s'}},
+        {'insertId': '2', 'timestamp': '2025-01-30T14:00:01Z',
+         'httpRequest': {'remoteIp': '', 'remoteLocation': {'country': 'Japan'}, 'latency': '0.300s'}},
+        {'insertId': '3', 'timestamp': '2025-01-30T14:00:02Z',
+         'httpRequest': {'remoteLocation': {'country': 'Germany'}}},
+        {'insertId': '4', 'timestamp': '2025-01-30T14:00:03Z', 'httpRequest': {'remoteIp': ''}},
+    ]
+
+    geographic, latencies = extract_geographic_metrics(logs)
+    assert geographic == {'singapore': 1, 'japan': 1, 'germany': 1, 'unknown': 1}
+    assert latencies == {'singapore': 100.0, 'japan': 300.0}
+
+    requests = flatten_lb_logs(logs)
+    assert requests['country'].tolist() == ['singapore', 'japan', 'germany', 'unknown']
+    assert requests['region'].tolist() == ['asia', 'asia', 'europe', 'unknown']
+    assert requests['ip'].isna().tolist() == [False, True, True, True]
+
+
+def test_feature_windows():
+    """One feature row per interval, idle windows included, with per-window rates and lags"""
+    from datetime import datetime, timedelta, timezone
+    from feature_builder import build_feature_windows
+
+    start = datetime(2025, 1, 30, 14, 0, tzinfo=timezone.utc)
+    requests = {
+        'timestamp': [start, start + timedelta(minutes=1), start + timedelta(minutes=2),
+                      start + timedelta(minutes=11)],
+        'country': ['singapore', 'germany', 'singapore', 'united states'],
+        'region': ['asia', 'europe', 'asia', 'americas'],
+        'latency_ms': [100.0, 300.0, 0.0, 50.0],
+        'status': [200, 503, 200, 404],
+    }
+    scaling = [{'timestamp': '2025-01-30T14:07:30.5Z'}]
+
+    windows = build_feature_windows(requests, scaling, [], interval='5min')
+
+    assert windows['total_requests'].tolist() == [3, 0, 1]
+    assert windows['scaling_events_count'].tolist() == [0, 1, 0]
+    first = windows.iloc[0]
+    assert first['asia_requests'] == 2 and round(first['asia_percentage'], 1) == 66.7
+    assert first['top_country'] == 'singapore'
+    assert first['latency_p50_ms'] == 200.0
+    assert round(first['error_rate_percentage'], 1) == 33.3
+    assert windows['total_requests_lag1'].tolist() == [0, 3, 0]
+    assert windows.iloc[2]['client_error_rate_percentage'] == 100.0
+
+
+def test_distribution_quantiles():
+    """Aligned distribution points become quantiles, merged per window and region"""
+    from monitoring_series import parse_time_series, monitoring_window_features, distribution_quantiles
+
+    options = {'explicitBuckets': {'bounds': [10, 20, 40, 80]}}
+    # Buckets: (-inf,10) [10,20) [20,40) [40,80) [80,inf)
+    assert distribution_quantiles(options, [0, 10, 10]) == {'p50': 20.0, 'p95': 38.0, 'p99': 39.6}
+
+    def series(scope, counts, mean):
+        return {'resource': {'labels': {'backend_scope': scope}},
+                'points': [{'interval': {'endTime': '2025-01-30T14:01:00Z'},
+                            'value': {'distributionValue': {'count': str(sum(counts)), 'mean': mean,
+                                                            'bucketOptions': options,
+                                                            'bucketCounts': [str(c) for c in counts]}}}]}
+
+    rows = parse_time_series('backend_latencies', [series('asia-southeast1', [0, 0, 0, 10], 60.0),
+                                                   series('europe-west2', [0, 10, 10], 20.0)])
+    assert [row['geo_region'] for row in rows] == ['asia', 'europe']
+
+    window = monitoring_window_features(rows, '5min').iloc[0]
+    assert window['avg_backend_latency_ms'] == 100 / 3
+    assert window['backend_requests'] == 30
+    assert window['backend_latency_p50_ms'] == 30.0
+    assert window['asia_backend_latency_p95_ms'] == 78.0
+
+
+def test_synthetic_traffic():
+    """The generator is deterministic per seed and its output parses like collected logs"""
+    from datetime import datetime, timezone
+    from predictive_scaler import iter_json_records, log_file_paths
+    from fetch_metrics import extract_geographic_metrics
+    from synthetic_traffic import generate, SyntheticGeoIP
+
+    start = datetime(2025, 1, 30, 12, 0, tzinfo=timezone.utc)
+    outputs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for run in ('a', 'b'):
+            counts = generate(Path(tmp) / run, start, hours=0.5, requests_per_minute=60, seed=7)
+            logs = [record for path in log_file_paths(Path(tmp) / run, 'load_balancer_access')
+                    for record in iter_json_records(path)]
+            outputs.append((counts, logs))
+        assert (Path(tmp) / 'a' / 'monitoring' / 'backend_latencies.json').exists()
+
+    (counts, logs), (_, other_logs) = outputs
+    assert logs == other_logs
+    assert counts['load_balancer_access'] == len(logs) > 0
+    assert len({log['insertId'] for log in logs}) == len(logs)
+
+    geoip_reader = SyntheticGeoIP()
+    geographic, _ = extract_geographic_metrics(logs, geoip_reader)
+    assert 'unknown' not in geographic
+    assert sum(geographic.values()) == len(logs)
+
+
+def test_benchmark_comparison():
+    """The fake gcloud slices logs like gcloud, and result comparison flags regressions by direction"""
+    from fake_gcloud import FakeCloud
+    from benchmark_pipeline import compare_results
+
+    entries = [{'insertId': str(i), 'timestamp': f'2025-01-30T14:0{i}:30.5Z',
+                'resource': {'type': 'http_load_balancer'}} for i in range(5)]
+    cloud = FakeCloud(entries, cold_pools={'asia-southeast1': 0})
+    query = ('resource.type="http_load_balancer" AND timestamp>="2025-01-30T14:01:00Z" '
+             'AND timestamp<"2025-01-30T14:04:00Z"')
+    code, output = cloud.run(['logging', 'read', query, '--format=json', '--order=asc', '--limit=2'])
+    assert code == 0 and [entry['insertId'] for entry in json.loads(output)] == ['1', '2']
+    code, output = cloud.run(['logging', 'read', query, '--format=json'])
+    assert [entry['insertId'] for entry in json.loads(output)] == ['3', '2', '1']
+
+    cloud.run(['container', 'node-pools', 'update', 'pool', '--total-max-nodes', '2', '--region', 'asia-southeast1'])
+    _, output = cloud.run(['container', 'clusters', 'describe', 'c', '--region', 'asia-southeast1'])
+    assert json.loads(output)['nodePools'][0]['autoscaling']['maxNodeCount'] == 2
+
+    baseline = {'metrics': {'log_ingestion_entries_per_s': 1000.0, 'collection_cycle_s': 10.0,
+                            'decision_latency_p50_us': 5.0, 'vector_index_build_s': None}}
+    current = {'metrics': {'log_ingestion_entries_per_s': 800.0, 'collection_cycle_s': 8.0,
+                           'decision_latency_p50_us': 5.2, 'vector_index_build_s': 3.0}}
+    status = {row[0]: row[4] for row in compare_results(baseline, current, threshold=10)}
+    assert status['log_ingestion_entries_per_s'] == 'regression'
+    assert status['collection_cycle_s'] == 'improvement'
+    assert status['decision_latency_p50_us'] == 'ok'
+    assert status['vector_index_build_s'] == 'skipped'
+
+
+def run_fake_collection(tmp, entries, monitoring, output_dir, overrides=None):
+    """Run fetch_metrics.main once against a FakeCloud serving entries
+
+    overrides maps fetch_metrics attribute names to replacements for this run.
+    """
+    import os
+    import fetch_metrics
+    from fake_gcloud import FakeCloud, FAKE_GCLOUD_URL_ENV
+
+    overrides = dict(overrides or {}, download_geoip_database=lambda: None)
+    saved = (sys.argv, os.environ.get('PATH'), os.environ.get(FAKE_GCLOUD_URL_ENV),
+             {name: getattr(fetch_metrics, name) for name in list(overrides) + ['MONITORING_API_URL']})
+    cloud = FakeCloud(entries, monitoring)
+    cloud.start()
+    try:
+        for name, value in overrides.items():
+            setattr(fetch_metrics, name, value)
+        fetch_metrics.MONITORING_API_URL = cloud.install(Path(tmp) / 'bin')
+        fetch_metrics._monitoring_token = None
+        sys.argv = ['fetch_metrics.py', '--output-dir', str(output_dir), '--hours', '2']
+        fetch_metrics.main()
+    finally:
+        cloud.stop()
+        sys.argv, path, url, attributes = saved
+        for name, value in attributes.items():
+            setattr(fetch_metrics, name, value)
+        os.environ['PATH'] = path
+        if url is None:
+            os.environ.pop(FAKE_GCLOUD_URL_ENV, None)
+        else:
+            os.environ[FAKE_GCLOUD_URL_ENV] = url
+
+
+def test_incremental_collection():
+    """Two incremental fetch_metrics runs store every request and feature window once"""
+    from datetime import timezone
+    import columnar_store
+    import fetch_metrics
+    from benchmark_pipeline import generate_traffic
+
+    if not columnar_store.available():
+        print("⚠️  pyarrow not installed, skipping incremental collection test")
+        return
+
+    lb_entries, events, monitoring, _, _ = generate_traffic(1, 20, 11)
+    with tempfile.TemporaryDirectory() as tmp:
+        output_dir = Path(tmp) / 'data'
+        for run in range(2):
+            if run:
+                # Requests logged since the first run, inside the window it ended in
+                now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+                lb_entries += [dict(entry, insertId=f'late-{i}', timestamp=now)
+                               for i, entry in enumerate(lb_entries[-5:])]
+                # Fetches end at whole seconds
+                time.sleep(1.1)
+            run_fake_collection(tmp, lb_entries + events, monitoring, output_dir)
+
+        windows = columnar_store.read_table(output_dir, columnar_store.TRAINING_FEATURES,
+                                            columns=['timestamp', 'total_requests'])
+        requests = columnar_store.read_table(output_dir, columnar_store.LB_REQUESTS, columns=['insert_id'])
+        monitoring_rows = columnar_store.read_table(output_dir, columnar_store.MONITORING_SERIES,
+                                                    columns=['timestamp', 'metric', 'region'])
+        checkpoints = fetch_metrics.load_checkpoints(output_dir)
+
+    timestamps = windows['timestamp'].to_pylist()
+    assert len(timestamps) == len(set(timestamps))
+    assert sum(windows['total_requests'].to_pylist()) == len(lb_entries)
+    insert_ids = requests['insert_id'].to_pylist()
+    assert len(insert_ids) == len(set(insert_ids)) == len(lb_entries)
+    keys = list(zip(*(monitoring_rows[name].to_pylist() for name in ('timestamp', 'metric', 'region'))))
+    assert len(keys) == len(set(keys))
+    assert fetch_metrics.FEATURES_CHECKPOINT in checkpoints
+
+
+def test_partial_collection():
+    """Entries of an incomplete fetch are stored once, by the run that completes it"""
+    import columnar_store
+    import fetch_metrics
+    from benchmark_pipeline import generate_traffic
+
+    if not columnar_store.available():
+        print("⚠️  pyarrow not installed, skipping partial collection test")
+        return
+
+    lb_entries, events, monitoring, _, _ = generate_traffic(1, 10, 5)
+    # Entries without an insertId are keyed by their content
+    lb_entries[-1] = {key: value for key, value in lb_entries[-1].items() if key != 'insertId'}
+    fetch_load_balancer_logs = fetch_metrics.fetch_load_balancer_logs
+
+    def partial_fetch(start_time, end_time, stats=None):
+        logs = fetch_load_balancer_logs(start_time, end_time, stats)
+        stats['status'] = 'partial (1 slice(s) failed)'
+        return logs[:len(logs) // 2]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_dir = Path(tmp) / 'data'
+        run_fake_collection(tmp, lb_entries + events, monitoring, output_dir,
+                            {'fetch_load_balancer_logs': partial_fetch})
+        first_rows = columnar_store.read_table(output_dir, columnar_store.LB_REQUESTS, columns=['insert_id']).num_rows
+        checkpoints = fetch_metrics.load_checkpoints(output_dir)
+        assert 'load_balancer_access' not in checkpoints
+        assert not (output_dir / 'load_balancer_access').exists()
+
+        for _ in range(2):
+            run_fake_collection(tmp, lb_entries + events, monitoring, output_dir)
+        requests = columnar_store.read_table(output_dir, columnar_store.LB_REQUESTS, columns=['insert_id'])
+
+    insert_ids = requests['insert_id'].to_pylist()
+    assert first_rows == len(lb_entries)
+    assert len(insert_ids) == len(set(insert_ids)) == len(lb_entries)
+    assert sum(1 for insert_id in insert_ids if insert_id.startswith('sha1:')) == 1
+
+
+def test_high_water_marks():
+    """Entries at the mark are deduplicated by insertId and an empty result keeps the mark"""
+    from fetch_metrics import advance_checkpoint, filter_new_entries
+
+    def entry(insert_id, timestamp):
+        return {'insertId': insert_id, 'timestamp': timestamp}
+
+    logs = [entry('a', '2025-01-30T14:00:00.1Z'), entry('b', '2025-01-30T14:00:01.2Z'),
+            entry('c', '2025-01-30T14:00:01.2Z')]
+    checkpoint = advance_checkpoint(None, logs)
+    assert checkpoint['timestamp'] == '2025-01-30T14:00:01.2Z'
+    assert checkpoint['insert_ids'] == ['b', 'c']
+
+    # The next fetch resumes at the mark's second: seen entries there are dropped, new ones kept
+    refetched = logs[1:] + [entry('d', '2025-01-30T14:00:01.2Z'), entry('e', '2025-01-30T14:00:01.05Z'),
+                            entry('f', '2025-01-30T14:00:02Z')]
+    new_logs = filter_new_entries(refetched, checkpoint)
+    assert [log['insertId'] for log in new_logs] == ['d', 'f']
+    assert filter_new_entries(logs, None) == logs
+
+    # Equal timestamps across runs accumulate insertIds; an empty result keeps the mark
+    advanced = advance_checkpoint(checkpoint, [entry('d', '2025-01-30T14:00:01.2Z')])
+    assert advanced['timestamp'] == checkpoint['timestamp']
+    assert advanced['insert_ids'] == ['b', 'c', 'd']
+    assert advance_checkpoint(advanced, []) is advanced
+    assert advance_checkpoint(None, []) is None
+
+
+def test_gcloud_retries():
+    """gcloud calls retry timeouts and transient failures, not rejected requests, within the concurrency limit"""
+    import threading
+    import fetch_metrics
+
+    calls = []
+    running = []
+    peak = [0]
+    lock = threading.Lock()
+
+    def stub_run(outcomes):
+        outcomes = list(outcomes)
+
+        def run(cmd, capture_output=False, text=False, check=False, timeout=None):
+            with lock:
+                calls.append(cmd)
+                outcome = outcomes.pop(0) if outcomes else '[]'
+                running.append(cmd)
+                peak[0] = max(peak[0], len(running))
+            time.sleep(0.01)
+            with lock:
+                running.remove(cmd)
+            if outcome == 'timeout':
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            if isinstance(outcome, tuple):
+                raise subprocess.CalledProcessError(outcome[0], cmd, stderr=outcome[1])
+            return subprocess.CompletedProcess(cmd, 0, stdout=outcome, stderr='')
+        return run
+
+    def run_command(outcomes, retries=3):
+        calls.clear()
+        subprocess.run = stub_run(outcomes)
+        stats = {}
+        return fetch_metrics.run_gcloud_command(['gcloud', 'logging', 'read'], stats, retries=retries), stats
+
+    saved = (subprocess.run, fetch_metrics.GCLOUD_BACKOFF_SECONDS, fetch_metrics._gcloud_slots)
+    fetch_metrics.GCLOUD_BACKOFF_SECONDS = 0
+    try:
+        output, stats = run_command([(1, 'ERROR: (gcloud.logging.read) UNAVAILABLE: try again'), 'timeout', '[{}]'])
+        assert output == '[{}]' and len(calls) == 3
+        assert stats == {'attempts': 3, 'bytes': 4}
+
+        output, stats = run_command([(1, 'UNAVAILABLE')] * 5, retries=2)
+        assert output is None and len(calls) == 3
+        assert stats == {'attempts': 3, 'status': 'failed'}
+
+        # Rejected requests fail the same way on every attempt
+        for error in [(1, 'ERROR: (gcloud.logging.read) INVALID_ARGUMENT: Unparseable filter'),
+                      (1, 'ERROR: PERMISSION_DENIED: caller does not have permission'),
+                      (2, 'ERROR: (gcloud.logging.read) unrecognized arguments: --bogus')]:
+            output, stats = run_command([error, '[]'])
+            assert output is None and len(calls) == 1
+            assert stats == {'attempts': 1, 'status': 'failed'}
+
+        fetch_metrics.set_gcloud_concurrency(2)
+        calls.clear()
+        subprocess.run = stub_run([])
+        threads = [threading.Thread(target=fetch_metrics.run_gcloud_command, args=(['gcloud', 'logging', 'read'],))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(calls) == 8 and peak[0] == 2
+    finally:
+        subprocess.run, fetch_metrics.GCLOUD_BACKOFF_SECONDS, fetch_metrics._gcloud_slots = saved
+
+
+def test_sliced_log_fetch():
+    """Slices that hit --limit are subdivided and the overlapping results merged once per insertId"""
+    import fetch_metrics
+    from fake_gcloud import FakeCloud, flag_value
+    from fetch_metrics import fetch_sliced_logs, merge_log_slices, split_window
+
+    start = datetime(2025, 1, 30, 14, 0, 0)
+    end = start + timedelta(hours=1)
+    slices = split_window(start, end, 4)
+    assert len(slices) == 4 and slices[0][0] == start and slices[-1][1] == end
+    assert all(left[1] == right[0] for left, right in zip(slices, slices[1:]))
+    assert split_window(start, start + timedelta(seconds=2), 4) == [
+        (start, start + timedelta(seconds=1)), (start + timedelta(seconds=1), start + timedelta(seconds=2))]
+
+    # A burst in the first ten minutes, then one request every five minutes
+    offsets = list(range(0, 600, 10)) + list(range(600, 3600, 300))
+    entries = [{'insertId': f'id-{offset}', 'resource': {'type': 'http_load_balancer'},
+                'timestamp': (start + timedelta(seconds=offset)).strftime('%Y-%m-%dT%H:%M:%SZ')}
+               for offset in offsets]
+    cloud = FakeCloud(entries)
+    limits = []
+
+    def run_gcloud_command(cmd, stats=None, timeout=None, retries=None):
+        limits.append(int(flag_value(cmd, '--limit')))
+        code, output = cloud.run(cmd[1:])
+        return output if code == 0 else None
+
+    saved = fetch_metrics.run_gcloud_command
+    fetch_metrics.run_gcloud_command = run_gcloud_command
+    try:
+        stats = {}
+        logs = fetch_sliced_logs('resource.type="http_load_balancer"', start, end, 10, stats)
+    finally:
+        fetch_metrics.run_gcloud_command = saved
+
+    # The window, its quarters and the burst's sub-slices were all fetched
+    assert stats['slices'] == len(limits) > 1 + fetch_metrics.SLICE_SPLIT_FACTOR
+    assert set(limits) == {10}
+    assert [log['insertId'] for log in logs] == [entry['insertId'] for entry in entries]
+
+    first = [{'insertId': 'a', 'timestamp': '2025-01-30T14:00:02Z'},
+             {'insertId': 'b', 'timestamp': '2025-01-30T14:00:01Z'}]
+    second = [{'insertId': 'b', 'timestamp': '2025-01-30T14:00:01Z'},
+              {'insertId': 'c', 'timestamp': '2025-01-30T14:00:00Z'}]
+    assert [log['insertId'] for log in merge_log_slices([first, second])] == ['c', 'b', 'a']
+
+
+def test_decision_cache():
+    """Nearby metrics share a cache key, distant ones or new context miss, and entries expire"""
+    from predictive_scaler import DecisionCache
+
+    metrics = {'total_requests': 1000, 'asia_requests': 80, 'asia_percentage': 8.0,
+               'avg_backend_latency_ms': 300, 'pressure_events_count': 0}
+    key = DecisionCache.make_key(metrics, 'context')
+    assert DecisionCache.make_key(dict(metrics, total_requests=1005, avg_backend_latency_ms=310), 'context') == key
+    assert DecisionCache.make_key(dict(metrics, asia_requests=130), 'context') != key
+    assert DecisionCache.make_key(dict(metrics, avg_backend_latency_ms=600), 'context') != key
+    assert DecisionCache.make_key(metrics, 'other context') != key
+    assert DecisionCache.make_key(dict(metrics, asia_percentage=float('nan')), 'context') == \
+        DecisionCache.make_key(dict(metrics, asia_percentage=None), 'context')
+
+    cache = DecisionCache(ttl_seconds=60, max_entries=2)
+    cache.put(key, {'action': 'NO_CHANGE'})
+    assert cache.get(DecisionCache.make_key(dict(metrics, total_requests=990), 'context')) == {'action': 'NO_CHANGE'}
+    assert cache.get(DecisionCache.make_key(dict(metrics, asia_requests=130), 'context')) is None
+
+    # The least recently used entry is evicted first
+    cache.put('a', {'action': 'SCALE_UP_ASIA'})
+    cache.get(key)
+    cache.put('b', {'action': 'SCALE_DOWN_ASIA'})
+    assert len(cache) == 2 and cache.get('a') is None and cache.get(key) is not None
+
+    expiring = DecisionCache(ttl_seconds=0.05)
+    expiring.put(key, {'action': 'NO_CHANGE'})
+    assert expiring.get(key) is not None
+    time.sleep(0.1)
+    assert expiring.get(key) is None and len(expiring) == 0
+
+
+def test_rules_based_decision():
+    """Unambiguous thresholds decide without the LLM; mixed signals are left to it"""
+    import predictive_scaler
+    from predictive_scaler import InfrastructureScaler
+
+    # rules_based_decision needs no retrieval or LLM components
+    scaler = InfrastructureScaler.__new__(InfrastructureScaler)
+    high_asia = predictive_scaler.ASIA_REQUESTS_THRESHOLD_UPPER + 10
+    high_latency = predictive_scaler.LATENCY_THRESHOLD_UPPER_MS + 100
+    low_latency = predictive_scaler.LATENCY_THRESHOLD_LOWER_MS - 50
+
+    decision = scaler.rules_based_decision({'asia_requests': high_asia, 'asia_percentage': 30.0,
+                                            'avg_backend_latency_ms': high_latency})
+    assert decision['action'] == 'SCALE_UP_ASIA' and decision['should_scale']
+    assert decision['target_nodes'] == predictive_scaler.RULES_SCALE_UP_NODES
+    assert decision['target_regions'] == [predictive_scaler.COLD_REGION]
+
+    decision = scaler.rules_based_decision({'asia_requests': 1, 'asia_percentage': 0.5,
+                                            'avg_backend_latency_ms': low_latency})
+    assert decision['action'] == 'SCALE_DOWN_ASIA' and decision['target_nodes'] == 0
+    assert decision['trigger'] == 'scale_down'
+
+    # Neither high nor low: nothing to do
+    decision = scaler.rules_based_decision({'asia_requests': 30, 'asia_percentage': 5.0,
+                                            'avg_backend_latency_ms': low_latency + 100})
+    assert decision['action'] == 'NO_CHANGE' and not decision['should_scale']
+    assert decision['target_regions'] == []
+
+    # High Asia traffic without latency or pressure, and pressure without Asia traffic, are mixed
+    assert scaler.rules_based_decision({'asia_requests': high_asia, 'asia_percentage': 30.0,
+                                        'avg_backend_latency_ms': low_latency}) is None
+    assert scaler.rules_based_decision({'asia_requests': 1, 'asia_percentage': 0.5,
+                                        'avg_backend_latency_ms': low_latency,
+                                        'pressure_events_count': 3}) is None
+
+
+def test_llm_decision_retries():
+    """Malformed LLM replies are rejected and retried; an exhausted budget yields no decision"""
+    import predictive_scaler
+    from predictive_scaler import DecisionCache, InfrastructureScaler, validate_scaling_decision
+
+    valid = {'action': 'SCALE_UP_ASIA', 'confidence': 'HIGH', 'target_nodes': 2,
+             'primary_trigger': 'latency', 'key_factors': ['Asia latency 700ms']}
+    validate_scaling_decision(valid)
+    for invalid in ([valid], dict(valid, action='SCALE_SIDEWAYS'), dict(valid, target_nodes=True),
+                    dict(valid, target_nodes=predictive_scaler.MAX_TARGET_NODES + 1),
+                    dict(valid, action='SCALE_DOWN_ASIA'), {'action': 'NO_CHANGE'}):
+        try:
+            validate_scaling_decision(invalid)
+        except ValueError:
+            continue
+        raise AssertionError(f"accepted invalid decision {invalid!r}")
+
+    class StubLLM:
+        def __init__(self, replies):
+            self.replies = list(replies)
+            self.prompts = []
+
+        def invoke(self, prompt):
+            self.prompts.append(prompt)
+            return self.replies.pop(0)
+
+    class Doc:
+        page_content = 'similar scenario'
+
+    def make_scaler(replies):
+        scaler = InfrastructureScaler.__new__(InfrastructureScaler)
+        scaler.llm = StubLLM(replies)
+        scaler.decision_cache = DecisionCache()
+        scaler.decision_stats = {'rules': 0, 'cache': 0, 'llm': 0}
+        scaler.query_for_scaling_decision = lambda metrics: ([Doc()], 'query')
+        return scaler
+
+    # Mixed signals, so the rules defer to the LLM
+    metrics = {'asia_requests': predictive_scaler.ASIA_REQUESTS_THRESHOLD_UPPER + 10, 'asia_percentage': 30.0,
+               'avg_backend_latency_ms': predictive_scaler.LATENCY_THRESHOLD_LOWER_MS - 50}
+
+    scaler = make_scaler(['not json', json.dumps(dict(valid, action='SCALE_DOWN_ASIA')),
+                          f"```json\n{json.dumps(valid)}\n```"])
+    result = scaler.make_scaling_decision(metrics)
+    assert result['decision_source'] == 'llm' and result['llm_attempts'] == 3
+    assert result['decision']['action'] == 'SCALE_UP_ASIA' and result['decision']['target_nodes'] == 2
+    assert scaler.decision_stats['llm'] == 3
+    # Retries quote the rejection back to the model
+    assert 'rejected' not in scaler.llm.prompts[0]
+    assert 'SCALE_DOWN_ASIA requires target_nodes 0' in scaler.llm.prompts[2]
+    # The validated decision is cached; the same scenario does not call the LLM again
+    assert scaler.make_scaling_decision(metrics)['decision_source'] == 'cache'
+    assert scaler.decision_stats['llm'] == 3
+
+    scaler = make_scaler(['{}'] * predictive_scaler.LLM_MAX_ATTEMPTS + [json.dumps(valid)])
+    assert scaler.make_scaling_decision(metrics) is None
+    assert len(scaler.llm.prompts) == predictive_scaler.LLM_MAX_ATTEMPTS
+    assert len(scaler.decision_cache) == 0
+
+
+class StubScaler:
+    """The parts of InfrastructureScaler the daemon drives, without Ollama or embeddings"""
+
+    model_name = 'stub'
+
+    def __init__(self, data_dir):
+        self.data_dir = Path(data_dir)
+        self.vectorstore = None
+        self.decision_stats = {'rules': 0, 'cache': 0, 'llm': 0}
+        self.decision_cache = {}
+        self.indexed = []
+        self.fail_index = False
+
+    def iter_log_file_documents(self, path, log_file):
+        yield f"{log_file}:{path.name}"
+
+    def iter_feature_documents(self):
+        yield 'features'
+
+    def index_documents(self, documents):
+        documents = list(documents)
+        if self.fail_index:
+            raise RuntimeError('embedding model unavailable')
+        self.indexed.extend(documents)
+        return len(documents)
+
+    def load_current_metrics(self):
+        return {'asia_requests': 1}
+
+    def make_scaling_decision(self, current_metrics):
+        if current_metrics.get('explode'):
+            raise KeyError('explode')
+        self.decision_stats['rules'] += 1
+        return {'recommendation': 'NO_CHANGE', 'decision_source': 'rules', 'current_metrics': current_metrics}
+
+
+def test_daemon_ingest():
+    """New and changed files are picked up, and marked seen only once indexed"""
+    import os
+    from scaler_daemon import ScalerDaemon
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scaler = StubScaler(tmp)
+        daemon = ScalerDaemon(scaler)
+        assert daemon.scan_data_dir() == [] and daemon.ingest_changes() == 0
+
+        log_path = Path(tmp) / 'load_balancer_access.json'
+        log_path.write_text('[]')
+        (Path(tmp) / 'training_features.csv').write_text('timestamp\n')
+        assert {path.name for path, _, _ in daemon.scan_data_dir()} == {log_path.name, 'training_features.csv'}
+
+        # A failed index leaves the files unseen, so the next poll retries them
+        scaler.fail_index = True
+        try:
+            daemon.ingest_changes()
+            raise AssertionError("index failure was swallowed")
+        except RuntimeError:
+            pass
+        assert len(daemon.scan_data_dir()) == 2 and daemon.documents_ingested == 0
+
+        scaler.fail_index = False
+        assert daemon.ingest_changes() == 2
+        assert scaler.indexed == ['load_balancer_access:load_balancer_access.json', 'features']
+        assert daemon.scan_data_dir() == [] and daemon.ingest_changes() == 0
+
+        log_path.write_text('[{}]')
+        os.utime(log_path, ns=(0, 0))
+        assert [path for path, _, _ in daemon.scan_data_dir()] == [log_path]
+        assert daemon.ingest_changes() == 1 and daemon.documents_ingested == 3
+
+
+def test_daemon_http():
+    """/decision answers GET and POST, failures get a JSON error and /stats reports latency"""
+    import threading
+    import urllib.error
+    import urllib.request
+    from http.server import ThreadingHTTPServer
+    from scaler_daemon import ScalerDaemon, make_handler
+
+    def request(path, body=None):
+        data = None if body is None else body.encode('utf-8')
+        try:
+            with urllib.request.urlopen(f"{base_url}{path}", data=data, timeout=10) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    with tempfile.TemporaryDirectory() as tmp:
+        daemon = ScalerDaemon(StubScaler(tmp))
+        server = ThreadingHTTPServer(('127.0.0.1', 0), make_handler(daemon))
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            status, decision = request('/decision')
+            assert status == 200 and decision['current_metrics'] == {'asia_requests': 1}
+            assert decision['latency_ms'] >= 0
+            status, decision = request('/decision', json.dumps({'asia_requests': 70}))
+            assert status == 200 and decision['current_metrics'] == {'asia_requests': 70}
+
+            assert request('/decision', '[1]')[0] == 400
+            status, error = request('/decision', json.dumps({'explode': True}))
+            assert status == 500 and error['status'] == 'error' and 'KeyError' in error['error']
+            assert request('/missing')[0] == 404
+
+            status, stats = request('/stats')
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    assert status == 200 and stats['decision_sources']['rules'] == 2
+    assert stats['latency']['decision']['count'] == 2
+    assert stats['latency']['decision_rules']['count'] == 2
+    assert stats['latency']['decision']['p95_ms'] >= stats['latency']['decision']['p50_ms'] >= 0
+
+
+UNIT_TESTS = (
+    test_import_time_budget,
+    test_help_startup_budget,
+    test_streaming_json_reader,
+    test_columnar_store_roundtrip,
+    test_missing_client_ip,
+    test_feature_windows,
+    test_distribution_quantiles,
+    test_synthetic_traffic,
+    test_benchmark_comparison,
+    test_incremental_collection,
+    test_partial_collection,
+    test_high_water_marks,
+    test_gcloud_retries,
+    test_sliced_log_fetch,
+    test_decision_cache,
+    test_rules_based_decision,
+    test_llm_decision_retries,
+    test_daemon_ingest,
+    test_daemon_http,
+)
+
+
+def run_unit_tests():
+    """Run the offline tests, reporting each; returns True if all passed"""
+    print("🔬 Running unit tests...")
+    failed = 0
+    for test in UNIT_TESTS:
+        try:
+            test()
+            print(f"  ✅ {test.__name__}")
+        except Exception as e:
+            failed += 1
+            print(f"  ❌ {test.__name__}: {type(e).__name__}: {e}")
+    return failed == 0
+
+
 def main():
     """Run complete test suite"""
     print("🧪 Testing Predictive Scaling System")
     print("=" * 50)
 
+    # Unit tests: no Ollama, GCP or GPU needed
+    if not run_unit_tests():
+        print("\n❌ Unit tests failed")
+        return 1
+    print()
+
     # Test 1: Create mock data
     create_mock_training_data()
     print()
@@ -264,5 +1081,6 @@ def main():
         traceback.print_exc()
         return 1
 
+
 if __name__ == "__main__":
-    exit(main())
\ No newline at end of file
+    exit(main())